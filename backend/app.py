@@ -1,64 +1,238 @@
-from flask import Flask, request, jsonify
+from flask import (
+    Blueprint, Flask, Response, current_app, has_app_context, request, jsonify, make_response,
+    send_file, stream_with_context
+)
 from flask_cors import CORS
+import click
+from sqlalchemy.exc import IntegrityError
 from flask_jwt_extended import (
-    JWTManager, create_access_token, jwt_required, get_jwt_identity
+    JWTManager, create_access_token, create_refresh_token, jwt_required, get_jwt_identity, get_jwt
 )
 from config import Config
-from models import db, User, Note
+from models import db, User, Note, NOTE_FIELDS, image_url, parse_note_id
+from logging_config import configure_logging, get_logger
+from database import configure_database, install_engine_hooks, read_bind
+from metrics import metrics
+from hashers import password_hasher, HasherBusyError
+from ratelimit import limiter, RateLimitExceeded
+from compression import compression
+from images import images, ImageError
+from mailer import mailer
+from jobs import jobs
+from events import bus, TooManyStreams
+from streaming import NoteEventStream
+from revocation import revocations
+from sharding import shards, ShardMoving, notes_owned_elsewhere, rebalance, finalize as finalize_shards
+from migrations import upgrade_schema
+from idempotency import idempotency, IdempotencyError
+from summaries import RECENT_FIELDS, record_summary, load_summary, recent_notes
+from revisions import (
+    DeltaError, parse_delta, apply_delta, reverse_delta, record_revision, list_revisions,
+    restore_revision, delete_revisions
+)
+import tasks  # noqa: F401  (registra las tareas en segundo plano)
+from cache import (
+    cache, get_user_by_id, invalidate_user, invalidate_note, note_key
+)
+from pagination import (
+    PaginationError, parse_limit, parse_offset, parse_fields, encode_cursor, decode_cursor
+)
+from sync import (
+    SyncTokenError, OP_UPSERT, OP_DELETE, encode_sync_token, decode_sync_token,
+    record_change, fetch_changes
+)
+from batch import BatchError, plan_batch, apply_batch, attach_notes
+from etags import note_etag, collection_etag, summary_etag
+from serializers import FastJSONProvider, note_serializer, json_array_response
+from transfer import IMPORT_ENCODINGS, ImportLineError, export_ndjson, open_ndjson, import_ndjson
+from search import SearchError, SEARCH_FIELDS, search_notes, rebuild_search_index
+import hmac
+import os
 import re
-from datetime import datetime
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timezone
+
+logger = get_logger('api')
+
+# Endpoints, manejadores y comandos; create_app() los registra en cada aplicación
+api = Blueprint('api', __name__, cli_group=None)
+jwt = JWTManager()
+
+# Clientes que pueden leer /api/metrics cuando no hay METRICS_TOKEN
+LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+
+# ============================================
+# FÁBRICA DE LA APLICACIÓN
+# ============================================
+
+def create_app(config_object=Config, **overrides):
+    """Crea y configura una aplicación Flask
+
+    `overrides` reemplaza valores de la configuración, p. ej. en pruebas:
+    create_app(SQLALCHEMY_DATABASE_URI='sqlite://'). Las extensiones son
+    instancias únicas del proceso: toman la configuración de la última
+    aplicación creada.
+    """
+    app = Flask(__name__)
+    app.config.from_object(config_object)
+    app.config.update(overrides)
+    app.json = FastJSONProvider(app)
+    configure_logging(app)
+
+    # Inicializar extensiones
+    configure_database(app)
+    db.init_app(app)
+    install_engine_hooks(app)
+    metrics.init_app(app)
+    password_hasher.init_app(app)
+    cache.init_app(app)
+    limiter.init_app(app)
+    compression.init_app(app)
+    images.init_app(app)
+    mailer.init_app(app)
+    jobs.init_app(app)
+    bus.init_app(app)
+    revocations.init_app(app)
+    shards.init_app(app)
+    idempotency.init_app(app)
+    jwt.init_app(app)
+    CORS(app, origins=app.config['CORS_ORIGINS'])
+
+    app.register_blueprint(api)
+    return app
+
+
+_app = None
+_app_lock = threading.Lock()
+
+
+def get_app():
+    """Aplicación por defecto del proceso (Config del entorno), creada en el primer uso"""
+    global _app
+    if _app is None:
+        with _app_lock:
+            if _app is None:
+                _app = create_app()
+    return _app
 
-# Crear aplicación Flask
-app = Flask(__name__)
-app.config.from_object(Config)
 
-# Inicializar extensiones
-db.init_app(app)
-jwt = JWTManager(app)
-CORS(app, origins=app.config['CORS_ORIGINS'])
+def __getattr__(name):
+    # `from app import app` (asgi.py, benchmarks, flask --app app) crea la aplicación al pedirla;
+    # importar el módulo no construye nada
+    if name == 'app':
+        return get_app()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 # ============================================
 # MANEJADORES DE ERRORES
 # ============================================
 
-@app.errorhandler(422)
+@api.app_errorhandler(422)
 def handle_unprocessable_entity(e):
     """Manejar errores 422"""
-    print(f"❌ Error 422: {str(e)}")
-    import traceback
-    traceback.print_exc()
+    logger.warning('Error 422: %s', e)
     return error_response(f'Error 422: {str(e)}', 422)
 
-@app.errorhandler(Exception)
+@api.app_errorhandler(413)
+def handle_request_too_large(e):
+    """Manejar cuerpos por encima de MAX_CONTENT_LENGTH (413)"""
+    return error_response('El cuerpo de la petición es demasiado grande', 413)
+
+@api.before_app_request
+def reject_large_body():
+    """413 por el Content-Length declarado, antes de que una ruta lea el cuerpo"""
+    limit = current_app.config.get('MAX_CONTENT_LENGTH')
+    if limit and request.content_length is not None and request.content_length > limit:
+        return error_response('El cuerpo de la petición es demasiado grande', 413)
+
+@api.app_errorhandler(Exception)
 def handle_exception(e):
     """Manejar todas las excepciones"""
-    print(f"❌ Excepción no manejada: {str(e)}")
-    import traceback
-    traceback.print_exc()
+    logger.exception('Excepción no manejada: %s', e)
     return error_response(f'Error del servidor: {str(e)}', 500)
 
+@api.app_errorhandler(RateLimitExceeded)
+def handle_rate_limit(e):
+    """Manejar intentos por encima del límite (429)"""
+    logger.warning('Límite de intentos: regla %s, alcance %s, reintentar en %s s',
+                   e.rule, e.scope, e.retry_after)
+    return rate_limited_response(e.retry_after)
+
+@api.app_errorhandler(IdempotencyError)
+def handle_idempotency_error(e):
+    """Idempotency-Key inválida (400), en curso (409) o reusada con otro cuerpo (422)"""
+    logger.info('Idempotency-Key rechazada: %s', e)
+    return error_response(str(e), e.status_code)
+
+@api.app_errorhandler(ShardMoving)
+def handle_shard_moving(e):
+    """Escritura de notas de un usuario que se está moviendo de shard (503)"""
+    return busy_response(retry_after=int(shards.refresh_interval) + 1)
+
 # Manejar errores de JWT
 @jwt.invalid_token_loader
 def invalid_token_callback(error):
-    print(f"❌ Token inválido: {error}")
+    logger.info('Token inválido: %s', error)
     return error_response('Token inválido', 401)
 
 @jwt.expired_token_loader
 def expired_token_callback(jwt_header, jwt_payload):
-    print(f"❌ Token expirado")
+    logger.info('Token expirado')
     return error_response('Token expirado', 401)
 
+@jwt.token_in_blocklist_loader
+def check_if_token_revoked(jwt_header, jwt_payload):
+    # En memoria; solo consulta la base si el filtro de Bloom marca el jti
+    return revocations.is_revoked(jwt_payload)
+
+@jwt.revoked_token_loader
+def revoked_token_callback(jwt_header, jwt_payload):
+    logger.info('Token revocado: usuario %s', jwt_payload.get('sub'))
+    return error_response('Token revocado', 401)
+
 @jwt.unauthorized_loader
 def unauthorized_callback(error):
-    print(f"❌ No autorizado: {error}")
+    logger.info('No autorizado: %s', error)
     return error_response('Falta el token de autorización', 401)
 
 
+# ============================================
+# CABECERAS HTTP
+# ============================================
+
+@api.after_app_request
+def set_cache_control(response):
+    """Las respuestas con ETag se revalidan siempre; el resto no se guarda
+
+    Son datos de un usuario autenticado: ninguna caché compartida debe guardarlos.
+    """
+    if 'Cache-Control' not in response.headers:
+        response.headers['Cache-Control'] = 'private, no-cache' if response.get_etag()[0] else 'no-store'
+    return response
+
+
 # ============================================
 # UTILIDADES
 # ============================================
 
+def issue_tokens(user_id):
+    """Token de acceso (corto) y refresh token para renovarlo (identity debe ser string)"""
+    return {
+        'token': create_access_token(identity=str(user_id)),
+        'refreshToken': create_refresh_token(identity=str(user_id))
+    }
+
+
+def revoke_user_tokens(user_id):
+    """Invalida todos los tokens emitidos hasta ahora (se guarda con el commit)"""
+    revocations.revoke_user(user_id, datetime.utcnow() + current_app.config['JWT_REFRESH_TOKEN_EXPIRES'])
+
+
 def validate_email(email):
     """Valida formato de email"""
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
@@ -70,16 +244,48 @@ def error_response(message, status_code=400):
     return jsonify({'error': message}), status_code
 
 
-def success_response(data, status_code=200):
-    """Respuesta exitosa estándar"""
-    return jsonify(data), status_code
+def busy_response(retry_after=1):
+    """Respuesta 503 cuando el pool de hashing está saturado o las notas se están moviendo de shard"""
+    response = jsonify({'error': 'Servidor ocupado, intenta de nuevo'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 503
+
+
+def rate_limited_response(retry_after):
+    """Respuesta 429 cuando se agotaron los intentos permitidos"""
+    response = jsonify({'error': 'Demasiados intentos, intenta más tarde'})
+    response.headers['Retry-After'] = str(retry_after)
+    return response, 429
+
+
+def success_response(data, status_code=200, etag=None):
+    """Respuesta exitosa estándar (con ETag opcional)"""
+    response = jsonify(data)
+    if etag:
+        response.set_etag(etag)
+    return response, status_code
+
+
+def not_modified_response(etag):
+    """Respuesta 304 sin cuerpo para peticiones condicionales"""
+    response = make_response('', 304)
+    response.set_etag(etag)
+    return response
+
+
+def precondition_failed(etag):
+    """Verifica If-Match; regresa una respuesta 412 si la versión no coincide"""
+    if request.if_match and not request.if_match.contains(etag):
+        return error_response('La nota fue modificada por otra sesión', 412)
+    return None
 
 
 # ============================================
 # ENDPOINTS DE AUTENTICACIÓN
 # ============================================
 
-@app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
+@limiter.limit('register')
 def register():
     """Registro de nuevos usuarios"""
     try:
@@ -112,22 +318,24 @@ def register():
         db.session.add(user)
         db.session.commit()
         
-        # Generar token JWT (identity debe ser string)
-        token = create_access_token(identity=str(user.id))
-        
         return success_response({
             'success': True,
             'message': 'Usuario registrado exitosamente',
-            'token': token,
+            **issue_tokens(user.id),
             'user': user.to_dict()
         }, 201)
         
+    except HasherBusyError:
+        db.session.rollback()
+        return busy_response()
+        
     except Exception as e:
         db.session.rollback()
         return error_response(f'Error al registrar usuario: {str(e)}', 500)
 
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
+@limiter.limit('login')
 def login():
     """Inicio de sesión"""
     try:
@@ -140,13 +348,15 @@ def login():
         if not email or not password:
             return error_response('Email y contraseña son requeridos')
         
-        # Buscar usuario
+        # El hash no está en la caché: se lee de la base
         user = User.query.filter_by(email=email).first()
+        stored_hash = user.password if user else None
         
         if not user or not user.check_password(password):
             return error_response('Email o contraseña incorrectos', 401)
         
         # Validar device_id si está configurado
+        link_device = False
         if user.device_id and device_id:
             if user.device_id != device_id:
                 return error_response(
@@ -156,22 +366,61 @@ def login():
                 )
         elif device_id and not user.device_id:
             # Vincular dispositivo si no está vinculado
-            user.device_id = device_id
-            db.session.commit()
+            link_device = True
         
-        # Generar token JWT (identity debe ser string)
-        token = create_access_token(identity=str(user.id))
+        # check_password() pudo actualizar el hash (algoritmo o costo anterior)
+        rehashed = user.password != stored_hash
+        if link_device or rehashed:
+            if link_device:
+                user.device_id = device_id
+            db.session.commit()
+            invalidate_user(user)
         
         return success_response({
-            'token': token,
+            **issue_tokens(user.id),
             'user': user.to_dict()
         })
         
+    except HasherBusyError:
+        db.session.rollback()
+        return busy_response()
+        
     except Exception as e:
         return error_response(f'Error al iniciar sesión: {str(e)}', 500)
 
 
-@app.route('/api/auth/forgot-password', methods=['POST'])
+@api.route('/api/auth/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh_tokens():
+    """Renovar el token de acceso (Authorization: Bearer <refreshToken>)
+    
+    El refresh token usado queda revocado y se entrega uno nuevo (rotación):
+    si alguien lo copió, solo uno de los dos puede usarlo.
+    """
+    try:
+        payload = get_jwt()
+        user_id = int(payload['sub'])
+        
+        if get_user_by_id(user_id) is None:
+            return error_response('Usuario no encontrado', 401)
+        
+        revocations.revoke_token(payload)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Otra petición ya usó este refresh token
+            db.session.rollback()
+            return error_response('Token revocado', 401)
+        
+        return success_response(issue_tokens(user_id))
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'Error al renovar el token: {str(e)}', 500)
+
+
+@api.route('/api/auth/forgot-password', methods=['POST'])
+@limiter.limit('forgot-password')
 def forgot_password():
     """Solicitar recuperación de contraseña"""
     try:
@@ -190,24 +439,28 @@ def forgot_password():
                 'message': 'Si el email existe, recibirás un código de recuperación'
             })
         
-        # Generar token de recuperación
+        # Generar token de recuperación; el correo sale en segundo plano y solo
+        # se encola si el token se guardó (misma transacción)
         reset_token = user.generate_reset_token()
+        jobs.enqueue('send_reset_email', {'user_id': user.id})
         db.session.commit()
+        invalidate_user(user)
         
-        # TODO: En producción, enviar el token por email
-        # Para desarrollo, lo incluimos en la respuesta
-        return success_response({
+        response = {
             'success': True,
-            'message': 'Código de recuperación generado',
-            'resetToken': reset_token  # Solo para desarrollo
-        })
+            'message': 'Si el email existe, recibirás un código de recuperación'
+        }
+        if current_app.config['RESET_TOKEN_IN_RESPONSE']:
+            response['resetToken'] = reset_token  # Solo para desarrollo
+        return success_response(response)
         
     except Exception as e:
         db.session.rollback()
         return error_response(f'Error al solicitar recuperación: {str(e)}', 500)
 
 
-@app.route('/api/auth/verify-reset-token', methods=['POST'])
+@api.route('/api/auth/verify-reset-token', methods=['POST'])
+@limiter.limit('verify-reset-token')
 def verify_reset_token():
     """Verificar código de recuperación"""
     try:
@@ -232,7 +485,8 @@ def verify_reset_token():
         return error_response(f'Error al verificar token: {str(e)}', 500)
 
 
-@app.route('/api/auth/reset-password', methods=['POST'])
+@api.route('/api/auth/reset-password', methods=['POST'])
+@limiter.limit('reset-password')
 def reset_password():
     """Cambiar contraseña con token de recuperación"""
     try:
@@ -255,19 +509,27 @@ def reset_password():
         # Cambiar contraseña
         user.set_password(new_password)
         user.clear_reset_token()
+        # Las sesiones abiertas con la contraseña anterior dejan de valer
+        revoke_user_tokens(user.id)
         db.session.commit()
+        invalidate_user(user)
         
         return success_response({
             'success': True,
             'message': 'Contraseña actualizada exitosamente'
         })
         
+    except HasherBusyError:
+        db.session.rollback()
+        return busy_response()
+        
     except Exception as e:
         db.session.rollback()
         return error_response(f'Error al cambiar contraseña: {str(e)}', 500)
 
 
-@app.route('/api/auth/unlink-device', methods=['POST'])
+@api.route('/api/auth/unlink-device', methods=['POST'])
+@limiter.limit('unlink-device')
 def unlink_device():
     """Desvincular dispositivo"""
     try:
@@ -284,13 +546,20 @@ def unlink_device():
             return error_response('Credenciales incorrectas', 401)
         
         user.device_id = None
+        # El dispositivo desvinculado pierde su sesión
+        revoke_user_tokens(user.id)
         db.session.commit()
+        invalidate_user(user)
         
         return success_response({
             'success': True,
             'message': 'Dispositivo desvinculado exitosamente'
         })
         
+    except HasherBusyError:
+        db.session.rollback()
+        return busy_response()
+        
     except Exception as e:
         db.session.rollback()
         return error_response(f'Error al desvincular dispositivo: {str(e)}', 500)
@@ -300,94 +569,403 @@ def unlink_device():
 # ENDPOINTS DE NOTAS
 # ============================================
 
-@app.route('/api/notes', methods=['GET'])
+@api.route('/api/notes', methods=['GET'])
 @jwt_required()
 def get_notes():
-    """Obtener todas las notas del usuario autenticado"""
+    """Obtener las notas del usuario autenticado
+    
+    Parámetros opcionales (query string):
+    - limit: tamaño de página; activa la paginación por cursor
+    - cursor: valor `nextCursor` de la página anterior
+    - fields: lista de campos separados por coma (ej. id,title,updatedAt)
+    
+    Sin `limit` ni `cursor` se regresa el arreglo completo (compatibilidad con Android).
+    """
     try:
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
-        print(f"📋 Obtener notas - Usuario ID: {user_id}")
-        notes = Note.query.filter_by(userId=user_id).order_by(Note.createdAt.desc()).all()
-        print(f"📋 Notas encontradas: {len(notes)}")
+        logger.debug('Obtener notas - usuario %s', user_id)
+        
+        # Petición condicional: una sola consulta agregada antes de serializar
+        etag = collection_etag(user_id, request.query_string)
+        if request.if_none_match.contains(etag):
+            return not_modified_response(etag)
+        
+        try:
+            fields = parse_fields(request.args.get('fields'), NOTE_FIELDS)
+            paginated = 'limit' in request.args or 'cursor' in request.args
+            limit = parse_limit(request.args.get('limit')) if paginated else None
+            cursor = request.args.get('cursor')
+            after = decode_cursor(cursor) if cursor else None
+        except PaginationError as e:
+            return error_response(str(e), 400)
+        
+        # Siempre se seleccionan createdAt e id: son la clave del cursor
+        columns = Note.columns_for(fields)
+        if fields:
+            columns += [c for c in (Note.createdAt, Note.id) if c.key not in fields]
+        
+        # SELECT de columnas (Core): las filas se serializan sin crear objetos Note
+        query = db.select(*columns).where(Note.userId == user_id)
+        if after:
+            after_created, after_id = after
+            query = query.where(db.or_(
+                Note.createdAt < after_created,
+                db.and_(Note.createdAt == after_created, Note.id > after_id)
+            ))
+        query = query.order_by(Note.createdAt.desc(), Note.id)
+        serialize = note_serializer(fields)
+        
+        if not paginated:
+            # Colecciones grandes se envían por partes (ver json_array_response)
+            result = db.session.execute(
+                query.execution_options(yield_per=current_app.config['JSON_STREAM_CHUNK_SIZE']),
+                bind_arguments=read_bind()
+            )
+            response = json_array_response(result, serialize,
+                                           current_app.config['JSON_STREAM_THRESHOLD'],
+                                           current_app.config['JSON_STREAM_CHUNK_SIZE'])
+            response.set_etag(etag)
+            return response
+        
+        # Se pide un registro extra para saber si hay más páginas
+        rows = db.session.execute(query.limit(limit + 1), bind_arguments=read_bind()).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        logger.debug('Notas encontradas: %s (hay más: %s)', len(rows), has_more)
+        
+        next_cursor = None
+        if has_more:
+            last = rows[-1]
+            next_cursor = encode_cursor(last.createdAt, last.id)
         
-        notes_dict = [note.to_dict() for note in notes]
-        print(f"📋 Notas serializadas: {notes_dict}")
-        
-        return success_response(notes_dict)
+        return success_response({
+            'notes': [serialize(row) for row in rows],
+            'nextCursor': next_cursor,
+            'hasMore': has_more
+        }, etag=etag)
         
     except Exception as e:
-        print(f"❌ Error al obtener notas: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception('Error al obtener notas')
         return error_response(f'Error al obtener notas: {str(e)}', 500)
 
 
-@app.route('/api/notes/<note_id>', methods=['GET'])
+@api.route('/api/notes/changes', methods=['GET'])
+@jwt_required()
+def get_note_changes():
+    """Sincronización incremental: notas creadas/actualizadas/eliminadas desde un token
+    
+    Parámetros (query string):
+    - since: `syncToken` de la respuesta anterior (vacío = sincronización completa)
+    - limit: máximo de cambios por respuesta
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        try:
+            since = decode_sync_token(request.args.get('since'))
+            limit = parse_limit(request.args.get('limit'))
+        except (SyncTokenError, PaginationError) as e:
+            return error_response(str(e), 400)
+        
+        rows, has_more = fetch_changes(user_id, since, limit)
+        
+        notes = []
+        deleted = []
+        # Las columnas de la nota empiezan después de (changeId, noteId, op)
+        serialize = note_serializer(offset=3)
+        for row in rows:
+            if row.op == OP_DELETE or row.id is None:
+                deleted.append(row.noteId)
+            else:
+                notes.append(serialize(row))
+        
+        return success_response({
+            'notes': notes,
+            'deleted': deleted,
+            'syncToken': encode_sync_token(rows[-1].changeId if rows else since),
+            'hasMore': has_more
+        })
+        
+    except Exception as e:
+        return error_response(f'Error al obtener cambios: {str(e)}', 500)
+
+
+@api.route('/api/notes/stream', methods=['GET'])
+@jwt_required()
+def stream_note_changes():
+    """Cambios de las notas en tiempo real (Server-Sent Events)
+    
+    Reanuda desde la cabecera Last-Event-ID o el parámetro since (un syncToken);
+    sin ellos empieza en el momento actual. Ver streaming.py para los eventos.
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        position = request.headers.get('Last-Event-ID') or request.args.get('since')
+        try:
+            since = decode_sync_token(position) if position else None
+        except SyncTokenError as e:
+            return error_response(str(e), 400)
+        
+        try:
+            subscriber = bus.subscribe(user_id)
+        except TooManyStreams as e:
+            return error_response(str(e), 429)
+        
+        # Cerrar al vencer el token: al reconectar el cliente presenta uno vigente
+        duration = min(current_app.config['SSE_MAX_SECONDS'], get_jwt()['exp'] - time.time())
+        stream = NoteEventStream(
+            current_app._get_current_object(), bus, subscriber, since,
+            duration=duration,
+            heartbeat=current_app.config['SSE_HEARTBEAT_SECONDS'],
+            poll_on_heartbeat=current_app.config['SSE_POLL_ON_HEARTBEAT'],
+            retry_ms=current_app.config['SSE_RETRY_MS']
+        )
+        headers = {'X-Accel-Buffering': 'no'}  # nginx: no acumular los eventos
+        
+        # Con asgi.py el stream se envía desde el event loop sin ocupar un hilo
+        send_async = request.environ.get('notas.async_body')
+        if send_async is not None:
+            send_async(stream)
+            return Response(iter(()), mimetype='text/event-stream', headers=headers, direct_passthrough=True)
+        return Response(stream, mimetype='text/event-stream', headers=headers)
+        
+    except Exception as e:
+        return error_response(f'Error al abrir el stream: {str(e)}', 500)
+
+
+@api.route('/api/notes/search', methods=['GET'])
+@jwt_required()
+def search_user_notes():
+    """Búsqueda de texto completo en título y contenido de las notas del usuario
+    
+    Parámetros (query string):
+    - q: palabras a buscar (cada una se busca como prefijo)
+    - limit / offset: paginación de los resultados ordenados por relevancia
+    - fields: campos de la nota a incluir (por defecto todos excepto content)
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        try:
+            fields = parse_fields(request.args.get('fields'), NOTE_FIELDS) or SEARCH_FIELDS
+            limit = parse_limit(request.args.get('limit'), default=20, maximum=100)
+            offset = parse_offset(request.args.get('offset'))
+            rows, has_more = search_notes(user_id, request.args.get('q'), fields, limit, offset)
+        except (SearchError, PaginationError) as e:
+            return error_response(str(e), 400)
+        
+        results = []
+        serialize = note_serializer(fields)
+        for row in rows:
+            result = serialize(row)
+            result['titleHighlight'] = row.titleHighlight
+            result['snippet'] = row.snippet
+            results.append(result)
+        
+        return success_response({
+            'results': results,
+            'nextOffset': offset + len(rows) if has_more else None,
+            'hasMore': has_more
+        })
+        
+    except Exception as e:
+        return error_response(f'Error al buscar notas: {str(e)}', 500)
+
+
+@api.route('/api/notes/summary', methods=['GET'])
+@jwt_required()
+def notes_summary():
+    """Totales de las notas del usuario y las editadas más recientemente
+    
+    Los totales salen de una fila por usuario que se ajusta en cada escritura
+    (ver summaries.py), así que no dependen del tamaño de la colección.
+    
+    Parámetros (query string):
+    - limit: cuántas notas recientes incluir (por defecto 5, máximo 50)
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        try:
+            limit = parse_limit(request.args.get('limit'), default=5, maximum=50)
+        except PaginationError as e:
+            return error_response(str(e), 400)
+        
+        summary = load_summary(user_id)
+        etag = summary_etag(user_id, summary, request.query_string)
+        if request.if_none_match.contains(etag):
+            return not_modified_response(etag)
+        
+        count, content_bytes, with_images, last_updated = summary
+        serialize = note_serializer(RECENT_FIELDS)
+        return success_response({
+            'count': count,
+            'contentBytes': content_bytes,
+            'withImages': with_images,
+            'lastUpdatedAt': last_updated.isoformat() + 'Z' if last_updated else None,
+            'recent': [serialize(row) for row in recent_notes(user_id, limit)] if count else []
+        }, etag=etag)
+        
+    except Exception as e:
+        return error_response(f'Error al obtener resumen: {str(e)}', 500)
+
+
+@api.route('/api/notes/export', methods=['GET'])
+@jwt_required()
+def export_notes():
+    """Exportar todas las notas del usuario como NDJSON (una nota por línea)
+    
+    Con ?compress=gzip se descarga un archivo .ndjson.gz.
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        compress = request.args.get('compress') == 'gzip'
+        logger.info('Exportar notas - usuario %s (gzip: %s)', user_id, compress)
+        
+        lines = export_ndjson(user_id, current_app.config['TRANSFER_CHUNK_SIZE'], compress)
+        filename = 'notas.ndjson.gz' if compress else 'notas.ndjson'
+        return Response(
+            stream_with_context(lines),
+            mimetype='application/gzip' if compress else 'application/x-ndjson',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+        
+    except Exception as e:
+        return error_response(f'Error al exportar notas: {str(e)}', 500)
+
+
+@api.route('/api/notes/import', methods=['POST'])
+@jwt_required()
+def import_notes():
+    """Importar notas desde un cuerpo NDJSON (el formato de /api/notes/export)
+    
+    El cuerpo se lee por líneas sin cargarlo completo en memoria; acepta las
+    mismas codificaciones que el resto de la API (`Content-Encoding: gzip` o
+    `deflate`) y también `Content-Type: application/gzip`.
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        encoding = (request.content_encoding or '').strip().lower() or None
+        if encoding == 'identity':
+            encoding = None
+        if encoding is None and request.mimetype == 'application/gzip':
+            encoding = 'gzip'
+        if encoding is not None and encoding not in IMPORT_ENCODINGS:
+            return error_response(f'Content-Encoding no soportado: {encoding}', 415)
+        logger.info('Importar notas - usuario %s (codificación: %s)', user_id, encoding or 'ninguna')
+        
+        lines = open_ndjson(request.stream, encoding, current_app.config['IMPORT_MAX_LINE_BYTES'])
+        try:
+            result = import_ndjson(user_id, lines, current_app.config['TRANSFER_CHUNK_SIZE'])
+        except ImportLineError as e:
+            db.session.rollback()
+            return error_response(str(e), 400)
+        except (OSError, EOFError, zlib.error):
+            db.session.rollback()
+            return error_response('El cuerpo comprimido está dañado', 400)
+        
+        logger.info('Importación terminada: %s importadas, %s omitidas, %s con error',
+                    result['imported'], result['skipped'], result['failed'])
+        return success_response(result)
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'Error al importar notas: {str(e)}', 500)
+
+
+@api.route('/api/notes/<note_id>', methods=['GET'])
 @jwt_required()
 def get_note(note_id):
     """Obtener una nota específica"""
     try:
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
-        note = Note.query.filter_by(id=note_id, userId=user_id).first()
         
-        if not note:
+        # Solo se consulta updatedAt (sin cargar el contenido): basta para
+        # responder 304 o servir la nota serializada desde la caché
+        updated_at = db.session.execute(
+            db.select(Note.updatedAt).where(Note.id == note_id, Note.userId == user_id),
+            bind_arguments=read_bind()
+        ).first()
+        if updated_at is None:
             return error_response('Nota no encontrada', 404)
-        
-        return success_response(note.to_dict())
+        updated_at = updated_at[0]
+        
+        etag = note_etag(note_id, updated_at)
+        if request.if_none_match.contains(etag):
+            return not_modified_response(etag)
+        
+        note_dict = cache.get(note_key(user_id, note_id, updated_at))
+        if note_dict is None:
+            note = db.session.execute(
+                db.select(Note).where(Note.id == note_id, Note.userId == user_id),
+                bind_arguments=read_bind()
+            ).scalar_one_or_none()
+            if not note:
+                return error_response('Nota no encontrada', 404)
+            note_dict = note.to_dict()
+            etag = note_etag(note.id, note.updatedAt)
+            cache.set(note_key(user_id, note_id, note.updatedAt), note_dict)
+        
+        return success_response(note_dict, etag=etag)
         
     except Exception as e:
         return error_response(f'Error al obtener nota: {str(e)}', 500)
 
 
-@app.route('/api/notes', methods=['POST'])
+@api.route('/api/notes', methods=['POST'])
 @jwt_required()
+@idempotency.idempotent
 def create_note():
-    """Crear una nueva nota"""
-    print("=" * 50)
-    print("📝 INICIO - Crear nota")
-    print("=" * 50)
+    """Crear una nueva nota
     
+    El cliente puede proponer el id (un UUID): si la nota ya existe se actualiza
+    (200) en vez de duplicarse, así que reintentar el mismo POST es seguro.
+    """
     try:
-        # Paso 1: Obtener usuario (convertir a int)
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
-        print(f"✅ Usuario autenticado - ID: {user_id}")
         
-        # Paso 2: Obtener datos
         data = request.get_json()
-        print(f"✅ Datos recibidos: {data}")
+        logger.debug('Crear nota - usuario %s, datos: %s', user_id, data)
         
-        # Paso 3: Validar datos
         if not data:
-            print("❌ No se recibieron datos")
             return error_response('No se recibieron datos', 400)
         
         title = data.get('title', '').strip()
         content = data.get('content', '').strip()
         image_url = data.get('imageUrl')
         
-        print(f"✅ Título: '{title}'")
-        print(f"✅ Contenido: '{content}'")
-        print(f"✅ ImageUrl: '{image_url}'")
-        
         # Validaciones
         if not title:
-            print("❌ Error: Título vacío")
             return error_response('El título es requerido', 400)
         
         if not content:
-            print("❌ Error: Contenido vacío")
             return error_response('El contenido es requerido', 400)
         
-        # Paso 4: Crear nota
-        import uuid
-        note_id = str(uuid.uuid4())
+        if data.get('id') is not None:
+            note_id = parse_note_id(data.get('id'))
+            if note_id is None:
+                return error_response('El id debe ser un UUID', 400)
+            existing = db.session.get(Note, note_id)
+            if existing is not None:
+                return upsert_note(existing, user_id, title, content, image_url)
+            if notes_owned_elsewhere([note_id], user_id):
+                return error_response('El id ya pertenece a otra nota', 409)
+        else:
+            note_id = str(uuid.uuid4())
+        
+        # Crear nota
         now = datetime.utcnow()
         
-        print(f"✅ Generando nota con ID: {note_id}")
-        
         note = Note(
             id=note_id,
             title=title,
@@ -398,52 +976,127 @@ def create_note():
             updatedAt=now
         )
         
-        print(f"✅ Objeto Note creado")
-        
-        # Paso 5: Guardar en BD
+        # Guardar en BD (record_change hace flush: ahí choca un id repetido)
         db.session.add(note)
-        print(f"✅ Nota agregada a sesión")
+        try:
+            record_change(user_id, note_id, OP_UPSERT)
+            record_summary(user_id, after=(content, image_url, now))
+            db.session.commit()
+        except IntegrityError:
+            # Otro POST con el mismo id llegó primero
+            db.session.rollback()
+            existing = db.session.get(Note, note_id)
+            if existing is None:
+                raise
+            return upsert_note(existing, user_id, title, content, image_url)
+        logger.info('Nota creada: %s (usuario %s)', note_id, user_id)
+        
+        return success_response(note.to_dict(), 201, etag=note_etag(note.id, note.updatedAt))
         
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error al crear nota')
+        return error_response(f'Error al crear nota: {str(e)}', 500)
+
+
+def edit_note(note, user_id, title, content, image_url, reverse=None):
+    """Edita la nota en la sesión (sin commit): caché, bitácora, totales e historial
+    
+    La revisión sube solo si cambian título o contenido; `reverse` es el delta
+    inverso del contenido cuando ya se conoce (PATCH con delta).
+    """
+    invalidate_note(user_id, note.id, note.updatedAt)
+    before = (note.title, note.content, note.imageUrl)
+    if (note.title, note.content) != (title, content):
+        record_revision(note.id, user_id, note.revision, before[:2], (title, content), reverse)
+        note.revision += 1
+    note.title = title
+    note.content = content
+    note.imageUrl = image_url
+    note.updatedAt = datetime.utcnow()
+    record_change(user_id, note.id, OP_UPSERT)
+    record_summary(user_id, before[1:], (content, image_url, note.updatedAt))
+
+
+def upsert_note(note, user_id, title, content, image_url):
+    """POST /api/notes con el id de una nota existente: la actualiza si cambió"""
+    if note.userId != user_id:
+        return error_response('El id ya pertenece a otra nota', 409)
+    
+    failed = precondition_failed(note_etag(note.id, note.updatedAt))
+    if failed:
+        return failed
+    
+    if (note.title, note.content, note.imageUrl) != (title, content, image_url):
+        edit_note(note, user_id, title, content, image_url)
         db.session.commit()
-        print(f"✅ Nota guardada en BD")
+        logger.info('Nota actualizada por id propuesto: %s (usuario %s)', note.id, user_id)
+    
+    return success_response(note.to_dict(), etag=note_etag(note.id, note.updatedAt))
+
+
+@api.route('/api/notes/batch', methods=['POST'])
+@jwt_required()
+@idempotency.idempotent
+def batch_notes():
+    """Aplicar varias operaciones create/update/delete en una sola transacción
+    
+    Cuerpo: {"operations": [{"op": "create"|"update"|"delete", "id": ..., "title": ...,
+    "content": ..., "imageUrl": ...}], "atomic": false}
+    
+    En un create el id es opcional; si se manda y la nota ya existe, se actualiza.
+    
+    Con atomic=true, si alguna operación falla no se aplica ninguna.
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
         
-        # Paso 6: Serializar y responder
-        note_dict = note.to_dict()
-        print(f"✅ Nota serializada: {note_dict}")
+        data = request.get_json(silent=True) or {}
+        atomic = bool(data.get('atomic', False))
         
-        print("=" * 50)
-        print("✅ FIN - Nota creada exitosamente")
-        print("=" * 50)
+        try:
+            plan = plan_batch(user_id, data.get('operations'), current_app.config['BATCH_MAX_OPERATIONS'])
+        except BatchError as e:
+            return error_response(str(e), 400)
         
-        return success_response(note_dict, 201)
+        logger.info('Lote - usuario %s, operaciones: %s, con error: %s', user_id, len(plan.results),
+                    sum(1 for r in plan.results if r['status'] >= 400))
+        
+        if atomic and plan.has_errors:
+            return success_response({'applied': False, 'results': plan.results}, 400)
+        
+        apply_batch(plan)
+        db.session.commit()
+        
+        return success_response({'applied': True, 'results': attach_notes(plan)})
         
     except Exception as e:
         db.session.rollback()
-        print("=" * 50)
-        print(f"❌ EXCEPCIÓN al crear nota: {str(e)}")
-        print("=" * 50)
-        import traceback
-        traceback.print_exc()
-        return error_response(f'Error al crear nota: {str(e)}', 500)
+        return error_response(f'Error al procesar lote: {str(e)}', 500)
 
 
-@app.route('/api/notes/<note_id>', methods=['PUT'])
+@api.route('/api/notes/<note_id>', methods=['PUT'])
 @jwt_required()
 def update_note(note_id):
     """Actualizar una nota existente"""
     try:
         user_id_str = get_jwt_identity()
         user_id = int(user_id_str)
-        print(f"✏️ Actualizar nota - ID: {note_id}, Usuario: {user_id}")
+        logger.debug('Actualizar nota %s - usuario %s', note_id, user_id)
         
         note = Note.query.filter_by(id=note_id, userId=user_id).first()
         
         if not note:
-            print(f"❌ Nota no encontrada: {note_id}")
             return error_response('Nota no encontrada', 404)
         
+        # Concurrencia optimista: If-Match debe coincidir con la versión actual
+        failed = precondition_failed(note_etag(note.id, note.updatedAt))
+        if failed:
+            return failed
+        
         data = request.get_json()
-        print(f"✏️ Datos recibidos: {data}")
+        logger.debug('Datos recibidos: %s', data)
         
         title = data.get('title', '').strip()
         content = data.get('content', '').strip()
@@ -451,31 +1104,192 @@ def update_note(note_id):
         
         # Validaciones
         if not title:
-            print("❌ Error: Título vacío")
             return error_response('El título es requerido')
         
         if not content:
-            print("❌ Error: Contenido vacío")
             return error_response('El contenido es requerido')
         
         # Actualizar nota
-        note.title = title
-        note.content = content
-        note.imageUrl = image_url
-        note.updatedAt = datetime.utcnow()
-        
+        edit_note(note, user_id, title, content, image_url)
         db.session.commit()
         
-        print(f"✅ Nota actualizada exitosamente: {note_id}")
-        return success_response(note.to_dict())
+        logger.info('Nota actualizada: %s', note_id)
+        return success_response(note.to_dict(), etag=note_etag(note.id, note.updatedAt))
+        
+    except IntegrityError:
+        # Otra edición guardó la misma revisión primero
+        db.session.rollback()
+        return error_response('La nota fue modificada por otra sesión', 409)
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error al actualizar nota %s', note_id)
+        return error_response(f'Error al actualizar nota: {str(e)}', 500)
+
+
+def base_conflict(note, data):
+    """Compara la versión base del PATCH con la actual
+    
+    Regresa (hay_base, respuesta_de_error_o_None).
+    """
+    if 'baseRevision' in data:
+        base = data['baseRevision']
+        if type(base) is not int:
+            return True, error_response('baseRevision debe ser un número entero', 400)
+        if base != note.revision:
+            return True, error_response('La nota cambió desde la versión base', 409)
+        return True, None
+    if 'baseUpdatedAt' in data:
+        try:
+            base = datetime.fromisoformat(str(data['baseUpdatedAt']).replace('Z', '+00:00'))
+        except ValueError:
+            return True, error_response('baseUpdatedAt debe ser una fecha ISO 8601', 400)
+        # updatedAt se guarda en UTC sin zona horaria
+        if base.tzinfo is not None:
+            base = base.astimezone(timezone.utc).replace(tzinfo=None)
+        if base != note.updatedAt:
+            return True, error_response('La nota cambió desde la versión base', 409)
+        return True, None
+    # If-Match ya se verificó con precondition_failed()
+    return bool(request.if_match), None
+
+
+@api.route('/api/notes/<note_id>', methods=['PATCH'])
+@jwt_required()
+@idempotency.idempotent
+def patch_note(note_id):
+    """Actualizar solo parte de una nota
+    
+    Cuerpo (JSON merge patch): los campos que cambian, p. ej. {"title": "..."};
+    "imageUrl": null quita la imagen. En lugar de "content" se puede mandar un
+    delta de texto sobre el contenido de una versión base (ver revisions.py):
+    {"delta": [{"offset": 120, "delete": 3, "insert": "abc"}], "baseRevision": 7}
+    
+    La versión base es baseRevision, baseUpdatedAt o el ETag en If-Match; si la
+    nota cambió desde entonces se responde 409 (412 con If-Match) y el cliente
+    debe volver a leerla. Un delta siempre necesita versión base.
+    Con `Prefer: return=minimal` la respuesta trae solo id, revision y updatedAt.
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        note = Note.query.filter_by(id=note_id, userId=user_id).first()
+        if not note:
+            return error_response('Nota no encontrada', 404)
+        
+        failed = precondition_failed(note_etag(note.id, note.updatedAt))
+        if failed:
+            return failed
         
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict) or not data:
+            return error_response('No se recibieron datos', 400)
+        
+        has_base, conflict = base_conflict(note, data)
+        if conflict:
+            return conflict
+        
+        title, content, image_url = note.title, note.content, note.imageUrl
+        reverse = None
+        
+        if 'title' in data:
+            title = (data['title'] or '').strip()
+            if not title:
+                return error_response('El título es requerido', 400)
+        
+        if 'content' in data and 'delta' in data:
+            return error_response('Se manda content o delta, no ambos', 400)
+        if 'content' in data:
+            content = (data['content'] or '').strip()
+        elif 'delta' in data:
+            if not has_base:
+                return error_response('Un delta requiere baseRevision, baseUpdatedAt o If-Match', 400)
+            try:
+                ops = parse_delta(data['delta'], current_app.config['NOTE_DELTA_MAX_OPERATIONS'])
+                content = apply_delta(note.content, ops)
+            except DeltaError as e:
+                return error_response(str(e), 400)
+            reverse = reverse_delta(note.content, ops)
+        if not content.strip():
+            return error_response('El contenido es requerido', 400)
+        
+        if 'imageUrl' in data:
+            image_url = data['imageUrl']
+        
+        if (note.title, note.content, note.imageUrl) != (title, content, image_url):
+            edit_note(note, user_id, title, content, image_url, reverse)
+            db.session.commit()
+            logger.info('Nota %s actualizada con PATCH (revisión %s)', note_id, note.revision)
+        
+        etag = note_etag(note.id, note.updatedAt)
+        if 'return=minimal' in request.headers.get('Prefer', ''):
+            response, status = success_response({
+                'id': note.id,
+                'revision': note.revision,
+                'updatedAt': note.updatedAt.isoformat() + 'Z'
+            }, etag=etag)
+            response.headers['Preference-Applied'] = 'return=minimal'
+            return response, status
+        return success_response(note.to_dict(), etag=etag)
+        
+    except IntegrityError:
+        # Otra edición guardó la misma revisión primero
+        db.session.rollback()
+        return error_response('La nota cambió desde la versión base', 409)
     except Exception as e:
         db.session.rollback()
-        print(f"❌ Error al actualizar nota: {str(e)}")
+        logger.exception('Error al actualizar nota %s con PATCH', note_id)
         return error_response(f'Error al actualizar nota: {str(e)}', 500)
 
 
-@app.route('/api/notes/<note_id>', methods=['DELETE'])
+@api.route('/api/notes/<note_id>/revisions', methods=['GET'])
+@jwt_required()
+def get_note_revisions(note_id):
+    """Revisiones anteriores de una nota que siguen en el historial"""
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        note = Note.query.filter_by(id=note_id, userId=user_id).first()
+        if not note:
+            return error_response('Nota no encontrada', 404)
+        
+        return success_response({
+            'revision': note.revision,
+            'revisions': [
+                {'revision': row.revision, 'createdAt': row.createdAt.isoformat() + 'Z', 'bytes': row[2]}
+                for row in list_revisions(note.id, user_id)
+            ]
+        })
+        
+    except Exception as e:
+        return error_response(f'Error al obtener revisiones: {str(e)}', 500)
+
+
+@api.route('/api/notes/<note_id>/revisions/<int:revision>', methods=['GET'])
+@jwt_required()
+def get_note_revision(note_id, revision):
+    """Título y contenido de una nota en una revisión anterior"""
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        note = Note.query.filter_by(id=note_id, userId=user_id).first()
+        if not note:
+            return error_response('Nota no encontrada', 404)
+        
+        restored = restore_revision(note, revision)
+        if restored is None:
+            return error_response('Revisión no disponible', 404)
+        
+        title, content = restored
+        return success_response({'id': note.id, 'revision': revision, 'title': title, 'content': content})
+        
+    except Exception as e:
+        return error_response(f'Error al obtener revisión: {str(e)}', 500)
+
+
+@api.route('/api/notes/<note_id>', methods=['DELETE'])
 @jwt_required()
 def delete_note(note_id):
     """Eliminar una nota"""
@@ -487,8 +1301,16 @@ def delete_note(note_id):
         if not note:
             return error_response('Nota no encontrada', 404)
         
+        failed = precondition_failed(note_etag(note.id, note.updatedAt))
+        if failed:
+            return failed
+        
         db.session.delete(note)
+        record_change(user_id, note_id, OP_DELETE)
+        record_summary(user_id, before=(note.content, note.imageUrl))
+        delete_revisions(user_id, [note_id])
         db.session.commit()
+        invalidate_note(user_id, note_id, note.updatedAt)
         
         return success_response({
             'success': True,
@@ -500,21 +1322,164 @@ def delete_note(note_id):
         return error_response(f'Error al eliminar nota: {str(e)}', 500)
 
 
+# ============================================
+# ENDPOINTS DE IMÁGENES
+# ============================================
+
+@api.route('/api/notes/<note_id>/image', methods=['POST', 'PUT'])
+@jwt_required()
+def upload_note_image(note_id):
+    """Subir la imagen de una nota
+    
+    El cuerpo es el archivo tal cual (JPEG, PNG, GIF o WebP). Se guarda por su
+    SHA-256, así que la misma foto subida varias veces ocupa un solo archivo;
+    la miniatura se genera en segundo plano.
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        note = Note.query.filter_by(id=note_id, userId=user_id).first()
+        if not note:
+            return error_response('Nota no encontrada', 404)
+        
+        failed = precondition_failed(note_etag(note.id, note.updatedAt))
+        if failed:
+            return failed
+        
+        try:
+            name, size, created = images.save(request.stream)
+        except ImageError as e:
+            return error_response(str(e), e.status_code)
+        
+        invalidate_note(user_id, note_id, note.updatedAt)
+        before = (note.content, note.imageUrl)
+        note.imageUrl = image_url(name)
+        note.updatedAt = datetime.utcnow()
+        record_change(user_id, note_id, OP_UPSERT)
+        record_summary(user_id, before, (note.content, note.imageUrl, note.updatedAt))
+        db.session.commit()
+        
+        images.ensure_thumbnail(name)
+        logger.info('Imagen de la nota %s: %s (%s bytes, nueva: %s)', note_id, name, size, created)
+        return success_response(note.to_dict(), etag=note_etag(note.id, note.updatedAt))
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Error al subir la imagen de la nota %s', note_id)
+        return error_response(f'Error al subir imagen: {str(e)}', 500)
+
+
+@api.route('/api/notes/<note_id>/image', methods=['DELETE'])
+@jwt_required()
+def delete_note_image(note_id):
+    """Quitar la imagen de una nota (el archivo lo borra después purge_images si ya ninguna nota lo usa)"""
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        note = Note.query.filter_by(id=note_id, userId=user_id).first()
+        if not note:
+            return error_response('Nota no encontrada', 404)
+        
+        failed = precondition_failed(note_etag(note.id, note.updatedAt))
+        if failed:
+            return failed
+        
+        invalidate_note(user_id, note_id, note.updatedAt)
+        before = (note.content, note.imageUrl)
+        note.imageUrl = None
+        note.updatedAt = datetime.utcnow()
+        record_change(user_id, note_id, OP_UPSERT)
+        record_summary(user_id, before, (note.content, note.imageUrl, note.updatedAt))
+        db.session.commit()
+        
+        return success_response(note.to_dict(), etag=note_etag(note.id, note.updatedAt))
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f'Error al quitar imagen: {str(e)}', 500)
+
+
+@api.route('/api/images/<name>', methods=['GET'])
+@jwt_required()
+def get_image(name):
+    """Descargar una imagen (?size=thumb para la miniatura)
+    
+    Soporta Range, If-None-Match e If-Range; el contenido nunca cambia para un
+    mismo nombre, así que el cliente puede guardarlo indefinidamente.
+    """
+    try:
+        user_id_str = get_jwt_identity()
+        user_id = int(user_id_str)
+        
+        path = images.path(name)
+        # Solo el dueño de una nota con esta imagen puede descargarla
+        owned = path and db.session.execute(
+            db.select(Note.id).where(Note.userId == user_id, Note.imageUrl == image_url(name)).limit(1),
+            bind_arguments=read_bind()
+        ).first()
+        if not owned or not os.path.exists(path):
+            return error_response('Imagen no encontrada', 404)
+        
+        mimetype = images.mimetype(name)
+        etag = name
+        cache_control = 'private, max-age=31536000, immutable'
+        if request.args.get('size') == 'thumb':
+            thumbnail = images.thumbnail_path(name)
+            if os.path.exists(thumbnail):
+                path, mimetype, etag = thumbnail, 'image/jpeg', f'{name}.thumb'
+            else:
+                # Aún no está lista: se sirve la original, pero el cliente debe
+                # revalidar para recibir la miniatura cuando exista (otro ETag)
+                images.ensure_thumbnail(name)
+                cache_control = 'private, no-cache'
+        
+        response = send_file(path, mimetype=mimetype, etag=etag, conditional=True)
+        response.headers['Cache-Control'] = cache_control
+        response.accept_ranges = 'bytes'
+        return response
+        
+    except Exception as e:
+        return error_response(f'Error al obtener imagen: {str(e)}', 500)
+
+
 # ============================================
 # ENDPOINTS DE PRUEBA
 # ============================================
 
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Verificar que el servidor está funcionando"""
     return success_response({
         'status': 'ok',
         'message': 'Servidor funcionando correctamente',
-        'timestamp': datetime.utcnow().isoformat()
+        'timestamp': datetime.utcnow().isoformat(),
+        'cache': cache.stats(),
+        'rateLimit': limiter.stats(),
+        'streams': bus.stats(),
+        'revocations': revocations.stats(),
+        'shards': shards.stats(),
+        'idempotency': idempotency.stats(),
+        'jobs': jobs.stats()
     })
 
 
-@app.route('/api/', methods=['GET'])
+@api.route('/api/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Métricas de la API en formato de texto de Prometheus"""
+    if not current_app.config['METRICS_ENABLED']:
+        return error_response('Métricas deshabilitadas', 404)
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return error_response('Token de métricas inválido', 401)
+    elif request.remote_addr not in LOCAL_ADDRESSES:
+        return error_response('Métricas disponibles solo desde el servidor', 403)
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+@api.route('/api/', methods=['GET'])
 def api_info():
     """Información de la API"""
     return success_response({
@@ -524,17 +1489,35 @@ def api_info():
             'auth': [
                 'POST /api/auth/register',
                 'POST /api/auth/login',
+                'POST /api/auth/refresh',
                 'POST /api/auth/forgot-password',
                 'POST /api/auth/verify-reset-token',
                 'POST /api/auth/reset-password',
                 'POST /api/auth/unlink-device'
             ],
             'notes': [
-                'GET /api/notes',
+                'GET /api/notes?limit=&cursor=&fields=',
+                'GET /api/notes/changes?since=&limit=',
+                'GET /api/notes/stream (text/event-stream, Last-Event-ID)',
+                'GET /api/notes/search?q=&limit=&offset=&fields=',
+                'GET /api/notes/summary?limit=',
                 'GET /api/notes/<id>',
                 'POST /api/notes',
+                'POST /api/notes/batch',
+                'GET /api/notes/export?compress=gzip',
+                'POST /api/notes/import',
                 'PUT /api/notes/<id>',
-                'DELETE /api/notes/<id>'
+                'PATCH /api/notes/<id> (merge patch o delta de texto)',
+                'GET /api/notes/<id>/revisions',
+                'GET /api/notes/<id>/revisions/<rev>',
+                'DELETE /api/notes/<id>',
+                'POST /api/notes/<id>/image',
+                'DELETE /api/notes/<id>/image',
+                'GET /api/images/<name>?size=thumb'
+            ],
+            'monitoring': [
+                'GET /api/health',
+                'GET /api/metrics'
             ]
         }
     })
@@ -544,21 +1527,74 @@ def api_info():
 # INICIALIZACIÓN
 # ============================================
 
-def init_db():
-    """Inicializar base de datos"""
+def init_db(app=None):
+    """Crea o actualiza el esquema; si ya está al día solo lee su versión (ver migrations.py)"""
+    if app is None:
+        app = current_app._get_current_object() if has_app_context() else get_app()
     with app.app_context():
-        db.create_all()
-        print('✅ Base de datos inicializada')
+        applied = upgrade_schema()
+    if applied:
+        logger.info('Base de datos inicializada (%s migraciones aplicadas)', applied)
 
 
-if __name__ == '__main__':
-    # Crear tablas si no existen
+@api.cli.command('reindex-search')
+def reindex_search_command():
+    """Reconstruye el índice de búsqueda: flask --app app reindex-search"""
     init_db()
+    if all([rebuild_search_index(db.engines[key]) for key in shards.note_binds()]):
+        logger.info('Índice de búsqueda reconstruido')
+    else:
+        logger.warning('FTS5 no está disponible en esta base de datos; se usa búsqueda por LIKE')
+
+
+@api.cli.command('jobs-worker')
+def jobs_worker_command():
+    """Proceso dedicado a los trabajos en segundo plano: flask --app app jobs-worker"""
+    init_db()
+    jobs.run_forever()
+
+
+@api.cli.command('shards-rebalance')
+@click.option('--to', 'count', type=int, help='Número de shards que repartirán a los usuarios')
+@click.option('--batch-size', default=100, show_default=True, help='Usuarios bloqueados a la vez')
+@click.option('--finalize', is_flag=True, help='Limpiar el directorio tras actualizar SHARD_COUNT')
+def shards_rebalance_command(count, batch_size, finalize):
+    """Mueve notas entre shards: flask --app app shards-rebalance --to N
+
+    Con los servidores en marcha; después fijar SHARD_COUNT=N, reiniciarlos y
+    correr `flask --app app shards-rebalance --finalize`.
+    """
+    init_db()
+    if finalize:
+        finalize_shards()
+    elif count is None:
+        raise click.UsageError('Indica --to N o --finalize')
+    else:
+        moved = rebalance(count, batch_size=batch_size)
+        logger.info('Usuarios movidos: %s; ahora fija SHARD_COUNT=%s', moved, count)
+
+
+@api.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Aplica las migraciones pendientes: flask --app app db-upgrade"""
+    init_db()
+    logger.info('Esquema al día')
+
+
+if __name__ == '__main__':
+    app = create_app()
+    # Crear tablas o migrar si hace falta
+    init_db(app)
+    
+    # Con el recargador de debug, solo el proceso hijo (el que atiende) ejecuta trabajos
+    if app.config['JOBS_RUN_IN_PROCESS'] and (not app.debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+        jobs.start()
     
     # Iniciar servidor
-    print(f'🚀 Servidor iniciando en http://{app.config["HOST"]}:{app.config["PORT"]}')
-    print(f'📱 Para Android Emulator usa: http://10.0.2.2:{app.config["PORT"]}/api/')
-    print(f'📱 Para dispositivo físico usa: http://[TU_IP_LOCAL]:{app.config["PORT"]}/api/')
+    logger.info('Servidor iniciando en http://%s:%s', app.config['HOST'], app.config['PORT'])
+    logger.info('Para Android Emulator usa: http://10.0.2.2:%s/api/', app.config['PORT'])
+    logger.info('Para dispositivo físico usa: http://[TU_IP_LOCAL]:%s/api/', app.config['PORT'])
+    logger.info('Servidor de desarrollo; en producción usa: python asgi.py')
     
     app.run(
         host=app.config['HOST'],
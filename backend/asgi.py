@@ -0,0 +1,339 @@
+"""Punto de entrada ASGI para producción
+
+Uso (desde backend/):
+    python asgi.py                       # uvicorn con SERVER_WORKERS procesos
+    uvicorn asgi:application --workers 4 # o directamente con uvicorn
+
+Cada proceso aplica las migraciones pendientes al arrancar (evento lifespan
+de startup); están hechas para que varios procesos lo hagan a la vez.
+
+El servidor de desarrollo de Werkzeug ocupa un hilo por conexión, incluso
+mientras la conexión keep-alive está inactiva. Aquí uvicorn atiende las
+conexiones en un event loop, y solo las peticiones en curso ocupan un hilo de
+un pool acotado (SERVER_THREADS) donde corren los handlers de Flask con su
+sesión de SQLAlchemy. Miles de clientes móviles inactivos no cuestan hilos, y
+la concurrencia contra la base de datos queda limitada por el tamaño del pool.
+"""
+import asyncio
+import json
+import signal
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import get_app, init_db
+from hashers import password_hasher
+from images import images
+from events import bus
+from jobs import jobs
+from logging_config import get_logger
+
+logger = get_logger('asgi')
+
+# Cuerpos de petición más grandes que esto se guardan en disco (p. ej. importaciones)
+SPOOL_MAX_MEMORY = 1024 * 1024
+# Fragmentos de respuesta pendientes de enviar por petición (contrapresión)
+SEND_QUEUE_SIZE = 8
+# Mensaje interno: el resto del cuerpo lo produce un iterable asíncrono (ver run_wsgi)
+ASYNC_BODY = 'notas.async_body'
+
+
+def content_length(scope):
+    """Content-Length declarado en la petición; None si falta o no es válido"""
+    for name, value in scope['headers']:
+        if name == b'content-length':
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return None
+
+
+def build_environ(scope, body):
+    """Environ WSGI (PEP 3333) a partir del scope HTTP de ASGI
+
+    `body` ya está completo en el archivo temporal: se marca como terminado y,
+    si la petición llegó chunked (sin Content-Length), se pone el tamaño
+    recibido; si no, Werkzeug lo leería como vacío.
+    """
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode().decode('latin-1'),
+        'PATH_INFO': scope['path'].encode().decode('latin-1'),
+        'QUERY_STRING': scope['query_string'].decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        'wsgi.input_terminated': True,
+    }
+    for name, value in scope['headers']:
+        name = name.decode('latin-1').upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        environ[name] = f'{environ[name]},{value}' if name in environ else value
+    if 'CONTENT_LENGTH' not in environ:
+        size = body.seek(0, 2)
+        body.seek(0)
+        if size:
+            environ['CONTENT_LENGTH'] = str(size)
+    return environ
+
+
+class WSGIAdapter:
+    """Sirve una aplicación WSGI como ASGI ejecutándola en un pool de hilos acotado
+
+    Las respuestas se envían por fragmentos a medida que la aplicación los
+    produce (exportaciones y listas grandes siguen en streaming), con una cola
+    acotada para que un cliente lento frene al generador en lugar de acumular
+    memoria. Si el cliente se desconecta se deja de iterar la respuesta.
+    """
+
+    def __init__(self, wsgi_app, threads=10, max_body_size=None,
+                 on_startup=(), on_stopping=(), on_shutdown=()):
+        self.wsgi_app = wsgi_app
+        self.max_body_size = max_body_size
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix='wsgi')
+        self.on_startup = list(on_startup)
+        self.on_stopping = list(on_stopping)
+        self.on_shutdown = list(on_shutdown)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise RuntimeError(f"Tipo de conexión no soportado: {scope['type']}")
+
+        body = await self.read_body(receive, content_length(scope))
+        if body is None:
+            return await self.send_too_large(send)
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(SEND_QUEUE_SIZE)
+        disconnected = threading.Event()
+        watcher = loop.create_task(self.watch_disconnect(receive, disconnected))
+        future = loop.run_in_executor(self.executor, self.run_wsgi, scope, body, loop, queue, disconnected)
+
+        started = False
+        async_body = None
+        try:
+            while (message := await queue.get()) is not None:
+                if message['type'] == ASYNC_BODY:
+                    async_body = message['iterable']
+                    continue
+                if disconnected.is_set():
+                    continue
+                try:
+                    await send(message)
+                    started = True
+                except OSError:
+                    disconnected.set()
+            await future
+            if async_body is not None:
+                await self.send_async_body(async_body, send, watcher)
+        except Exception:
+            logger.exception('Error al ejecutar la aplicación WSGI')
+            if not started and not disconnected.is_set():
+                await send({'type': 'http.response.start', 'status': 500,
+                            'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+                await send({'type': 'http.response.body', 'body': b'Error del servidor'})
+        finally:
+            watcher.cancel()
+            body.close()
+
+    async def read_body(self, receive, declared=None):
+        """Cuerpo de la petición en un archivo temporal; None si excede max_body_size
+
+        Se corta antes de guardarlo: por el Content-Length declarado o, en
+        cuerpos chunked, en cuanto lo recibido pasa del límite.
+        """
+        limit = self.max_body_size
+        if limit and declared is not None and declared > limit:
+            return None
+        body = tempfile.SpooledTemporaryFile(SPOOL_MAX_MEMORY)
+        received = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            chunk = message.get('body', b'')
+            received += len(chunk)
+            if limit and received > limit:
+                body.close()
+                return None
+            body.write(chunk)
+            more_body = message.get('more_body', False)
+        body.seek(0)
+        return body
+
+    async def send_too_large(self, send):
+        payload = json.dumps({'error': f'El cuerpo de la petición excede {self.max_body_size} bytes'},
+                             ensure_ascii=False).encode()
+        await send({'type': 'http.response.start', 'status': 413,
+                    'headers': [(b'content-type', b'application/json'),
+                                (b'content-length', str(len(payload)).encode()),
+                                (b'connection', b'close')]})
+        await send({'type': 'http.response.body', 'body': payload})
+
+    @staticmethod
+    async def watch_disconnect(receive, disconnected):
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+        disconnected.set()
+
+    @staticmethod
+    async def send_async_body(iterable, send, watcher):
+        """Envía un cuerpo asíncrono desde el event loop; se cancela si el cliente se desconecta"""
+        async def pump():
+            chunks = iterable.__aiter__()
+            try:
+                async for chunk in chunks:
+                    if chunk:
+                        await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            finally:
+                await chunks.aclose()
+
+        task = asyncio.ensure_future(pump())
+        try:
+            await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            if not task.done():
+                task.cancel()
+        try:
+            await task
+        except (asyncio.CancelledError, OSError):
+            pass
+
+    def run_wsgi(self, scope, body, loop, queue, disconnected):
+        """Corre en un hilo del pool: llama a la aplicación y encola los mensajes ASGI
+
+        Una respuesta larga (el stream de eventos) puede pasar un iterable
+        asíncrono con environ['notas.async_body'](iterable): el hilo termina al
+        enviar las cabeceras y el event loop produce el resto del cuerpo.
+        """
+        response = {}
+        async_body = []
+
+        def put(message):
+            asyncio.run_coroutine_threadsafe(queue.put(message), loop).result()
+
+        def start_response(status, headers, exc_info=None):
+            response['start'] = {
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [(k.lower().encode('latin-1'), v.encode('latin-1')) for k, v in headers],
+            }
+
+        try:
+            environ = build_environ(scope, body)
+            environ[ASYNC_BODY] = async_body.append
+            iterable = self.wsgi_app(environ, start_response)
+            try:
+                for chunk in iterable:
+                    if disconnected.is_set():
+                        break
+                    if 'start' in response:
+                        put(response.pop('start'))
+                    if chunk:
+                        put({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+                if 'start' in response:
+                    put(response.pop('start'))
+                if async_body:
+                    put({'type': ASYNC_BODY, 'iterable': async_body[0]})
+                else:
+                    put({'type': 'http.response.body', 'body': b'', 'more_body': False})
+            finally:
+                if hasattr(iterable, 'close'):
+                    iterable.close()
+        finally:
+            put(None)
+
+    def watch_exit_signals(self):
+        """Llama a on_stopping al recibir SIGTERM/SIGINT, antes de que uvicorn espere
+
+        uvicorn espera a que terminen las respuestas en curso, y los streams de
+        eventos no terminan solos: se cierran aquí y los clientes reconectan.
+        """
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGTERM, signal.SIGINT):
+            previous = signal.getsignal(signum)
+            if not callable(previous):
+                continue
+
+            def handler(signum, frame, previous=previous):
+                for callback in self.on_stopping:
+                    loop.call_soon_threadsafe(callback)
+                previous(signum, frame)
+
+            try:
+                signal.signal(signum, handler)
+            except ValueError:  # fuera del hilo principal: no hay señales que atender
+                return
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    for callback in self.on_startup:
+                        callback()
+                except Exception as e:
+                    logger.exception('Error al iniciar el servidor')
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                self.watch_exit_signals()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # uvicorn ya esperó a las peticiones en curso (SERVER_GRACEFUL_TIMEOUT)
+                self.executor.shutdown(wait=True)
+                for callback in self.on_shutdown:
+                    callback()
+                logger.info('Servidor detenido')
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+app = get_app()
+application = WSGIAdapter(app, threads=app.config['SERVER_THREADS'],
+                          max_body_size=app.config['MAX_CONTENT_LENGTH'],
+                          on_startup=[init_db] + ([jobs.start] if app.config['JOBS_RUN_IN_PROCESS'] else []),
+                          on_stopping=[bus.close_all],
+                          on_shutdown=[jobs.shutdown, images.shutdown, password_hasher.shutdown])
+
+
+def run(host=None, port=None, workers=None):
+    """Inicia uvicorn con la configuración de Config"""
+    import uvicorn
+
+    config = app.config
+    uvicorn.run(
+        'asgi:application',
+        host=host or config['HOST'],
+        port=port or config['PORT'],
+        workers=workers or config['SERVER_WORKERS'],
+        backlog=config['SERVER_BACKLOG'],
+        limit_concurrency=config['SERVER_LIMIT_CONCURRENCY'] or None,
+        timeout_keep_alive=config['SERVER_KEEPALIVE_TIMEOUT'],
+        timeout_graceful_shutdown=config['SERVER_GRACEFUL_TIMEOUT'],
+        lifespan='on',
+        access_log=False,
+        log_level=config['LOG_LEVEL'].lower(),
+    )
+
+
+if __name__ == '__main__':
+    logger.info('Servidor ASGI iniciando en http://%s:%s (%s procesos, %s hilos por proceso)',
+                app.config['HOST'], app.config['PORT'],
+                app.config['SERVER_WORKERS'], app.config['SERVER_THREADS'])
+    run()
@@ -0,0 +1,197 @@
+import uuid
+from datetime import datetime
+
+from models import db, Note, parse_note_id
+from sharding import notes_owned_elsewhere
+from sync import OP_UPSERT, OP_DELETE, record_changes
+from serializers import note_serializer
+from revisions import record_revision, delete_revisions
+from summaries import SummaryDelta
+
+OP_CREATE = 'create'
+OP_UPDATE = 'update'
+OP_REMOVE = 'delete'
+
+
+class BatchError(ValueError):
+    """Error en la estructura general del lote (no en una operación individual)"""
+
+
+def _note_fields(op):
+    """Extrae y valida título, contenido e imagen de una operación"""
+    title = (op.get('title') or '').strip()
+    content = (op.get('content') or '').strip()
+    if not title:
+        return None, 'El título es requerido'
+    if not content:
+        return None, 'El contenido es requerido'
+    return {'title': title, 'content': content, 'imageUrl': op.get('imageUrl')}, None
+
+
+class BatchPlan:
+    """Resultado de validar un lote: qué se inserta, actualiza y elimina
+
+    Las operaciones se evalúan en orden contra el estado que dejarían las
+    anteriores (p. ej. actualizar una nota ya eliminada en el mismo lote es un 404),
+    y al final solo se aplica el estado neto de cada nota.
+    """
+
+    def __init__(self, user_id, existing_ids, taken_ids=()):
+        self.user_id = user_id
+        self.alive = set(existing_ids)
+        # Ids propuestos en un create que ya son notas de otro usuario
+        self.taken = set(taken_ids)
+        self.inserts = {}
+        self.updates = {}
+        self.deletes = set()
+        self.results = []
+
+    @property
+    def has_errors(self):
+        return any(r['status'] >= 400 for r in self.results)
+
+    def _fail(self, index, op_name, status, message, note_id=None):
+        self.results.append({'index': index, 'op': op_name, 'id': note_id,
+                             'status': status, 'error': message})
+
+    def _update(self, note_id, fields, now):
+        if note_id in self.inserts:
+            self.inserts[note_id].update(fields)
+        else:
+            self.updates[note_id] = dict(fields, id=note_id, updatedAt=now)
+
+    def add(self, index, op, now):
+        op_name = op.get('op') if isinstance(op, dict) else None
+        if op_name not in (OP_CREATE, OP_UPDATE, OP_REMOVE):
+            return self._fail(index, op_name, 400, 'Operación inválida')
+
+        if op_name == OP_CREATE:
+            fields, error = _note_fields(op)
+            if error:
+                return self._fail(index, op_name, 400, error)
+            if op.get('id') is None:
+                note_id = str(uuid.uuid4())
+            else:
+                # Id propuesto por el cliente: repetir el create es un upsert
+                note_id = parse_note_id(op.get('id'))
+                if note_id is None:
+                    return self._fail(index, op_name, 400, 'El id debe ser un UUID', op.get('id'))
+                if note_id in self.taken:
+                    return self._fail(index, op_name, 409, 'El id ya pertenece a otra nota', note_id)
+                if note_id in self.alive:
+                    self._update(note_id, fields, now)
+                    self.results.append({'index': index, 'op': op_name, 'id': note_id, 'status': 200})
+                    return
+            if note_id in self.deletes:
+                # Eliminada y vuelta a crear en el mismo lote: la fila sigue en la BD
+                self.deletes.discard(note_id)
+                self.updates[note_id] = dict(fields, id=note_id, updatedAt=now)
+            else:
+                self.inserts[note_id] = dict(fields, id=note_id, userId=self.user_id,
+                                             createdAt=now, updatedAt=now)
+            self.alive.add(note_id)
+            self.results.append({'index': index, 'op': op_name, 'id': note_id, 'status': 201})
+            return
+
+        note_id = op.get('id')
+        if not isinstance(note_id, str) or note_id not in self.alive:
+            return self._fail(index, op_name, 404, 'Nota no encontrada', note_id)
+
+        if op_name == OP_UPDATE:
+            fields, error = _note_fields(op)
+            if error:
+                return self._fail(index, op_name, 400, error, note_id)
+            self._update(note_id, fields, now)
+            self.results.append({'index': index, 'op': op_name, 'id': note_id, 'status': 200})
+            return
+
+        # OP_REMOVE
+        self.alive.discard(note_id)
+        self.updates.pop(note_id, None)
+        if self.inserts.pop(note_id, None) is None:
+            self.deletes.add(note_id)
+        self.results.append({'index': index, 'op': op_name, 'id': note_id, 'status': 200})
+
+
+def plan_batch(user_id, operations, max_operations):
+    """Valida un lote de operaciones y regresa su BatchPlan (sin tocar la BD)"""
+    if not isinstance(operations, list) or not operations:
+        raise BatchError('Se requiere una lista de operaciones')
+    if len(operations) > max_operations:
+        raise BatchError(f'El lote excede el máximo de {max_operations} operaciones')
+
+    # Una sola consulta para saber cuáles de las notas referenciadas son del usuario
+    referenced = {op.get('id') for op in operations
+                  if isinstance(op, dict) and isinstance(op.get('id'), str)}
+    # Los ids de los create se comparan en forma canónica
+    proposed = {parse_note_id(op.get('id')) for op in operations
+                if isinstance(op, dict) and op.get('op') == OP_CREATE}
+    proposed.discard(None)
+    referenced |= proposed
+    existing, taken = set(), set()
+    if referenced:
+        for row in db.session.query(Note.id, Note.userId).filter(Note.id.in_(referenced)):
+            if row.userId == user_id:
+                existing.add(row.id)
+            elif row.id in proposed:
+                taken.add(row.id)
+        # Un id propuesto tampoco puede existir en el shard de otro usuario
+        taken |= notes_owned_elsewhere(proposed - existing - taken, user_id)
+
+    plan = BatchPlan(user_id, existing, taken)
+    now = datetime.utcnow()
+    for index, op in enumerate(operations):
+        plan.add(index, op, now)
+    return plan
+
+
+def apply_batch(plan):
+    """Aplica el estado neto del lote con SQL masivo (el commit lo hace quien llama)"""
+    summary = SummaryDelta(plan.user_id)
+    touched = plan.updates.keys() | plan.deletes
+    if touched:
+        # Estado previo de las notas que se editan o eliminan: totales, revisión e historial
+        for row in db.session.execute(
+            db.select(Note.id, Note.title, Note.content, Note.imageUrl, Note.revision)
+            .where(Note.userId == plan.user_id, Note.id.in_(touched))
+        ):
+            summary.remove(row.content, row.imageUrl)
+            update = plan.updates.get(row.id)
+            if update is None:
+                continue
+            update['revision'] = row.revision
+            if (row.title, row.content) != (update['title'], update['content']):
+                record_revision(row.id, plan.user_id, row.revision, (row.title, row.content),
+                                (update['title'], update['content']))
+                update['revision'] += 1
+    for note in (*plan.inserts.values(), *plan.updates.values()):
+        summary.add(note['content'], note['imageUrl'], note['updatedAt'])
+
+    if plan.inserts:
+        db.session.execute(db.insert(Note), list(plan.inserts.values()))
+    if plan.updates:
+        db.session.execute(db.update(Note), list(plan.updates.values()))
+    if plan.deletes:
+        db.session.execute(
+            db.delete(Note).where(Note.userId == plan.user_id, Note.id.in_(plan.deletes))
+        )
+        delete_revisions(plan.user_id, plan.deletes)
+    record_changes(plan.user_id,
+                   [(note_id, OP_UPSERT) for note_id in (*plan.inserts, *plan.updates)] +
+                   [(note_id, OP_DELETE) for note_id in plan.deletes])
+    summary.apply()
+
+
+def attach_notes(plan):
+    """Agrega la nota serializada a los resultados exitosos de create/update"""
+    touched = {r['id'] for r in plan.results if r['status'] < 400 and r['op'] != OP_REMOVE}
+    touched &= plan.alive
+    notes = {}
+    if touched:
+        serialize = note_serializer()
+        rows = db.session.execute(db.select(*Note.columns_for()).where(Note.id.in_(touched)))
+        notes = {row.id: serialize(row) for row in rows}
+    for result in plan.results:
+        if result['status'] < 400 and result['op'] != OP_REMOVE and result['id'] in notes:
+            result['note'] = notes[result['id']]
+    return plan.results
@@ -0,0 +1,127 @@
+"""Benchmark de compresión de GET /api/notes: bytes enviados y CPU por nivel
+
+Uso (desde backend/):
+    python benchmarks/bench_compression.py [--notes 200 2000] [--levels 1 3 6 9] [--repeat 20] [--json r.json]
+
+Para cada tamaño de lista se obtiene la respuesta JSON real del endpoint y se
+comprime con cada nivel de gzip (y calidades de brotli si está instalado),
+completa y por fragmentos con flush de sincronización como en streaming.
+Reporta bytes, proporción y milisegundos de CPU para comprimir y descomprimir.
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['COMPRESS_ENABLED'] = 'False'
+
+from app import app, init_db  # noqa: E402
+from compression import GZIP_WBITS, brotli  # noqa: E402
+from models import db, User, Note  # noqa: E402
+from sync import backfill_changes  # noqa: E402
+
+WORDS = ('nota tarea compra reunión proyecto revisar enviar llamar cliente informe '
+         'pendiente mañana semana urgente idea lista recordar documento').split()
+
+
+def seed(count):
+    """Usuario con `count` notas de texto variado; regresa el token"""
+    email = f'bench{count}@example.com'
+    db.session.add(User(name='Benchmark', email=email, password='x'))
+    db.session.commit()
+    user_id = db.session.execute(db.select(User.id).where(User.email == email)).scalar()
+    start = datetime.utcnow()
+    db.session.execute(db.insert(Note), [{
+        'id': str(uuid.uuid4()), 'title': f'{WORDS[i % len(WORDS)].title()} {i}',
+        'content': ' '.join(WORDS[(i * 7 + j) % len(WORDS)] for j in range(40 + i % 60)),
+        'imageUrl': None, 'userId': user_id,
+        'createdAt': start + timedelta(seconds=i), 'updatedAt': start + timedelta(seconds=i),
+    } for i in range(count)])
+    backfill_changes()
+    db.session.commit()
+
+    from flask_jwt_extended import create_access_token
+    return create_access_token(identity=str(user_id))
+
+
+def cpu_ms(func, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        result = func()
+    return result, (time.process_time() - start) / repeat * 1000
+
+
+def chunks(data, size=64 * 1024):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def gzip_streamed(data, level):
+    compressor = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+    parts = [compressor.compress(c) + compressor.flush(zlib.Z_SYNC_FLUSH) for c in chunks(data)]
+    return b''.join(parts) + compressor.flush()
+
+
+def measure(payload, levels, repeat):
+    rows = []
+    for level in levels:
+        body, compress_ms = cpu_ms(lambda: gzip.compress(payload, level), repeat)
+        streamed, stream_ms = cpu_ms(lambda: gzip_streamed(payload, level), repeat)
+        _, decompress_ms = cpu_ms(lambda: gzip.decompress(body), repeat)
+        rows.append({'encoding': 'gzip', 'level': level, 'bytes': len(body),
+                     'ratio': round(len(payload) / len(body), 2), 'compress_ms': round(compress_ms, 3),
+                     'streamed_bytes': len(streamed), 'streamed_ms': round(stream_ms, 3),
+                     'decompress_ms': round(decompress_ms, 3)})
+    if brotli is not None:
+        for quality in (1, 4, 6, 11):
+            body, compress_ms = cpu_ms(lambda: brotli.compress(payload, quality=quality), repeat)
+            _, decompress_ms = cpu_ms(lambda: brotli.decompress(body), repeat)
+            rows.append({'encoding': 'br', 'level': quality, 'bytes': len(body),
+                         'ratio': round(len(payload) / len(body), 2), 'compress_ms': round(compress_ms, 3),
+                         'streamed_bytes': None, 'streamed_ms': None,
+                         'decompress_ms': round(decompress_ms, 3)})
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--notes', type=int, nargs='+', default=[200, 2000])
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 3, 6, 9])
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    args = parser.parse_args()
+
+    init_db()
+    client = app.test_client()
+    results = []
+    for count in args.notes:
+        with app.app_context():
+            token = seed(count)
+        payload = client.get('/api/notes', headers={'Authorization': f'Bearer {token}'}).get_data()
+        rows = measure(payload, args.levels, args.repeat)
+        results.append({'notes': count, 'json_bytes': len(payload), 'levels': rows})
+
+        print(f'{count} notas: {len(payload)} bytes de JSON')
+        print(f"  {'codificación':<14}{'bytes':>10}{'proporción':>12}{'comprimir ms':>14}"
+              f"{'streaming bytes':>17}{'descomprimir ms':>17}")
+        for r in rows:
+            streamed = r['streamed_bytes'] if r['streamed_bytes'] is not None else '-'
+            print(f"  {r['encoding'] + ' ' + str(r['level']):<14}{r['bytes']:>10}{r['ratio']:>12}"
+                  f"{r['compress_ms']:>14}{streamed:>17}{r['decompress_ms']:>17}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
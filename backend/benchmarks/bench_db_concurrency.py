@@ -0,0 +1,123 @@
+"""Benchmark de escrituras concurrentes: POST /api/notes desde muchos hilos por configuración
+
+Uso (desde backend/):
+    python benchmarks/bench_db_concurrency.py [--threads 16] [--requests 50]
+        [--postgres postgresql://...] [--json resultado.json]
+
+Cada configuración corre en un proceso aparte con una base de datos nueva
+(journal_mode se guarda en el archivo) y reporta notas/s, latencias y errores
+como "database is locked".
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGURATIONS = [
+    ('rollback journal + FULL (original)', {'SQLITE_JOURNAL_MODE': 'DELETE', 'SQLITE_SYNCHRONOUS': 'FULL',
+                                            'SQLITE_MMAP_SIZE': '0'}),
+    ('WAL + FULL', {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'FULL'}),
+    ('WAL + NORMAL (por defecto)', {'SQLITE_JOURNAL_MODE': 'WAL', 'SQLITE_SYNCHRONOUS': 'NORMAL'}),
+]
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def worker(threads, requests):
+    """Se ejecuta en el proceso hijo: dispara las escrituras y escribe el resultado en JSON"""
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    from app import app, init_db
+    init_db()
+    client = app.test_client()
+    response = client.post('/api/auth/register', json={
+        'name': 'Benchmark', 'email': 'bench@example.com', 'password': 'benchmark'})
+    headers = {'Authorization': f"Bearer {response.get_json()['token']}"}
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def hammer(index):
+        local_client = app.test_client()
+        for i in range(requests):
+            start = time.perf_counter()
+            r = local_client.post('/api/notes', headers=headers,
+                                  json={'title': f'Nota {index}-{i}', 'content': 'x' * 200})
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[r.status_code] = statuses.get(r.status_code, 0) + 1
+
+    pool = [threading.Thread(target=hammer, args=(n,)) for n in range(threads)]
+    start = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    total = time.perf_counter() - start
+
+    json.dump({
+        'requests': len(latencies),
+        'ok': statuses.get(201, 0),
+        'errors': len(latencies) - statuses.get(201, 0),
+        'notes_per_sec': round(statuses.get(201, 0) / total, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+    }, sys.stdout)
+
+
+def run_configuration(name, env, threads, requests, database_url=None):
+    env = dict(os.environ, **env,
+               DATABASE_URL=database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'),
+               PASSWORD_HASH_EXECUTOR='inline', PASSWORD_SCRYPT_N='1024')
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker',
+         '--threads', str(threads), '--requests', str(requests)],
+        env=env, cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+    ).stdout
+    return dict(json.loads(output), configuration=name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=50, help='peticiones por hilo')
+    parser.add_argument('--postgres', help='URL de PostgreSQL para incluirla en la comparación')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        return worker(args.threads, args.requests)
+
+    results = [run_configuration(name, env, args.threads, args.requests)
+               for name, env in CONFIGURATIONS]
+    if args.postgres:
+        results.append(run_configuration('PostgreSQL (pool)', {}, args.threads, args.requests,
+                                         args.postgres))
+
+    print(f'{args.threads} hilos x {args.requests} peticiones')
+    print(f"{'configuración':<38}{'notas/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'errores':>9}")
+    for r in results:
+        print(f"{r['configuration']:<38}{r['notes_per_sec']:>9}{r['p50_ms']:>9}{r['p99_ms']:>9}{r['errors']:>9}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
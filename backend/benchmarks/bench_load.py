@@ -0,0 +1,443 @@
+"""Prueba de carga de la API: mezcla concurrente de operaciones sobre un servidor HTTP local
+
+Uso (desde backend/):
+    python benchmarks/bench_load.py [--users 50] [--notes-per-user 200] [--threads 8]
+        [--duration 10] [--warmup 2] [--mix list=30,get=30,create=15,update=10,delete=5,login=8,register=2]
+        [--scrypt-n 16384] [--server dev|asgi] [--workers 1] [--idle-connections 0]
+        [--json resultado.json]
+
+El servidor corre en un proceso aparte (servidor de desarrollo con hilos o asgi.py) con
+una base SQLite temporal que se llena antes de empezar: `--users` usuarios con
+`--notes-per-user` notas cada uno. Los hilos cliente usan conexiones HTTP
+persistentes (http.client) y eligen la operación según los pesos de `--mix`.
+Se reporta throughput, latencias p50/p95/p99 por operación y memoria máxima
+(VmHWM) del servidor y del cliente. Todo es local: no requiere red.
+
+Con menos hilos que usuarios cada hilo trabaja con sus propias notas y no hay
+404/412 por colisiones entre hilos.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = 'benchmark'
+CONTENT = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 4
+DEFAULT_MIX = 'list=30,get=30,create=15,update=10,delete=5,login=8,register=2'
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def user_email(index):
+    return f'user{index}@bench.local'
+
+
+# ============================================
+# SERVIDOR (proceso hijo)
+# ============================================
+
+
+def seed(users, notes_per_user):
+    """Crea usuarios y notas directamente en la BD (todos con la misma contraseña)"""
+    from hashers import password_hasher
+    from models import db, User, Note
+    from sharding import shards
+    from sync import backfill_changes
+
+    password = password_hasher.hash(PASSWORD)
+    db.session.execute(db.insert(User), [
+        {'name': f'Usuario {i}', 'email': user_email(i), 'password': password} for i in range(users)])
+    user_ids = db.session.execute(db.select(User.id)).scalars().all()
+
+    start = datetime.utcnow() - timedelta(days=1)
+    for user_id in user_ids:
+        # Con SHARD_URLS cada usuario va a su shard
+        shards.use(user_id)
+        db.session.execute(db.insert(Note), [{
+            'id': str(uuid.uuid4()), 'title': f'Nota {i}', 'content': CONTENT, 'imageUrl': None,
+            'userId': user_id, 'createdAt': start + timedelta(seconds=i),
+            'updatedAt': start + timedelta(seconds=i),
+        } for i in range(notes_per_user)])
+        db.session.commit()
+    for key in shards.note_binds():
+        with shards.using(key):
+            backfill_changes()
+
+
+def serve(server, port, users, notes_per_user, workers):
+    """Se ejecuta en el proceso hijo: llena la BD y atiende HTTP hasta recibir SIGTERM"""
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    import logging
+    from werkzeug.serving import make_server
+    from app import app, init_db
+    from hashers import password_hasher
+
+    # Sin la línea de acceso de werkzeug por petición
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+
+    init_db()
+    with app.app_context():
+        seed(users, notes_per_user)
+
+    if server == 'asgi':
+        import asgi
+        # uvicorn maneja SIGTERM: deja de aceptar conexiones y espera a las peticiones en curso
+        return asgi.run('127.0.0.1', port, workers)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    httpd = make_server('127.0.0.1', port, app, threaded=True)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Sin esto los procesos del pool de hashing sobreviven al servidor
+        password_hasher.shutdown()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def start_server(args):
+    port = free_port()
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db'),
+               PASSWORD_SCRYPT_N=str(args.scrypt_n), LOG_LEVEL='WARNING',
+               # Todas las peticiones vienen de 127.0.0.1: sin límite de intentos
+               RATELIMIT_ENABLED='False')
+    process = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', '--server', args.server,
+         '--port', str(port), '--workers', str(args.workers),
+         '--users', str(args.users), '--notes-per-user', str(args.notes_per_user)],
+        env=env, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)
+
+    deadline = time.monotonic() + 300
+    while True:
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            raise SystemExit('El servidor no pudo iniciar')
+        probe = Client(port)
+        try:
+            if probe.request('GET', '/api/health')[0] == 200:
+                return process, port
+        except OSError:
+            time.sleep(0.1)
+        finally:
+            probe.close()
+
+
+def peak_rss_mb(pid='self'):
+    """Memoria residente máxima (VmHWM) de un proceso, en MB"""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def tree_peak_rss_mb(pid):
+    """Suma de VmHWM de un proceso y sus descendientes (workers de uvicorn, pool de hashing)"""
+    total = peak_rss_mb(pid)
+    try:
+        with open(f'/proc/{pid}/task/{pid}/children') as f:
+            children = f.read().split()
+    except OSError:
+        children = []
+    return round(total + sum(tree_peak_rss_mb(int(child)) for child in children), 1)
+
+
+def open_idle_connections(port, count):
+    """Conexiones keep-alive que hacen una petición y quedan inactivas (clientes móviles)"""
+    idle = []
+    for _ in range(count):
+        client = Client(port)
+        client.request('GET', '/api/health')
+        idle.append(client)
+    return idle
+
+
+# ============================================
+# CLIENTE
+# ============================================
+
+
+class Client:
+    """Conexión HTTP persistente de un hilo; reconecta si el servidor la cierra"""
+
+    def __init__(self, port):
+        self.port = port
+        self.connection = None
+        self.connects = 0
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        payload = json.dumps(body).encode() if body is not None else None
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+                self.connects += 1
+            try:
+                self.connection.request(method, path, payload, headers)
+                response = self.connection.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.close()
+                return response.status, data
+            except (http.client.HTTPException, OSError):
+                self.close()
+                if attempt:
+                    raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class Session:
+    """Estado de un hilo cliente: su usuario, token y notas conocidas"""
+
+    def __init__(self, client, email):
+        self.client = client
+        self.email = email
+        self.token = None
+        self.notes = []
+
+    def login(self):
+        status, data = self.client.request('POST', '/api/auth/login',
+                                           {'email': self.email, 'password': PASSWORD})
+        if status == 200:
+            self.token = json.loads(data)['token']
+        return status
+
+    def load_notes(self):
+        status, data = self.client.request('GET', '/api/notes?fields=id', token=self.token)
+        self.notes = [note['id'] for note in json.loads(data)] if status == 200 else []
+
+    # --- Operaciones de la mezcla: regresan el código de estado ---
+
+    def op_list(self):
+        return self.client.request('GET', '/api/notes?limit=50', token=self.token)[0]
+
+    def op_get(self):
+        if not self.notes:
+            return self.op_create()
+        return self.client.request('GET', f'/api/notes/{random.choice(self.notes)}', token=self.token)[0]
+
+    def op_create(self):
+        status, data = self.client.request('POST', '/api/notes', {
+            'title': 'Nota de carga', 'content': CONTENT}, token=self.token)
+        if status == 201:
+            self.notes.append(json.loads(data)['id'])
+        return status
+
+    def op_update(self):
+        if not self.notes:
+            return self.op_create()
+        return self.client.request('PUT', f'/api/notes/{random.choice(self.notes)}', {
+            'title': 'Nota editada', 'content': CONTENT[::-1]}, token=self.token)[0]
+
+    def op_delete(self):
+        if not self.notes:
+            return self.op_create()
+        note_id = self.notes.pop(random.randrange(len(self.notes)))
+        return self.client.request('DELETE', f'/api/notes/{note_id}', token=self.token)[0]
+
+    def op_login(self):
+        return self.login()
+
+    def op_register(self):
+        return self.client.request('POST', '/api/auth/register', {
+            'name': 'Nuevo', 'email': f'{uuid.uuid4().hex}@bench.local', 'password': PASSWORD})[0]
+
+
+OPERATIONS = ('list', 'get', 'create', 'update', 'delete', 'login', 'register')
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'operación desconocida: {name}')
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def run_load(port, args):
+    mix = args.mix
+    names = list(mix)
+    weights = [mix[n] for n in names]
+    warmup_end = time.perf_counter() + args.warmup
+    end = warmup_end + args.duration
+
+    # Un token por hilo antes de medir (el costo del login se mide en la operación 'login')
+    sessions = []
+    for index in range(args.threads):
+        session = Session(Client(port), user_email(index % args.users))
+        if session.login() != 200:
+            raise SystemExit(f'No se pudo iniciar sesión como {session.email}')
+        session.load_notes()
+        sessions.append(session)
+
+    results = {name: {'latencies': [], 'errors': 0} for name in names}
+    lock = threading.Lock()
+
+    def drive(session, seed):
+        rng = random.Random(seed)
+        local = {name: {'latencies': [], 'errors': 0} for name in names}
+        while True:
+            now = time.perf_counter()
+            if now >= end:
+                break
+            name = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = getattr(session, f'op_{name}')()
+            except (http.client.HTTPException, OSError):
+                status = 599
+            elapsed = time.perf_counter() - start
+            if start < warmup_end:
+                continue
+            local[name]['latencies'].append(elapsed)
+            if status >= 400:
+                local[name]['errors'] += 1
+        session.client.close()
+        with lock:
+            for name, values in local.items():
+                results[name]['latencies'].extend(values['latencies'])
+                results[name]['errors'] += values['errors']
+
+    threads = [threading.Thread(target=drive, args=(s, args.seed + i)) for i, s in enumerate(sessions)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def summarize(latencies, errors, duration):
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--notes-per-user', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=8, help='hilos cliente concurrentes')
+    parser.add_argument('--duration', type=float, default=10, help='segundos medidos')
+    parser.add_argument('--warmup', type=float, default=2, help='segundos iniciales que no se miden')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'pesos por operación (por defecto {DEFAULT_MIX})')
+    parser.add_argument('--scrypt-n', type=int, default=16384,
+                        help='costo de scrypt del servidor (login/register)')
+    parser.add_argument('--seed', type=int, default=1, help='semilla de la mezcla de operaciones')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    parser.add_argument('--server', choices=('dev', 'asgi'), default='dev',
+                        help='dev: servidor de Werkzeug con hilos; asgi: asgi.py con uvicorn')
+    parser.add_argument('--workers', type=int, default=1, help='procesos del servidor ASGI')
+    parser.add_argument('--idle-connections', type=int, default=0,
+                        help='conexiones keep-alive inactivas abiertas durante la prueba')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        return serve(args.server, args.port, args.users, args.notes_per_user, args.workers)
+
+    started = time.perf_counter()
+    process, port = start_server(args)
+    print(f'Servidor {args.server} listo en :{port} ({args.users} usuarios x {args.notes_per_user} notas, '
+          f'{time.perf_counter() - started:.1f} s)')
+    idle = []
+    try:
+        idle = open_idle_connections(port, args.idle_connections)
+        results = run_load(port, args)
+        # Una conexión sigue viva si responde sin tener que reconectar
+        idle_alive = sum(1 for client in idle
+                         if client.request('GET', '/api/health')[0] == 200 and client.connects == 1)
+        server_rss = tree_peak_rss_mb(process.pid)
+    finally:
+        for client in idle:
+            client.close()
+        process.terminate()
+        process.wait(timeout=60)
+
+    operations = {name: summarize(r['latencies'], r['errors'], args.duration) for name, r in results.items()}
+    total = summarize([v for r in results.values() for v in r['latencies']],
+                      sum(r['errors'] for r in results.values()), args.duration)
+
+    print(f'{args.threads} hilos, {args.duration:g} s, {args.idle_connections} conexiones inactivas '
+          f'({idle_alive} siguen abiertas al final)')
+    print(f"{'operación':<12}{'peticiones':>11}{'errores':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, r in list(operations.items()) + [('total', total)]:
+        print(f"{name:<12}{r['requests']:>11}{r['errors']:>9}{r['rps']:>9}"
+              f"{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}")
+    client_rss = peak_rss_mb()
+    print(f'Memoria máxima: servidor {server_rss} MB, cliente {client_rss} MB')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({
+                'commit': git_commit(),
+                'timestamp': datetime.utcnow().isoformat(),
+                'python': platform.python_version(),
+                'cpus': os.cpu_count(),
+                'config': {k: v for k, v in vars(args).items() if k not in ('json', 'serve', 'port')},
+                'operations': operations,
+                'total': total,
+                'idle_connections_alive': idle_alive,
+                'server_peak_rss_mb': server_rss,
+                'client_peak_rss_mb': client_rss,
+            }, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
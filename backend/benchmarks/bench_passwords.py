@@ -0,0 +1,87 @@
+"""Benchmark de hashing de contraseñas: logins por segundo por núcleo según el costo
+
+Uso (desde backend/):
+    python benchmarks/bench_passwords.py [--logins 20] [--json resultado.json]
+
+Cada configuración se mide en un solo hilo con PASSWORD_HASH_EXECUTOR='inline',
+de modo que el resultado equivale al rendimiento de un núcleo.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ['RATELIMIT_ENABLED'] = 'False'
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from app import app, init_db  # noqa: E402
+from hashers import password_hasher  # noqa: E402
+
+SETTINGS = [
+    {'PASSWORD_HASHER': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 12},
+    {'PASSWORD_HASHER': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 14},
+    {'PASSWORD_HASHER': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 15},
+    {'PASSWORD_HASHER': 'scrypt', 'PASSWORD_SCRYPT_N': 2 ** 16},
+    {'PASSWORD_HASHER': 'pbkdf2_sha256', 'PASSWORD_PBKDF2_ITERATIONS': 100_000},
+    {'PASSWORD_HASHER': 'pbkdf2_sha256', 'PASSWORD_PBKDF2_ITERATIONS': 300_000},
+    {'PASSWORD_HASHER': 'pbkdf2_sha256', 'PASSWORD_PBKDF2_ITERATIONS': 600_000},
+]
+
+
+def label(setting):
+    if setting['PASSWORD_HASHER'] == 'scrypt':
+        return f"scrypt n=2^{setting['PASSWORD_SCRYPT_N'].bit_length() - 1}"
+    return f"pbkdf2_sha256 it={setting['PASSWORD_PBKDF2_ITERATIONS']}"
+
+
+def run(logins):
+    client = app.test_client()
+    results = []
+    for index, setting in enumerate(SETTINGS):
+        app.config.update(setting, PASSWORD_HASH_EXECUTOR='inline')
+        password_hasher.init_app(app)
+
+        email = f'bench{index}@example.com'
+        credentials = {'email': email, 'password': 'benchmark-password'}
+        client.post('/api/auth/register', json=dict(credentials, name='Benchmark'))
+
+        start = time.perf_counter()
+        for _ in range(logins):
+            response = client.post('/api/auth/login', json=credentials)
+            assert response.status_code == 200, response.get_json()
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            'setting': label(setting),
+            'logins': logins,
+            'ms_per_login': round(elapsed / logins * 1000, 2),
+            'logins_per_sec_per_core': round(logins / elapsed, 1),
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--logins', type=int, default=20, help='logins por configuración')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    args = parser.parse_args()
+
+    init_db()
+    results = run(args.logins)
+
+    print(f"{'configuración':<26}{'ms/login':>10}{'logins/s/núcleo':>18}")
+    for r in results:
+        print(f"{r['setting']:<26}{r['ms_per_login']:>10}{r['logins_per_sec_per_core']:>18}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Benchmark del límite de intentos: costo por verificación, memoria y sobrecarga por petición
+
+Uso (desde backend/):
+    python benchmarks/bench_ratelimit.py [--checks 200000] [--keys 100000] [--requests 2000] [--json r.json]
+
+Mide:
+- MemoryStore.consume(): microsegundos por verificación con una llave y con
+  muchas llaves distintas (LRU lleno, con desalojo), y bytes por llave
+- POST /api/auth/verify-reset-token con el limitador habilitado (límites
+  altos, nunca rechaza) contra deshabilitado: sobrecarga por petición
+- Una ráfaga de 100 logins fallidos contra un email: cuántos llegan a hashear
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('LOG_LEVEL', 'ERROR')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ.setdefault('PASSWORD_HASH_EXECUTOR', 'inline')
+
+from app import app, init_db  # noqa: E402
+from ratelimit import MemoryStore, limiter, parse_limit  # noqa: E402
+
+
+def bench_store(checks, keys):
+    capacity, rate = parse_limit('10/60')
+    results = {}
+
+    store = MemoryStore(max_keys=keys)
+    start = time.perf_counter()
+    for _ in range(checks):
+        store.consume('login:ip:127.0.0.1', capacity, rate)
+    results['us_per_check_one_key'] = round((time.perf_counter() - start) / checks * 1e6, 3)
+
+    # Más llaves distintas que max_keys: cada verificación inserta y desaloja
+    names = [f'login:email:user{i}@example.com' for i in range(checks)]
+    store = MemoryStore(max_keys=keys)
+    start = time.perf_counter()
+    for name in names:
+        store.consume(name, capacity, rate)
+    results['us_per_check_distinct_keys'] = round((time.perf_counter() - start) / checks * 1e6, 3)
+    results['keys_kept'] = store.stats()['keys']
+    results['evictions'] = store.evictions
+
+    tracemalloc.start()
+    store = MemoryStore(max_keys=keys)
+    before = tracemalloc.get_traced_memory()[0]
+    for name in names[:keys]:
+        store.consume(name, capacity, rate)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    results['bytes_per_key'] = round(used / keys)
+    results['mb_at_max_keys'] = round(used / 1024 / 1024, 1)
+    return results
+
+
+def time_requests(client, requests):
+    body = {'email': 'nadie@example.com', 'token': '000000'}
+    start = time.perf_counter()
+    for _ in range(requests):
+        client.post('/api/auth/verify-reset-token', json=body)
+    return (time.perf_counter() - start) / requests
+
+
+def bench_requests(requests, rounds=5):
+    client = app.test_client()
+    saved = dict(limiter.rules)
+    limiter.rules = {rule: {scope: (10 ** 9, 10 ** 9) for scope in scopes}
+                     for rule, scopes in saved.items()}
+    time_requests(client, 200)  # calentamiento
+
+    enabled, disabled = [], []
+    for _ in range(rounds):
+        limiter.enabled = True
+        enabled.append(time_requests(client, requests))
+        limiter.enabled = False
+        disabled.append(time_requests(client, requests))
+    limiter.enabled = True
+    limiter.rules = saved
+
+    on, off = min(enabled), min(disabled)
+    return {
+        'us_per_request_enabled': round(on * 1e6, 1),
+        'us_per_request_disabled': round(off * 1e6, 1),
+        'overhead_us': round((on - off) * 1e6, 1),
+        'overhead_pct': round((on - off) / off * 100, 2),
+    }
+
+
+def bench_burst(attempts=100):
+    client = app.test_client()
+    limiter.reset()
+    client.post('/api/auth/register', json={'name': 'Victima', 'email': 'victima@example.com',
+                                            'password': 'correcta'})
+    statuses = {}
+    start = time.perf_counter()
+    for _ in range(attempts):
+        status = client.post('/api/auth/login', json={'email': 'victima@example.com',
+                                                       'password': 'incorrecta'}).status_code
+        statuses[status] = statuses.get(status, 0) + 1
+    return {'attempts': attempts, 'hashed_401': statuses.get(401, 0), 'rejected_429': statuses.get(429, 0),
+            'seconds': round(time.perf_counter() - start, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--checks', type=int, default=200000)
+    parser.add_argument('--keys', type=int, default=100000, help='RATELIMIT_MAX_KEYS')
+    parser.add_argument('--requests', type=int, default=2000, help='peticiones por ronda')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    args = parser.parse_args()
+
+    init_db()
+    results = {
+        'store': bench_store(args.checks, args.keys),
+        'requests': bench_requests(args.requests),
+        'burst': bench_burst(),
+    }
+
+    store, requests, burst = results['store'], results['requests'], results['burst']
+    print(f"consume(): {store['us_per_check_one_key']} us (una llave), "
+          f"{store['us_per_check_distinct_keys']} us (llaves distintas, LRU lleno)")
+    print(f"memoria: {store['bytes_per_key']} B por llave, {store['mb_at_max_keys']} MB con "
+          f"{args.keys} llaves; desalojos: {store['evictions']}")
+    print(f"petición: {requests['us_per_request_enabled']} us con limitador, "
+          f"{requests['us_per_request_disabled']} us sin él "
+          f"(+{requests['overhead_us']} us, {requests['overhead_pct']}%)")
+    print(f"ráfaga de {burst['attempts']} logins fallidos: {burst['hashed_401']} llegaron a hashear, "
+          f"{burst['rejected_429']} rechazados con 429 ({burst['seconds']} s)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Benchmark de serialización de GET /api/notes: to_dict() + jsonify vs. serializers
+
+Uso (desde backend/):
+    python benchmarks/bench_serialization.py [--sizes 1000 10000 100000] [--repeat 3] [--json r.json]
+
+Compara, para un usuario con N notas:
+- original: consulta ORM, Note.to_dict() por nota y jsonify con el proveedor estándar
+- serializers: SELECT de columnas (Core), note_serializer() y json_array_response()
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+from app import app, init_db  # noqa: E402
+from models import db, User, Note  # noqa: E402
+from serializers import note_serializer, json_array_response, orjson  # noqa: E402
+
+CONTENT = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 4
+
+
+def seed(count):
+    """Crea un usuario con `count` notas y regresa su id"""
+    user = User(name='Benchmark', email=f'bench{count}@example.com', password='x')
+    db.session.add(user)
+    db.session.commit()
+    start = datetime.utcnow()
+    rows = [{
+        'id': str(uuid.uuid4()), 'title': f'Nota {i}', 'content': CONTENT, 'imageUrl': None,
+        'userId': user.id, 'createdAt': start + timedelta(seconds=i), 'updatedAt': start,
+    } for i in range(count)]
+    db.session.execute(db.insert(Note), rows)
+    db.session.commit()
+    return user.id
+
+
+def original_path(user_id, provider):
+    notes = Note.query.filter_by(userId=user_id).order_by(Note.createdAt.desc()).all()
+    return provider.response([note.to_dict() for note in notes]).get_data()
+
+
+def serializers_path(user_id):
+    query = (db.select(*Note.columns_for()).where(Note.userId == user_id)
+             .order_by(Note.createdAt.desc(), Note.id))
+    result = db.session.execute(query.execution_options(yield_per=app.config['JSON_STREAM_CHUNK_SIZE']))
+    response = json_array_response(result, note_serializer(),
+                                   app.config['JSON_STREAM_THRESHOLD'],
+                                   app.config['JSON_STREAM_CHUNK_SIZE'])
+    return b''.join(response.response)
+
+
+def best_of(repeat, func, *args):
+    best, body = None, None
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        body = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    args = parser.parse_args()
+
+    init_db()
+    provider = DefaultJSONProvider(app)
+    results = []
+    with app.test_request_context():
+        for size in args.sizes:
+            user_id = seed(size)
+            original, body_a = best_of(args.repeat, original_path, user_id, provider)
+            fast, body_b = best_of(args.repeat, serializers_path, user_id)
+            assert json.loads(body_a) == json.loads(body_b), 'las respuestas no coinciden'
+            results.append({
+                'notes': size,
+                'original_ms': round(original * 1000, 1),
+                'serializers_ms': round(fast * 1000, 1),
+                'speedup': round(original / fast, 2),
+                'bytes': len(body_b),
+            })
+
+    print(f"codificador: {'orjson' if orjson else 'json (stdlib)'}")
+    print(f"{'notas':>8}{'original ms':>14}{'serializers ms':>17}{'aceleración':>13}")
+    for r in results:
+        print(f"{r['notes']:>8}{r['original_ms']:>14}{r['serializers_ms']:>17}{r['speedup']:>12}x")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""Benchmark de shards: escrituras concurrentes de muchos usuarios según el número de shards
+
+Uso (desde backend/):
+    python benchmarks/bench_shards.py [--shards 0,1,2,4,8] [--users 32] [--procs 4]
+        [--threads 8] [--duration 10] [--json resultado.json]
+
+Por cada número de shards se crea una base central y N bases SQLite nuevas en un
+directorio temporal (0 = sin shards, todo en la base central). `--procs`
+procesos con `--threads` hilos cada uno hacen POST /api/notes durante
+`--duration` segundos, cada hilo con uno de los `--users` usuarios, así que las
+escrituras se reparten entre los shards como en producción. Se reporta
+notas/s, latencias y errores (p. ej. "database is locked") por configuración.
+
+El reparto solo escala si hay núcleos libres: con un solo núcleo el costo de
+Python por petición domina y las cifras quedan parecidas.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    if not values:
+        return 0
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def user_email(index):
+    return f'user{index}@bench.local'
+
+
+def _load_app():
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    from app import app, init_db
+    return app, init_db
+
+
+def setup(users, output):
+    """Proceso hijo: crea las bases y los usuarios; guarda sus tokens en `output`"""
+    app, init_db = _load_app()
+    from flask_jwt_extended import create_access_token
+    from models import db, User
+
+    init_db()
+    with app.app_context():
+        db.session.execute(db.insert(User), [
+            {'name': f'Usuario {i}', 'email': user_email(i), 'password': '-'} for i in range(users)])
+        db.session.commit()
+        user_ids = db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
+        tokens = [create_access_token(identity=str(user_id)) for user_id in user_ids]
+    with open(output, 'w') as f:
+        json.dump(tokens, f)
+
+
+def worker(tokens, threads, start_at, duration, output):
+    """Proceso hijo: `threads` hilos escriben notas hasta que se acaba el tiempo"""
+    app, _ = _load_app()
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+
+    def hammer(token):
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        local_latencies, local_statuses = [], {}
+        time.sleep(max(0, start_at - time.time()))
+        end = start_at + duration
+        i = 0
+        while time.time() < end:
+            start = time.perf_counter()
+            r = client.post('/api/notes', headers=headers, json={'title': f'Nota {i}', 'content': 'x' * 200})
+            local_latencies.append(time.perf_counter() - start)
+            local_statuses[r.status_code] = local_statuses.get(r.status_code, 0) + 1
+            i += 1
+        with lock:
+            latencies.extend(local_latencies)
+            for status, count in local_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+
+    pool = [threading.Thread(target=hammer, args=(tokens[n % len(tokens)],)) for n in range(threads)]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    with open(output, 'w') as f:
+        json.dump({'latencies': latencies, 'statuses': statuses}, f)
+
+
+def run_configuration(shard_count, args):
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ,
+               DATABASE_URL='sqlite:///' + os.path.join(directory, 'central.db'),
+               SHARD_URLS=','.join('sqlite:///' + os.path.join(directory, f'notes_{i}.db')
+                                   for i in range(shard_count)),
+               SHARD_COUNT=str(shard_count))
+    script = os.path.abspath(__file__)
+    tokens_path = os.path.join(directory, 'tokens.json')
+    subprocess.run([sys.executable, script, '--setup', '--users', str(args.users), '--output', tokens_path],
+                   env=env, cwd=BACKEND_DIR, capture_output=True, check=True)
+    with open(tokens_path) as f:
+        tokens = json.load(f)
+
+    # Cada proceso recibe su propio grupo de usuarios; todos arrancan a la vez
+    start_at = time.time() + 3
+    processes = []
+    for p in range(args.procs):
+        own = tokens[p::args.procs] or tokens
+        output = os.path.join(directory, f'worker_{p}.json')
+        processes.append((output, subprocess.Popen(
+            [sys.executable, script, '--worker', '--threads', str(args.threads),
+             '--start-at', str(start_at), '--duration', str(args.duration), '--output', output],
+            env=dict(env, BENCH_TOKENS=json.dumps(own)),
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL)))
+    latencies, statuses = [], {}
+    for output, process in processes:
+        if process.wait() != 0:
+            raise RuntimeError(f'El proceso de escritura terminó con código {process.returncode}')
+        with open(output) as f:
+            result = json.load(f)
+        latencies.extend(result['latencies'])
+        for status, count in result['statuses'].items():
+            statuses[status] = statuses.get(status, 0) + count
+
+    ok = statuses.get('201', 0)
+    return {
+        'shards': shard_count,
+        'requests': len(latencies),
+        'ok': ok,
+        'errors': len(latencies) - ok,
+        'notes_per_sec': round(ok / args.duration, 1),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--shards', default='0,1,2,4,8', help='números de shards a comparar')
+    parser.add_argument('--users', type=int, default=32)
+    parser.add_argument('--procs', type=int, default=4, help='procesos que escriben')
+    parser.add_argument('--threads', type=int, default=8, help='hilos por proceso')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    parser.add_argument('--setup', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--worker', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, help=argparse.SUPPRESS)
+    parser.add_argument('--output', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.setup:
+        return setup(args.users, args.output)
+    if args.worker:
+        return worker(json.loads(os.environ['BENCH_TOKENS']), args.threads, args.start_at, args.duration,
+                      args.output)
+
+    results = [run_configuration(int(count), args) for count in args.shards.split(',')]
+
+    print(f'{args.users} usuarios, {args.procs} procesos x {args.threads} hilos, '
+          f'{args.duration:g} s, {os.cpu_count()} CPU')
+    print(f"{'shards':>7}{'notas/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'errores':>9}")
+    for r in results:
+        print(f"{r['shards']:>7}{r['notes_per_sec']:>10}{r['p50_ms']:>9}{r['p99_ms']:>9}{r['errors']:>9}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'cpus': os.cpu_count(), 'users': args.users, 'procs': args.procs,
+                       'threads': args.threads, 'duration': args.duration, 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,127 @@
+"""Benchmark de arranque en frío: importar, crear la aplicación, revisar el esquema y primera petición
+
+Uso (desde backend/):
+    python benchmarks/bench_startup.py [--runs 5] [--top 15] [--max-ms 1500] [--json resultado.json]
+
+Cada corrida es un proceso nuevo contra la misma base SQLite temporal: la
+primera crea el esquema (base nueva) y las demás lo encuentran al día, como un
+worker que arranca por autoescalado. Se reporta la mediana de cada fase y los
+módulos que más tardan en importarse según `python -X importtime`.
+
+Con --max-ms el script termina con código 1 si la mediana del arranque total
+(con el esquema al día) lo supera: sirve como guardia en CI.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PHASES = ('import_ms', 'create_app_ms', 'init_db_ms', 'first_request_ms', 'total_ms')
+
+
+def child(output):
+    """Proceso hijo: mide cada fase del arranque y la guarda en `output`"""
+    import time
+    started = time.perf_counter()
+    sys.path.insert(0, BACKEND_DIR)
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+
+    import app as app_module
+    imported = time.perf_counter()
+    app = app_module.create_app()
+    created = time.perf_counter()
+    app_module.init_db(app)
+    initialized = time.perf_counter()
+    status = app.test_client().get('/api/health').status_code
+    finished = time.perf_counter()
+
+    with open(output, 'w') as f:
+        json.dump({
+            'import_ms': (imported - started) * 1000,
+            'create_app_ms': (created - imported) * 1000,
+            'init_db_ms': (initialized - created) * 1000,
+            'first_request_ms': (finished - initialized) * 1000,
+            'total_ms': (finished - started) * 1000,
+            'status': status,
+        }, f)
+
+
+def run_child(env, directory):
+    output = os.path.join(directory, 'phases.json')
+    subprocess.run([sys.executable, os.path.abspath(__file__), '--child', output],
+                   env=env, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, check=True)
+    with open(output) as f:
+        return json.load(f)
+
+
+def import_profile(env, top):
+    """Módulos con más tiempo propio y acumulado al importar app (python -X importtime)"""
+    stderr = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                            env=env, cwd=BACKEND_DIR, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, check=True).stderr
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append({'module': name.strip(), 'depth': (len(name) - len(name.lstrip())) // 2,
+                     'self_ms': int(own) / 1000, 'cumulative_ms': int(cumulative) / 1000})
+    # Hijos directos de `import app`: qué cuesta cada dependencia
+    direct = [row for row in rows if row['depth'] == 1]
+    return {
+        'total_ms': next((row['cumulative_ms'] for row in rows if row['module'] == 'app'), 0),
+        'by_cumulative': sorted(direct, key=lambda row: -row['cumulative_ms'])[:top],
+        'by_self': sorted(rows, key=lambda row: -row['self_ms'])[:top],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='arranques con el esquema al día')
+    parser.add_argument('--top', type=int, default=15, help='módulos a listar del perfil de importación')
+    parser.add_argument('--max-ms', type=float, help='fallar si la mediana del arranque supera este tiempo')
+    parser.add_argument('--json', help='guardar resultados en este archivo')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(args.child)
+
+    directory = tempfile.mkdtemp()
+    env = dict(os.environ, LOG_LEVEL='WARNING',
+               DATABASE_URL='sqlite:///' + os.path.join(directory, 'startup.db'))
+
+    fresh = run_child(env, directory)
+    warm = [run_child(env, directory) for _ in range(args.runs)]
+    median = {phase: round(statistics.median(run[phase] for run in warm), 1) for phase in PHASES}
+    profile = import_profile(env, args.top)
+
+    print(f'{args.runs} arranques, {os.cpu_count()} CPU')
+    print(f"{'fase':<20}{'base nueva':>12}{'al día (mediana)':>18}")
+    for phase in PHASES:
+        print(f'{phase:<20}{fresh[phase]:>12.1f}{median[phase]:>18.1f}')
+    print(f"\nimport app: {profile['total_ms']:.1f} ms (-X importtime)")
+    print(f"{'módulo (importado por app)':<40}{'acumulado ms':>14}")
+    for row in profile['by_cumulative']:
+        print(f"{row['module']:<40}{row['cumulative_ms']:>14.1f}")
+    print(f"\n{'módulo (tiempo propio)':<40}{'propio ms':>14}")
+    for row in profile['by_self']:
+        print(f"{row['module']:<40}{row['self_ms']:>14.1f}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'cpus': os.cpu_count(), 'runs': args.runs, 'fresh': fresh, 'median': median,
+                       'import_profile': profile}, f, indent=2)
+
+    if args.max_ms is not None and median['total_ms'] > args.max_ms:
+        print(f"\nArranque de {median['total_ms']:.1f} ms por encima del límite de {args.max_ms:g} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
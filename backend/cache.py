@@ -0,0 +1,220 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from models import User
+from serializers import dumps
+
+# ============================================
+# BACKENDS
+# ============================================
+
+
+class MemoryCache:
+    """Caché LRU con TTL en memoria del proceso (también sirve como fake en pruebas)"""
+
+    def __init__(self, max_entries=10000, default_ttl=300):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl or self.default_ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'size': len(self._data),
+                'maxEntries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+class RedisCache:
+    """Caché compartida entre workers (requiere el paquete `redis`)
+
+    Los valores se guardan como JSON, nunca con pickle: quien pueda escribir en
+    el Redis no debe poder ejecutar código en la API. Solo acepta valores que
+    JSON representa (dicts de la API, snapshots de usuario).
+    """
+
+    def __init__(self, url, default_ttl=300, prefix='notas:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND='redis' requiere instalar el paquete redis")
+        self._client = redis.Redis.from_url(url)
+        self.default_ttl = default_ttl
+        self.prefix = prefix
+        self.hits = self.misses = 0
+
+    def get(self, key):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key, value, ttl=None):
+        self._client.setex(self.prefix + key, int(ttl or self.default_ttl), dumps(value))
+
+    def delete(self, *keys):
+        if keys:
+            self._client.delete(*(self.prefix + key for key in keys))
+
+    def clear(self):
+        for key in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(key)
+
+    def stats(self):
+        return {'backend': 'redis', 'hits': self.hits, 'misses': self.misses}
+
+
+class NullCache:
+    """Caché deshabilitada: nunca guarda nada"""
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def clear(self):
+        pass
+
+    def stats(self):
+        return {'backend': 'null'}
+
+
+# ============================================
+# EXTENSIÓN
+# ============================================
+
+
+class CacheManager:
+    """Punto único de acceso a la caché; el backend se elige con CACHE_BACKEND"""
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.user_ttl = 60
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        kind = config.get('CACHE_BACKEND', 'memory')
+        ttl = config.get('CACHE_DEFAULT_TTL', 300)
+        if kind == 'memory':
+            self.backend = MemoryCache(config.get('CACHE_MAX_ENTRIES', 10000), ttl)
+        elif kind == 'redis':
+            self.backend = RedisCache(config['CACHE_REDIS_URL'], ttl)
+        elif kind == 'null':
+            self.backend = NullCache()
+        else:
+            raise ValueError(f'CACHE_BACKEND desconocido: {kind}')
+        self.user_ttl = config.get('CACHE_USER_TTL', 60)
+        app.extensions['cache'] = self
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+    def delete(self, *keys):
+        self.backend.delete(*keys)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+
+cache = CacheManager()
+
+
+# ============================================
+# LLAVES E INVALIDACIÓN
+# ============================================
+
+def user_id_key(user_id):
+    return f'user:id:{user_id}'
+
+
+def note_key(user_id, note_id, updated_at):
+    """La versión (updatedAt) es parte de la llave: una nota editada nunca se sirve vieja"""
+    return f'note:{user_id}:{note_id}:{updated_at.isoformat() if updated_at else ""}'
+
+
+def invalidate_user(user):
+    """Olvida las copias en caché de un usuario después de modificarlo"""
+    cache.delete(user_id_key(user.id))
+
+
+def invalidate_note(user_id, note_id, updated_at):
+    cache.delete(note_key(user_id, note_id, updated_at))
+
+
+# ============================================
+# CONSULTAS CACHEADAS
+# ============================================
+
+def _cached_user(key, query):
+    snapshot = cache.get(key)
+    if snapshot is None:
+        user = query.first()
+        if user is None:
+            return None
+        snapshot = user.snapshot()
+        cache.set(key, snapshot, cache.user_ttl)
+    # Instancia transitoria (fuera de la sesión), sin hash ni código de
+    # recuperación: solo lectura
+    return User(**snapshot)
+
+
+def get_user_by_id(user_id):
+    """Usuario por id desde la caché (sin secretos); para verificar la contraseña o modificarlo, cargarlo de la base"""
+    return _cached_user(user_id_key(user_id), User.query.filter_by(id=user_id))
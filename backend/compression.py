@@ -0,0 +1,194 @@
+import io
+import json
+import zlib
+
+from flask import request
+from werkzeug.wsgi import get_input_stream
+
+try:
+    import brotli
+except ImportError:  # brotli es opcional: sin él solo se negocia gzip
+    brotli = None
+
+# ============================================
+# COMPRESIÓN DE RESPUESTAS
+# ============================================
+#
+# La codificación se negocia con Accept-Encoding (br si el paquete brotli está
+# instalado y el cliente lo prefiere, si no gzip). Las respuestas completas se
+# comprimen de una vez si superan COMPRESS_MIN_SIZE; las que van en streaming
+# (listas grandes, exportación) se comprimen por fragmento con un flush de
+# sincronización, así el cliente puede ir descomprimiendo lo que ya recibió.
+#
+# El ETag no cambia al comprimir: identifica la versión de la nota, no los
+# bytes, y se compara en If-Match; Vary: Accept-Encoding separa ambas
+# representaciones en las cachés intermedias.
+
+GZIP_WBITS = 31  # zlib con encabezado gzip
+DEFLATE_WBITS = 15  # zlib (Content-Encoding: deflate)
+
+
+def negotiate_encoding(accept_encodings):
+    """Codificación a usar según Accept-Encoding, o None"""
+    candidates = ['gzip']
+    if brotli is not None:
+        candidates.insert(0, 'br')
+    best = accept_encodings.best_match(candidates)
+    return best if best and accept_encodings[best] > 0 else None
+
+
+class _Compressor:
+    """Interfaz común para gzip (zlib) y brotli en streaming"""
+
+    def __init__(self, encoding, level, brotli_quality):
+        self.encoding = encoding
+        self.brotli_quality = brotli_quality
+        if encoding == 'br':
+            self._brotli = brotli.Compressor(quality=brotli_quality)
+        else:
+            self._zlib = zlib.compressobj(level, zlib.DEFLATED, GZIP_WBITS)
+
+    def chunk(self, data):
+        """Comprime `data` y vacía el compresor para que el fragmento se pueda enviar ya"""
+        if self.encoding == 'br':
+            return self._brotli.process(data) + self._brotli.flush()
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        if self.encoding == 'br':
+            return self._brotli.finish()
+        return self._zlib.flush(zlib.Z_FINISH)
+
+    def whole(self, data):
+        """Comprime una respuesta completa (sin flushes intermedios)"""
+        if self.encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return self._zlib.compress(data) + self._zlib.flush(zlib.Z_FINISH)
+
+
+def _compress_stream(iterable, compressor):
+    try:
+        for data in iterable:
+            if isinstance(data, str):
+                data = data.encode()
+            if data:
+                yield compressor.chunk(data)
+        yield compressor.finish()
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+
+
+class Compression:
+    """Comprime las respuestas JSON/NDJSON/texto según Accept-Encoding"""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.level = 6
+        self.brotli_quality = 4
+        self.min_size = 1024
+        self.mimetypes = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('COMPRESS_ENABLED', True)
+        self.level = config.get('COMPRESS_LEVEL', 6)
+        self.brotli_quality = config.get('COMPRESS_BROTLI_QUALITY', 4)
+        self.min_size = config.get('COMPRESS_MIN_SIZE', 1024)
+        self.mimetypes = set(config.get('COMPRESS_MIMETYPES', ()))
+        app.after_request(self.compress_response)
+        app.wsgi_app = DecompressRequestMiddleware(
+            app.wsgi_app, config.get('COMPRESS_MAX_REQUEST_BYTES', 10 * 1024 * 1024),
+            skip_paths=config.get('COMPRESS_STREAMING_PATHS', ()))
+        app.extensions['compression'] = self
+
+    def compress_response(self, response):
+        if response.mimetype not in self.mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+
+        if (not self.enabled or request.method == 'HEAD' or response.direct_passthrough
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers):
+            return response
+        encoding = negotiate_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        compressor = _Compressor(encoding, self.level, self.brotli_quality)
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, compressor)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(compressor.whole(data))
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+compression = Compression()
+
+
+# ============================================
+# CUERPOS DE PETICIÓN COMPRIMIDOS
+# ============================================
+
+
+class RequestBodyTooLarge(ValueError):
+    """El cuerpo descomprimido excede el máximo permitido"""
+
+
+def decompress_body(stream, encoding, max_size, chunk_size=64 * 1024):
+    """Descomprime un cuerpo gzip/deflate completo sin pasar de `max_size` bytes"""
+    decompressor = zlib.decompressobj(GZIP_WBITS if encoding == 'gzip' else DEFLATE_WBITS)
+    output = io.BytesIO()
+    while not decompressor.eof:
+        data = decompressor.unconsumed_tail or stream.read(chunk_size)
+        if not data:
+            raise EOFError('Cuerpo comprimido incompleto')
+        # max_length acota la memoria aunque el cuerpo sea una "bomba" de compresión
+        output.write(decompressor.decompress(data, max_size + 1 - output.tell()))
+        if output.tell() > max_size:
+            raise RequestBodyTooLarge(f'El cuerpo excede {max_size} bytes')
+    return output.getvalue()
+
+
+class DecompressRequestMiddleware:
+    """Acepta peticiones con Content-Encoding gzip o deflate
+
+    El cuerpo se descomprime antes de llegar a Flask, así que request.get_json()
+    funciona igual en create, update y batch. Las rutas de `skip_paths` (la
+    importación) reciben el cuerpo comprimido y lo leen en streaming.
+    """
+
+    def __init__(self, wsgi_app, max_size, skip_paths=()):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+        self.skip_paths = set(skip_paths)
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding not in ('gzip', 'deflate') or environ.get('PATH_INFO') in self.skip_paths:
+            return self.wsgi_app(environ, start_response)
+
+        try:
+            body = decompress_body(get_input_stream(environ), encoding, self.max_size)
+        except RequestBodyTooLarge as e:
+            return self._error(start_response, '413 Request Entity Too Large', str(e))
+        except (zlib.error, EOFError):
+            return self._error(start_response, '400 Bad Request', 'El cuerpo comprimido está dañado')
+
+        environ['wsgi.input'] = io.BytesIO(body)
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ.pop('HTTP_CONTENT_ENCODING')
+        return self.wsgi_app(environ, start_response)
+
+    @staticmethod
+    def _error(start_response, status, message):
+        body = json.dumps({'error': message}, ensure_ascii=False).encode()
+        start_response(status, [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+        return [body]
@@ -7,22 +7,241 @@ class Config:
     # Seguridad
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'dev-secret-key-change-in-production-2024'
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-key-change-in-production-2024'
-    JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
+    # Vigencia de los tokens: el de acceso se renueva con POST /api/auth/refresh.
+    # 24 h por compatibilidad con clientes que aún no usan el refresh token;
+    # con clientes que renuevan, bajar a ~15 minutos (JWT_ACCESS_TOKEN_MINUTES=15)
+    JWT_ACCESS_TOKEN_EXPIRES = timedelta(minutes=int(os.environ.get('JWT_ACCESS_TOKEN_MINUTES', 24 * 60)))
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=int(os.environ.get('JWT_REFRESH_TOKEN_DAYS', 30)))
+    
+    # Revocación de tokens (ver revocation.py): filtro de Bloom para REVOCATION_CAPACITY
+    # tokens con REVOCATION_ERROR_RATE de falsos positivos; retraso máximo entre procesos
+    REVOCATION_CAPACITY = int(os.environ.get('REVOCATION_CAPACITY', 100000))
+    REVOCATION_ERROR_RATE = float(os.environ.get('REVOCATION_ERROR_RATE', 0.001))
+    REVOCATION_REFRESH_SECONDS = float(os.environ.get('REVOCATION_REFRESH_SECONDS', 5))
+    REVOCATION_REBUILD_SECONDS = float(os.environ.get('REVOCATION_REBUILD_SECONDS', 3600))
     
     # Desactivar CSRF para tokens Bearer (APIs REST)
     JWT_COOKIE_CSRF_PROTECT = False
     JWT_CSRF_CHECK_FORM = False
     
+    # Hashing de contraseñas: 'scrypt' o 'pbkdf2_sha256'
+    # Los hashes con otro algoritmo o costo se actualizan al iniciar sesión
+    PASSWORD_HASHER = os.environ.get('PASSWORD_HASHER', 'scrypt')
+    PASSWORD_SCRYPT_N = int(os.environ.get('PASSWORD_SCRYPT_N', 2 ** 14))
+    PASSWORD_SCRYPT_R = int(os.environ.get('PASSWORD_SCRYPT_R', 8))
+    PASSWORD_SCRYPT_P = int(os.environ.get('PASSWORD_SCRYPT_P', 1))
+    PASSWORD_PBKDF2_ITERATIONS = int(os.environ.get('PASSWORD_PBKDF2_ITERATIONS', 600000))
+    # Dónde se ejecuta el hashing: 'process' (pool de procesos), 'thread' o 'inline'
+    PASSWORD_HASH_EXECUTOR = os.environ.get('PASSWORD_HASH_EXECUTOR', 'process')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    # Segundos máximos esperando lugar en el pool antes de responder 503
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 10))
+    
     # Base de datos
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///database.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Réplica de solo lectura para GET /api/notes y GET /api/notes/<id> (opcional)
+    # Con SQLite puede ser el mismo archivo en modo lectura:
+    #   sqlite:///file:database.db?mode=ro&uri=true
+    DATABASE_READ_URL = os.environ.get('DATABASE_READ_URL')
+    
+    # Notas repartidas en varias bases por usuario (ver sharding.py); la tabla de
+    # usuarios y demás tablas centrales siguen en DATABASE_URL.
+    # SHARD_URLS: bases disponibles, separadas por coma (ej. sqlite:///notes_0.db,sqlite:///notes_1.db)
+    # SHARD_COUNT: cuántas de ellas (las primeras) reparten usuarios; 0 = todo en DATABASE_URL.
+    # Para crecer: agregar URLs, `flask --app app shards-rebalance --to N`, luego SHARD_COUNT=N
+    SHARD_URLS = [url.strip() for url in os.environ.get('SHARD_URLS', '').split(',') if url.strip()]
+    SHARD_COUNT = int(os.environ.get('SHARD_COUNT', len(SHARD_URLS)))
+    # Cada cuánto se relee el directorio de usuarios en migración (user_shards)
+    SHARD_DIRECTORY_REFRESH_SECONDS = float(os.environ.get('SHARD_DIRECTORY_REFRESH_SECONDS', 5))
+    
+    # SQLite: PRAGMA aplicados a cada conexión (ver database.py)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    
+    # PostgreSQL/MySQL: pool de conexiones
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', 'True').lower() == 'true'
+    
+    # Máximo de operaciones por petición a POST /api/notes/batch
+    BATCH_MAX_OPERATIONS = int(os.environ.get('BATCH_MAX_OPERATIONS', 500))
+    
+    # PATCH /api/notes/<id>: máximo de operaciones en un delta de texto
+    NOTE_DELTA_MAX_OPERATIONS = int(os.environ.get('NOTE_DELTA_MAX_OPERATIONS', 1000))
+    # Historial de revisiones como deltas inversos (ver revisions.py); cuántas conservar por nota
+    NOTE_HISTORY_ENABLED = os.environ.get('NOTE_HISTORY_ENABLED', 'True').lower() == 'true'
+    NOTE_HISTORY_MAX_REVISIONS = int(os.environ.get('NOTE_HISTORY_MAX_REVISIONS', 50))
+    
+    # GET /api/notes sin paginar: a partir de cuántas notas se envía por partes
+    JSON_STREAM_THRESHOLD = int(os.environ.get('JSON_STREAM_THRESHOLD', 1000))
+    JSON_STREAM_CHUNK_SIZE = int(os.environ.get('JSON_STREAM_CHUNK_SIZE', 500))
+    
+    # Tamaño máximo del cuerpo de una petición (413 si lo excede); asgi.py lo
+    # revisa mientras recibe el cuerpo, antes de guardarlo. Cubre importaciones
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 64 * 1024 * 1024))
+    
+    # Exportación/importación NDJSON: notas por bloque (consulta, inserción y commit)
+    TRANSFER_CHUNK_SIZE = int(os.environ.get('TRANSFER_CHUNK_SIZE', 1000))
+    IMPORT_MAX_LINE_BYTES = int(os.environ.get('IMPORT_MAX_LINE_BYTES', 1024 * 1024))
+    
+    # Caché: 'memory' (LRU por proceso), 'redis' (compartida entre workers) o 'null'
+    # Con varios workers usar 'redis' para que la invalidación llegue a todos
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+    CACHE_REDIS_URL = os.environ.get('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', 10000))
+    CACHE_DEFAULT_TTL = int(os.environ.get('CACHE_DEFAULT_TTL', 300))
+    CACHE_USER_TTL = int(os.environ.get('CACHE_USER_TTL', 60))
     
     # CORS - Permitir peticiones desde cualquier origen (para desarrollo)
     # En producción, especificar dominios permitidos
     CORS_ORIGINS = ['*']
     
+    # Logging: nivel, formato ('json' o 'text') y muestreo por nivel (ej. DEBUG=0.1)
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_ASYNC = os.environ.get('LOG_ASYNC', 'True').lower() == 'true'
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+    LOG_SAMPLE_RATES = {
+        'DEBUG': float(os.environ.get('LOG_SAMPLE_DEBUG', 1.0)),
+        'INFO': float(os.environ.get('LOG_SAMPLE_INFO', 1.0)),
+    }
+    
+    # Límite de intentos en autenticación (token bucket): 'intentos/segundos' por
+    # IP, email y deviceId. Con varios workers usar RATELIMIT_STORAGE='redis'.
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True').lower() == 'true'
+    RATELIMIT_STORAGE = os.environ.get('RATELIMIT_STORAGE', 'memory')
+    RATELIMIT_REDIS_URL = os.environ.get('RATELIMIT_REDIS_URL', 'redis://localhost:6379/1')
+    RATELIMIT_MAX_KEYS = int(os.environ.get('RATELIMIT_MAX_KEYS', 100000))
+    RATELIMIT_RULES = {
+        'register': {'ip': os.environ.get('RATELIMIT_REGISTER_IP', '10/3600')},
+        'login': {
+            'ip': os.environ.get('RATELIMIT_LOGIN_IP', '30/60'),
+            'email': os.environ.get('RATELIMIT_LOGIN_EMAIL', '10/300'),
+            'device': os.environ.get('RATELIMIT_LOGIN_DEVICE', '20/300'),
+        },
+        'forgot-password': {
+            'ip': os.environ.get('RATELIMIT_FORGOT_IP', '10/600'),
+            'email': os.environ.get('RATELIMIT_FORGOT_EMAIL', '3/600'),
+        },
+        'verify-reset-token': {
+            'ip': os.environ.get('RATELIMIT_RESET_IP', '20/600'),
+            'email': os.environ.get('RATELIMIT_RESET_EMAIL', '5/600'),
+        },
+        'reset-password': {
+            'ip': os.environ.get('RATELIMIT_RESET_IP', '20/600'),
+            'email': os.environ.get('RATELIMIT_RESET_EMAIL', '5/600'),
+        },
+        'unlink-device': {
+            'ip': os.environ.get('RATELIMIT_UNLINK_IP', '10/600'),
+            'email': os.environ.get('RATELIMIT_UNLINK_EMAIL', '5/600'),
+            'device': os.environ.get('RATELIMIT_UNLINK_DEVICE', '5/600'),
+        },
+    }
+    
+    # Imágenes de las notas: almacén por SHA-256 en disco y miniaturas (requiere Pillow)
+    IMAGE_STORAGE_DIR = os.environ.get('IMAGE_STORAGE_DIR') or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), 'media')
+    IMAGE_MAX_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024))
+    IMAGE_THUMBNAIL_SIZE = int(os.environ.get('IMAGE_THUMBNAIL_SIZE', 256))
+    IMAGE_THUMBNAIL_WORKERS = int(os.environ.get('IMAGE_THUMBNAIL_WORKERS', 2))
+    # True detrás de nginx/Apache con X-Sendfile: el servidor web envía el archivo
+    IMAGE_USE_X_SENDFILE = os.environ.get('IMAGE_USE_X_SENDFILE', 'False').lower() == 'true'
+    # purge_images solo borra archivos sin uso que no cambian desde hace este tiempo
+    IMAGE_PURGE_GRACE_SECONDS = int(os.environ.get('IMAGE_PURGE_GRACE_SECONDS', 3600))
+    
+    # Compresión de respuestas (gzip, o br si está instalado brotli) a partir de
+    # COMPRESS_MIN_SIZE bytes; las peticiones pueden enviar Content-Encoding: gzip
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'True').lower() == 'true'
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_MIMETYPES = ('application/json', 'application/x-ndjson', 'text/plain', 'text/event-stream')
+    COMPRESS_MAX_REQUEST_BYTES = int(os.environ.get('COMPRESS_MAX_REQUEST_BYTES', 10 * 1024 * 1024))
+    # Rutas que leen el cuerpo comprimido por su cuenta, en streaming
+    COMPRESS_STREAMING_PATHS = ('/api/notes/import',)
+    
+    # Trabajos en segundo plano (ver jobs.py): hilos worker en el proceso del servidor
+    # (JOBS_RUN_IN_PROCESS) o en un proceso aparte con: flask --app app jobs-worker
+    JOBS_RUN_IN_PROCESS = os.environ.get('JOBS_RUN_IN_PROCESS', 'True').lower() == 'true'
+    JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', 2))
+    JOBS_POLL_INTERVAL = float(os.environ.get('JOBS_POLL_INTERVAL', 1.0))
+    JOBS_SCHEDULER_INTERVAL = float(os.environ.get('JOBS_SCHEDULER_INTERVAL', 30))
+    # Segundos en ejecución tras los que un trabajo se da por abandonado (mayor que el VACUUM más largo)
+    JOBS_LOCK_TIMEOUT = int(os.environ.get('JOBS_LOCK_TIMEOUT', 3600))
+    JOBS_MAX_ATTEMPTS = int(os.environ.get('JOBS_MAX_ATTEMPTS', 5))
+    JOBS_RETRY_BASE_SECONDS = float(os.environ.get('JOBS_RETRY_BASE_SECONDS', 5))
+    JOBS_RETRY_MAX_SECONDS = float(os.environ.get('JOBS_RETRY_MAX_SECONDS', 3600))
+    JOBS_RETENTION_DAYS = int(os.environ.get('JOBS_RETENTION_DAYS', 7))
+    # Tareas periódicas: segundos entre ejecuciones (0 desactiva)
+    JOBS_SCHEDULE = {
+        'expire_reset_tokens': int(os.environ.get('JOBS_EXPIRE_RESET_TOKENS_EVERY', 15 * 60)),
+        'purge_jobs': int(os.environ.get('JOBS_PURGE_EVERY', 24 * 3600)),
+        'purge_revocations': int(os.environ.get('JOBS_PURGE_REVOCATIONS_EVERY', 24 * 3600)),
+        'purge_idempotency_keys': int(os.environ.get('JOBS_PURGE_IDEMPOTENCY_EVERY', 3600)),
+        'purge_images': int(os.environ.get('JOBS_PURGE_IMAGES_EVERY', 24 * 3600)),
+        'recompute_note_summaries': int(os.environ.get('JOBS_RECOMPUTE_SUMMARIES_EVERY', 24 * 3600)),
+        'analyze': int(os.environ.get('JOBS_ANALYZE_EVERY', 24 * 3600)),
+        'vacuum': int(os.environ.get('JOBS_VACUUM_EVERY', 7 * 24 * 3600)),
+    }
+    
+    # Correo: 'smtp', 'console' (solo log, desarrollo) o 'memory' (pruebas)
+    MAIL_BACKEND = os.environ.get('MAIL_BACKEND', 'console')
+    MAIL_FROM = os.environ.get('MAIL_FROM', 'Notas App <no-reply@localhost>')
+    MAIL_SMTP_HOST = os.environ.get('MAIL_SMTP_HOST', 'localhost')
+    MAIL_SMTP_PORT = int(os.environ.get('MAIL_SMTP_PORT', 25))
+    MAIL_SMTP_USERNAME = os.environ.get('MAIL_SMTP_USERNAME')
+    MAIL_SMTP_PASSWORD = os.environ.get('MAIL_SMTP_PASSWORD')
+    MAIL_SMTP_USE_TLS = os.environ.get('MAIL_SMTP_USE_TLS', 'False').lower() == 'true'
+    MAIL_SMTP_TIMEOUT = float(os.environ.get('MAIL_SMTP_TIMEOUT', 10))
+    # Incluir el código de recuperación en la respuesta de forgot-password (solo desarrollo)
+    RESET_TOKEN_IN_RESPONSE = os.environ.get(
+        'RESET_TOKEN_IN_RESPONSE', os.environ.get('FLASK_DEBUG', 'True')).lower() == 'true'
+    
+    # Idempotency-Key en POST /api/notes y /api/notes/batch (ver idempotency.py)
+    IDEMPOTENCY_ENABLED = os.environ.get('IDEMPOTENCY_ENABLED', 'True').lower() == 'true'
+    # Cuánto tiempo se puede reintentar con la misma llave y recibir la misma respuesta
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+    # Respuestas recientes en memoria (además de la tabla idempotency_keys)
+    IDEMPOTENCY_MAX_ENTRIES = int(os.environ.get('IDEMPOTENCY_MAX_ENTRIES', 10000))
+    # Tras cuántos segundos una petición "en curso" se da por abandonada
+    IDEMPOTENCY_LOCK_SECONDS = int(os.environ.get('IDEMPOTENCY_LOCK_SECONDS', 60))
+    
+    # Métricas en /api/metrics: umbral de consulta lenta y de consultas repetidas (N+1)
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'True').lower() == 'true'
+    # Con token, /api/metrics pide Authorization: Bearer <token>; sin él solo
+    # responde a clientes locales (127.0.0.1/::1)
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+    METRICS_SLOW_QUERY_MS = float(os.environ.get('METRICS_SLOW_QUERY_MS', 100))
+    METRICS_N_PLUS_ONE_THRESHOLD = int(os.environ.get('METRICS_N_PLUS_ONE_THRESHOLD', 10))
+    
     # Configuración de la aplicación
     DEBUG = os.environ.get('FLASK_DEBUG', 'True').lower() == 'true'
     HOST = os.environ.get('FLASK_HOST', '192.168.109.8')
     PORT = int(os.environ.get('FLASK_PORT', 5000))
+    
+    # Servidor de producción (asgi.py): procesos, hilos para los handlers (no más
+    # que DB_POOL_SIZE), keep-alive de clientes inactivos y espera al detenerse
+    SERVER_WORKERS = int(os.environ.get('SERVER_WORKERS', 1))
+    SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 10))
+    SERVER_BACKLOG = int(os.environ.get('SERVER_BACKLOG', 2048))
+    SERVER_LIMIT_CONCURRENCY = int(os.environ.get('SERVER_LIMIT_CONCURRENCY', 0))  # 0 = sin límite
+    SERVER_KEEPALIVE_TIMEOUT = int(os.environ.get('SERVER_KEEPALIVE_TIMEOUT', 75))
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('SERVER_GRACEFUL_TIMEOUT', 30))
 
+    
+    # Stream de cambios (GET /api/notes/stream, Server-Sent Events)
+    SSE_HEARTBEAT_SECONDS = float(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+    # Cambios sin entregar por stream antes de pedir al cliente que resincronice
+    SSE_BUFFER_SIZE = int(os.environ.get('SSE_BUFFER_SIZE', 100))
+    SSE_MAX_STREAMS_PER_USER = int(os.environ.get('SSE_MAX_STREAMS_PER_USER', 5))
+    # El stream se cierra a este límite o al vencer el JWT; el cliente reconecta con Last-Event-ID
+    SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', 3600))
+    SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', 3000))
+    # El bus de eventos es por proceso: con varios workers, revisar la bitácora en cada heartbeat
+    SSE_POLL_ON_HEARTBEAT = os.environ.get(
+        'SSE_POLL_ON_HEARTBEAT', str(SERVER_WORKERS > 1)).lower() == 'true'
@@ -0,0 +1,107 @@
+from flask import current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from models import db
+
+# ============================================
+# CONFIGURACIÓN DE MOTORES DE BASE DE DATOS
+# ============================================
+#
+# SQLite: cada conexión nueva aplica los PRAGMA de Config (WAL, synchronous,
+# busy_timeout, mmap_size). WAL permite lectores concurrentes con un escritor y
+# synchronous=NORMAL evita un fsync por commit; busy_timeout hace que un
+# escritor espere al lock en lugar de fallar con "database is locked".
+#
+# Otros motores (PostgreSQL, MySQL): se configura el pool de conexiones.
+#
+# Réplica de lectura: si DATABASE_READ_URL está definida se registra como el
+# bind 'replica' y read_bind() la entrega a las consultas de solo lectura.
+#
+# Shards: cada URL de SHARD_URLS se registra como el bind 'shard<i>' (ver sharding.py).
+
+REPLICA_BIND = 'replica'
+
+
+def shard_bind(index):
+    return f'shard{index}'
+
+
+def _is_sqlite(uri):
+    return make_url(uri).get_backend_name() == 'sqlite'
+
+
+def engine_options(config, uri):
+    """Opciones de create_engine() según el tipo de base de datos"""
+    if _is_sqlite(uri):
+        return {
+            # timeout del driver en segundos (equivale a busy_timeout)
+            'connect_args': {'timeout': config['SQLITE_BUSY_TIMEOUT_MS'] / 1000,
+                             'check_same_thread': False},
+        }
+    return {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+    }
+
+
+def sqlite_pragmas(config, read_only=False):
+    """PRAGMA que se ejecutan al abrir cada conexión SQLite"""
+    pragmas = [
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+    ]
+    # journal_mode se guarda en el archivo: una conexión de solo lectura no puede cambiarlo
+    if not read_only and config['SQLITE_JOURNAL_MODE']:
+        pragmas.insert(0, ('journal_mode', config['SQLITE_JOURNAL_MODE']))
+    return pragmas
+
+
+def _install_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+
+
+def configure_database(app):
+    """Prepara las opciones de los motores; llamar antes de db.init_app(app)"""
+    config = app.config
+    uri = config['SQLALCHEMY_DATABASE_URI']
+    config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(config, uri))
+
+    binds = dict(config.get('SQLALCHEMY_BINDS') or {})
+    replica_uri = config.get('DATABASE_READ_URL')
+    if replica_uri:
+        binds[REPLICA_BIND] = dict(engine_options(config, replica_uri), url=replica_uri)
+    for index, shard_uri in enumerate(config.get('SHARD_URLS') or ()):
+        binds[shard_bind(index)] = dict(engine_options(config, shard_uri), url=shard_uri)
+    if binds:
+        config['SQLALCHEMY_BINDS'] = binds
+
+
+def install_engine_hooks(app):
+    """Registra los PRAGMA en los motores SQLite; llamar después de db.init_app(app)"""
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name == 'sqlite':
+                _install_pragmas(engine, sqlite_pragmas(app.config, read_only=key == REPLICA_BIND))
+
+
+def read_bind():
+    """bind_arguments para session.execute() de consultas de solo lectura
+
+    Si hay réplica configurada las consultas van a ella; si no, al motor principal.
+    Con shards la réplica no tiene las notas: se deja que la sesión elija el shard.
+    Uso: db.session.execute(stmt, bind_arguments=read_bind())
+    """
+    if current_app.config.get('SHARD_URLS'):
+        return {}
+    engine = db.engines.get(REPLICA_BIND)
+    return {'bind': engine} if engine is not None else {}
@@ -0,0 +1,33 @@
+import hashlib
+
+from database import read_bind
+from models import db, NoteChange
+
+
+def make_etag(*parts):
+    """ETag fuerte a partir de valores que identifican la versión de un recurso"""
+    return hashlib.sha1('|'.join(str(p) for p in parts).encode()).hexdigest()[:32]
+
+
+def note_etag(note_id, updated_at):
+    """ETag de una nota: cambia cada vez que cambia su updatedAt"""
+    return make_etag('note', note_id, updated_at.isoformat() if updated_at else '')
+
+
+def summary_etag(user_id, summary, variant=b''):
+    """ETag de GET /api/notes/summary: cualquier escritura cambia algún total o lastUpdatedAt"""
+    return make_etag('summary', user_id, *summary, variant.decode(errors='replace'))
+
+
+def collection_etag(user_id, variant=b''):
+    """ETag de la colección de notas de un usuario sin serializarla
+
+    Usa la última posición de la bitácora de cambios del usuario (un MAX sobre
+    el índice (userId, id)), que avanza con cada alta, edición o borrado.
+    `variant` distingue representaciones distintas (p. ej. el query string).
+    """
+    version = db.session.execute(
+        db.select(db.func.max(NoteChange.id)).where(NoteChange.userId == user_id),
+        bind_arguments=read_bind()
+    ).scalar()
+    return make_etag('notes', user_id, version or 0, variant.decode(errors='replace'))
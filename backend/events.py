@@ -0,0 +1,170 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db
+
+# ============================================
+# BUS DE EVENTOS DE NOTAS (PUB/SUB EN EL PROCESO)
+# ============================================
+#
+# record_changes() deja en la sesión los cambios de cada usuario y se publican
+# solo al hacer commit, a las suscripciones de ese usuario (GET
+# /api/notes/stream). El evento solo avisa que hay cambios: el stream los lee
+# de la bitácora (note_changes) a partir de la última posición entregada, así
+# que un aviso de más (p. ej. de un savepoint revertido) no hace daño.
+#
+# Cada suscripción acumula a lo más `buffer_size` cambios sin entregar; si un
+# cliente lento o una importación grande la desborda, se descartan y el stream
+# pide al cliente resincronizar con GET /api/notes/changes.
+
+_SESSION_KEY = 'note_events'
+
+
+class TooManyStreams(Exception):
+    """El usuario ya tiene el máximo de streams abiertos"""
+
+
+class Subscriber:
+    """Suscripción de un stream: cambios pendientes y señal para despertarlo"""
+
+    def __init__(self, user_id, buffer_size):
+        self.user_id = user_id
+        self.buffer_size = buffer_size
+        self.pending = []
+        self.overflowed = False
+        self.closed = False
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._async_ready = None
+        self._loop = None
+
+    def bind_loop(self):
+        """Permite esperar con wait_async() desde el event loop actual"""
+        self._async_ready = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        if self._ready.is_set():
+            self._async_ready.set()
+
+    def push(self, changes):
+        with self._lock:
+            if not self.overflowed:
+                if len(self.pending) + len(changes) > self.buffer_size:
+                    self.overflowed = True
+                    self.pending = []
+                else:
+                    self.pending.extend(changes)
+        self._notify()
+
+    def close(self):
+        self.closed = True
+        self._notify()
+
+    def drain(self):
+        """Regresa (cambios pendientes, hubo desborde) y vacía el buffer"""
+        with self._lock:
+            pending, overflowed = self.pending, self.overflowed
+            self.pending, self.overflowed = [], False
+            self._ready.clear()
+            if self._async_ready is not None:
+                self._async_ready.clear()
+        return pending, overflowed
+
+    def wait(self, timeout):
+        return self._ready.wait(timeout)
+
+    async def wait_async(self, timeout):
+        try:
+            await asyncio.wait_for(self._async_ready.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def _notify(self):
+        self._ready.set()
+        if self._loop is not None:
+            try:
+                self._loop.call_soon_threadsafe(self._async_ready.set)
+            except RuntimeError:  # el event loop ya se cerró
+                pass
+
+
+class EventBus:
+    """Suscripciones por usuario y publicación al confirmar la transacción"""
+
+    def __init__(self, app=None):
+        self.buffer_size = 100
+        self.max_per_user = 5
+        self.published = 0
+        self.overflows = 0
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.buffer_size = config.get('SSE_BUFFER_SIZE', 100)
+        self.max_per_user = config.get('SSE_MAX_STREAMS_PER_USER', 5)
+        if not event.contains(Session, 'after_commit', self._after_commit):
+            event.listen(Session, 'after_commit', self._after_commit)
+            event.listen(Session, 'after_rollback', self._after_rollback)
+        app.extensions['events'] = self
+
+    def subscribe(self, user_id):
+        with self._lock:
+            subscribers = self._subscribers[user_id]
+            if len(subscribers) >= self.max_per_user:
+                raise TooManyStreams(f'Máximo {self.max_per_user} streams abiertos por usuario')
+            subscriber = Subscriber(user_id, self.buffer_size)
+            subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+
+    def publish(self, user_id, changes):
+        """Entrega `changes` (lista de (note_id, op)) a los streams del usuario"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+            self.published += 1
+        for subscriber in subscribers:
+            was_overflowed = subscriber.overflowed
+            subscriber.push(changes)
+            if subscriber.overflowed and not was_overflowed:
+                self.overflows += 1
+
+    def publish_on_commit(self, user_id, changes):
+        """Publica los cambios cuando la sesión actual haga commit"""
+        db.session.info.setdefault(_SESSION_KEY, []).append((user_id, list(changes)))
+
+    def _after_commit(self, session):
+        for user_id, changes in session.info.pop(_SESSION_KEY, ()):
+            self.publish(user_id, changes)
+
+    def _after_rollback(self, session):
+        session.info.pop(_SESSION_KEY, None)
+
+    def close_all(self):
+        """Termina todos los streams abiertos (al detener el servidor)"""
+        with self._lock:
+            subscribers = [s for group in self._subscribers.values() for s in group]
+        for subscriber in subscribers:
+            subscriber.close()
+
+    def stats(self):
+        with self._lock:
+            return {'users': len(self._subscribers),
+                    'streams': sum(len(group) for group in self._subscribers.values()),
+                    'published': self.published, 'overflows': self.overflows}
+
+
+bus = EventBus()
@@ -0,0 +1,192 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+# ============================================
+# FORMATOS DE HASH
+# ============================================
+#
+# Cada hash guardado en users.password lleva su algoritmo y parámetros:
+#   scrypt$<n>$<r>$<p>$<salt>$<hash>
+#   pbkdf2_sha256$<iteraciones>$<salt>$<hash>
+#   <64 caracteres hex>              (SHA-256 sin sal, formato original)
+# Así se pueden cambiar algoritmo o costo sin invalidar las contraseñas existentes.
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip('=')
+
+
+def _unb64(value):
+    return base64.b64decode(value + '=' * (-len(value) % 4))
+
+
+def derive(algorithm, password, salt, params):
+    """Calcula la llave derivada; función de módulo para poder ejecutarse en otro proceso"""
+    if algorithm == 'scrypt':
+        n, r, p = params
+        return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p,
+                              maxmem=256 * n * r * p, dklen=32)
+    if algorithm == 'pbkdf2_sha256':
+        (iterations,) = params
+        return hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+    if algorithm == 'sha256':
+        return hashlib.sha256(password.encode()).digest()
+    raise ValueError(f'Algoritmo de contraseña desconocido: {algorithm}')
+
+
+class HasherBusyError(RuntimeError):
+    """El pool de hashing está saturado"""
+
+
+class PasswordHasher(ABC):
+    """Algoritmo de hashing de contraseñas con parámetros de costo"""
+
+    algorithm = None
+
+    @abstractmethod
+    def params(self):
+        """Parámetros de costo que recibe derive()"""
+
+    @abstractmethod
+    def encode(self, salt, derived):
+        """Valor a guardar en users.password"""
+
+    @staticmethod
+    def decode(encoded):
+        """Regresa (algoritmo, parámetros, salt, hash) de un valor guardado"""
+        if '$' not in encoded:
+            return 'sha256', (), b'', bytes.fromhex(encoded)
+        algorithm, *rest = encoded.split('$')
+        if algorithm == 'scrypt':
+            n, r, p, salt, derived = rest
+            return algorithm, (int(n), int(r), int(p)), _unb64(salt), _unb64(derived)
+        if algorithm == 'pbkdf2_sha256':
+            iterations, salt, derived = rest
+            return algorithm, (int(iterations),), _unb64(salt), _unb64(derived)
+        raise ValueError(f'Formato de contraseña desconocido: {algorithm}')
+
+
+class ScryptHasher(PasswordHasher):
+    algorithm = 'scrypt'
+
+    def __init__(self, n=2 ** 14, r=8, p=1):
+        self.n, self.r, self.p = n, r, p
+
+    def params(self):
+        return (self.n, self.r, self.p)
+
+    def encode(self, salt, derived):
+        return f'scrypt${self.n}${self.r}${self.p}${_b64(salt)}${_b64(derived)}'
+
+
+class Pbkdf2Hasher(PasswordHasher):
+    algorithm = 'pbkdf2_sha256'
+
+    def __init__(self, iterations=600_000):
+        self.iterations = iterations
+
+    def params(self):
+        return (self.iterations,)
+
+    def encode(self, salt, derived):
+        return f'pbkdf2_sha256${self.iterations}${_b64(salt)}${_b64(derived)}'
+
+
+# ============================================
+# GESTOR CONFIGURABLE
+# ============================================
+
+class PasswordHasherManager:
+    """Hashea y verifica contraseñas fuera del hilo de la petición
+
+    Las derivaciones se ejecutan en un pool acotado (procesos por defecto) y un
+    semáforo limita cuántas pueden estar en espera, para que una ráfaga de logins
+    no acumule trabajo sin límite ni bloquee al resto de las peticiones.
+    """
+
+    def __init__(self, app=None):
+        self.hasher = ScryptHasher()
+        self.executor_kind = 'inline'
+        self.workers = 1
+        self.queue_timeout = None
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        algorithm = config.get('PASSWORD_HASHER', 'scrypt')
+        if algorithm == 'scrypt':
+            self.hasher = ScryptHasher(config.get('PASSWORD_SCRYPT_N', 2 ** 14),
+                                       config.get('PASSWORD_SCRYPT_R', 8),
+                                       config.get('PASSWORD_SCRYPT_P', 1))
+        elif algorithm == 'pbkdf2_sha256':
+            self.hasher = Pbkdf2Hasher(config.get('PASSWORD_PBKDF2_ITERATIONS', 600_000))
+        else:
+            raise ValueError(f'PASSWORD_HASHER desconocido: {algorithm}')
+
+        self.shutdown()
+        self.executor_kind = config.get('PASSWORD_HASH_EXECUTOR', 'process')
+        self.workers = config.get('PASSWORD_HASH_WORKERS') or os.cpu_count() or 1
+        self.queue_timeout = config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 10)
+        # Trabajos en ejecución + en espera
+        self._slots = threading.BoundedSemaphore(self.workers * 2)
+        app.extensions['password_hasher'] = self
+
+    def _get_executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.executor_kind == 'process':
+                        # Importarlo carga multiprocessing: solo cuando se usa
+                        from concurrent.futures import ProcessPoolExecutor
+                        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                    else:
+                        self._executor = ThreadPoolExecutor(max_workers=self.workers,
+                                                            thread_name_prefix='password-hasher')
+        return self._executor
+
+    def _run(self, algorithm, password, salt, params):
+        if self.executor_kind == 'inline':
+            return derive(algorithm, password, salt, params)
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise HasherBusyError('Demasiadas operaciones de contraseña en curso')
+        try:
+            return self._get_executor().submit(derive, algorithm, password, salt, params).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        """Genera el valor a guardar con el algoritmo y costo configurados"""
+        salt = secrets.token_bytes(16)
+        derived = self._run(self.hasher.algorithm, password, salt, self.hasher.params())
+        return self.hasher.encode(salt, derived)
+
+    def verify(self, password, encoded):
+        """Regresa (es_válida, requiere_rehash) para un valor guardado"""
+        try:
+            algorithm, params, salt, expected = PasswordHasher.decode(encoded)
+        except ValueError:
+            return False, False
+        derived = self._run(algorithm, password, salt, params)
+        if not hmac.compare_digest(derived, expected):
+            return False, False
+        needs_rehash = (algorithm != self.hasher.algorithm or params != self.hasher.params())
+        return True, needs_rehash
+
+    def shutdown(self):
+        """Detiene el pool (se vuelve a crear en el siguiente uso)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasherManager()
@@ -0,0 +1,232 @@
+import hashlib
+import threading
+import zlib
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from cache import MemoryCache
+from logging_config import get_logger
+from models import db, IdempotencyKey
+
+logger = get_logger('idempotency')
+
+# ============================================
+# IDEMPOTENCY-KEY EN ESCRITURAS
+# ============================================
+#
+# Un cliente que reintenta una escritura (p. ej. POST /api/notes tras perder la
+# respuesta) manda el mismo encabezado Idempotency-Key; la segunda vez se
+# responde lo mismo que la primera sin volver a ejecutar el handler, con
+# `Idempotent-Replayed: true`.
+#
+# La llave es por usuario. Antes de ejecutar se reclama con una fila en
+# idempotency_keys (status NULL = en curso): un reintento concurrente recibe
+# 409, y si el proceso muere a la mitad la fila se puede reclamar de nuevo tras
+# IDEMPOTENCY_LOCK_SECONDS. Al terminar se guarda la respuesta comprimida
+# (solo status < 500: un error del servidor se puede reintentar) y una copia en
+# un LRU en memoria acotado, para que los reintentos no lean la base. Las filas
+# vencen tras IDEMPOTENCY_TTL_SECONDS (tarea purge_idempotency_keys).
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyError(Exception):
+    """Idempotency-Key inválida, reusada con otra petición o aún en curso"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class IdempotencyStore:
+    """Reclamo y respuestas guardadas de las peticiones con Idempotency-Key"""
+
+    def __init__(self, app=None):
+        self.enabled = True
+        self.ttl = 86400
+        self.lock_seconds = 60
+        self.memory = MemoryCache(10000, self.ttl)
+        self.replays = 0
+        self.conflicts = 0
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('IDEMPOTENCY_ENABLED', True)
+        self.ttl = config.get('IDEMPOTENCY_TTL_SECONDS', 86400)
+        self.lock_seconds = config.get('IDEMPOTENCY_LOCK_SECONDS', 60)
+        self.memory = MemoryCache(config.get('IDEMPOTENCY_MAX_ENTRIES', 10000), self.ttl)
+        app.extensions['idempotency'] = self
+
+    def idempotent(self, view):
+        """Decorador para un endpoint de escritura (debajo de @jwt_required)"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = request.headers.get(HEADER)
+            if key is None or not self.enabled:
+                return view(*args, **kwargs)
+            if not key or len(key) > MAX_KEY_LENGTH or not key.isprintable():
+                raise IdempotencyError(f'{HEADER} debe tener entre 1 y {MAX_KEY_LENGTH} caracteres')
+            user_id = int(get_jwt_identity())
+            fingerprint = _fingerprint()
+
+            saved = self._saved(user_id, key)
+            if saved is None:
+                saved = self._claim(user_id, key, fingerprint)
+            if saved is not None:
+                return self._replay(saved, fingerprint)
+
+            try:
+                response = make_response(view(*args, **kwargs))
+            except BaseException:
+                self._release(user_id, key)
+                raise
+            if response.status_code >= 500 or response.is_streamed:
+                self._release(user_id, key)
+            else:
+                self._store(user_id, key, fingerprint, response)
+            return response
+        return wrapper
+
+    # --- Base de datos y memoria ---
+
+    def _saved(self, user_id, key):
+        """(fingerprint, status, body, etag) ya guardado, o None"""
+        saved = self.memory.get(_memory_key(user_id, key))
+        if saved is not None:
+            return saved
+        row = _load(user_id, key)
+        now = datetime.utcnow()
+        if row is None or row.expiresAt < now:
+            return None
+        if row.status is None and row.createdAt < now - timedelta(seconds=self.lock_seconds):
+            # Reclamo abandonado: _claim() lo reemplaza
+            return None
+        return _from_row(row)
+
+    def _claim(self, user_id, key, fingerprint):
+        """Reclama la llave; regresa None si esta petición debe ejecutarse"""
+        now = datetime.utcnow()
+        # Libera reclamos vencidos: la respuesta ya expiró o su proceso murió a la mitad
+        db.session.execute(
+            db.delete(IdempotencyKey)
+            .where(IdempotencyKey.userId == user_id, IdempotencyKey.key == key,
+                   or_(IdempotencyKey.expiresAt < now,
+                       and_(IdempotencyKey.status.is_(None),
+                            IdempotencyKey.createdAt < now - timedelta(seconds=self.lock_seconds))))
+            .execution_options(synchronize_session=False)
+        )
+        db.session.add(IdempotencyKey(userId=user_id, key=key, fingerprint=fingerprint,
+                                      createdAt=now, expiresAt=now + timedelta(seconds=self.ttl)))
+        try:
+            db.session.commit()
+            return None
+        except IntegrityError:
+            # Otra petición con la misma llave llegó primero
+            db.session.rollback()
+        row = _load(user_id, key)
+        if row is None:
+            raise IdempotencyError(f'Petición con la misma {HEADER} en curso, reintenta', 409)
+        return _from_row(row)
+
+    def _store(self, user_id, key, fingerprint, response):
+        body = response.get_data()
+        etag = response.headers.get('ETag')
+        try:
+            db.session.execute(
+                db.update(IdempotencyKey)
+                .where(IdempotencyKey.userId == user_id, IdempotencyKey.key == key)
+                .values(status=response.status_code, body=zlib.compress(body), etag=etag)
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            # La escritura ya se hizo; sin la respuesta guardada un reintento la repite
+            db.session.rollback()
+            logger.exception('No se pudo guardar la respuesta de %s %s', HEADER, key)
+            return
+        self.memory.set(_memory_key(user_id, key), (fingerprint, response.status_code, body, etag))
+
+    def _release(self, user_id, key):
+        try:
+            db.session.rollback()
+            db.session.execute(
+                db.delete(IdempotencyKey)
+                .where(IdempotencyKey.userId == user_id, IdempotencyKey.key == key,
+                       IdempotencyKey.status.is_(None))
+                .execution_options(synchronize_session=False)
+            )
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            logger.exception('No se pudo liberar %s %s', HEADER, key)
+
+    def _replay(self, saved, fingerprint):
+        saved_fingerprint, status, body, etag = saved
+        if saved_fingerprint != fingerprint:
+            with self._lock:
+                self.conflicts += 1
+            raise IdempotencyError(f'{HEADER} ya se usó con otra petición', 422)
+        if status is None:
+            with self._lock:
+                self.conflicts += 1
+            raise IdempotencyError(f'Petición con la misma {HEADER} en curso, reintenta', 409)
+        with self._lock:
+            self.replays += 1
+        response = Response(body, status, mimetype='application/json')
+        if etag:
+            response.headers['ETag'] = etag
+        response.headers[REPLAYED_HEADER] = 'true'
+        return response
+
+    def purge(self):
+        """Elimina las respuestas vencidas; regresa cuántas"""
+        result = db.session.execute(
+            db.delete(IdempotencyKey)
+            .where(IdempotencyKey.expiresAt < datetime.utcnow())
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount
+
+    def stats(self):
+        memory = self.memory.stats()
+        return {'replays': self.replays, 'conflicts': self.conflicts,
+                'memory': memory['size'], 'maxEntries': memory['maxEntries']}
+
+
+def _fingerprint():
+    """Huella de la petición: la misma llave con otro cuerpo o ruta es un error del cliente"""
+    digest = hashlib.sha256(f'{request.method} {request.path}\n'.encode())
+    digest.update(request.get_data(cache=True))
+    return digest.hexdigest()
+
+
+def _memory_key(user_id, key):
+    return (user_id, key)
+
+
+def _load(user_id, key):
+    # Columnas sueltas, sin objetos en la sesión: _claim() puede insertar la misma llave después
+    return db.session.execute(
+        db.select(IdempotencyKey.fingerprint, IdempotencyKey.status, IdempotencyKey.body,
+                  IdempotencyKey.etag, IdempotencyKey.createdAt, IdempotencyKey.expiresAt)
+        .where(IdempotencyKey.userId == user_id, IdempotencyKey.key == key)
+    ).first()
+
+
+def _from_row(row):
+    body = zlib.decompress(row.body) if row.body is not None else None
+    return row.fingerprint, row.status, body, row.etag
+
+
+idempotency = IdempotencyStore()
@@ -0,0 +1,212 @@
+import hashlib
+import importlib.util
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from logging_config import get_logger
+
+logger = get_logger('images')
+
+# ============================================
+# ALMACÉN DE IMÁGENES DIRECCIONADO POR CONTENIDO
+# ============================================
+#
+# Cada imagen se guarda una sola vez con el nombre <sha256>.<ext> en
+# <raíz>/<2 primeros>/<2 siguientes>/, así que subir la misma foto desde varias
+# notas (o varias veces) no duplica archivos, y el nombre sirve como ETag.
+# La miniatura JPEG (<sha256>.thumb.jpg) se genera en un pool de hilos: Pillow
+# libera el GIL al decodificar, redimensionar y codificar. Pillow es opcional
+# (sin él no hay miniaturas y se sirve la imagen original) y se importa al
+# generar la primera miniatura, no al arrancar.
+#
+# Quitar la imagen de una nota no borra el archivo (otra nota puede usarlo): la
+# tarea periódica purge_images (tasks.py) borra los que ya no usa ninguna.
+
+_NAME_RE = re.compile(r'^([0-9a-f]{64})\.(jpg|png|gif|webp)$')
+
+MIMETYPES = {'jpg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+
+READ_CHUNK = 64 * 1024
+
+HAS_PILLOW = importlib.util.find_spec('PIL') is not None
+
+
+class ImageError(ValueError):
+    """Imagen rechazada; status_code es el código HTTP a responder"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def detect_format(head):
+    """Extensión según los primeros bytes del archivo (no se confía en Content-Type)"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+class ImageStore:
+    """Archivos de imagen y sus miniaturas en disco"""
+
+    def __init__(self, app=None):
+        self.root = None
+        self.max_bytes = 10 * 1024 * 1024
+        self.thumbnail_size = 256
+        self._executor = None
+        self._workers = 2
+        self._pending = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.root = config['IMAGE_STORAGE_DIR']
+        self.max_bytes = config.get('IMAGE_MAX_BYTES', 10 * 1024 * 1024)
+        self.thumbnail_size = config.get('IMAGE_THUMBNAIL_SIZE', 256)
+        self._workers = config.get('IMAGE_THUMBNAIL_WORKERS', 2)
+        # Detrás de nginx/Apache el servidor web envía el archivo (X-Sendfile) sin pasar por Python
+        app.config.setdefault('USE_X_SENDFILE', config.get('IMAGE_USE_X_SENDFILE', False))
+        if not HAS_PILLOW:
+            logger.warning('Pillow no está instalado: no se generarán miniaturas')
+        app.extensions['images'] = self
+
+    # --- Rutas ---
+
+    def path(self, name):
+        """Ruta del archivo original, o None si el nombre no es válido"""
+        match = _NAME_RE.match(name)
+        if not match:
+            return None
+        digest = match.group(1)
+        return os.path.join(self.root, digest[:2], digest[2:4], name)
+
+    def thumbnail_path(self, name):
+        """Ruta de la miniatura JPEG de una imagen (nombre ya validado)"""
+        path = self.path(name)
+        return path[:path.rindex('.')] + '.thumb.jpg'
+
+    @staticmethod
+    def mimetype(name):
+        return MIMETYPES[name.rsplit('.', 1)[1]]
+
+    # --- Escritura ---
+
+    def save(self, stream):
+        """Guarda el cuerpo de la petición sin cargarlo en memoria; regresa (nombre, bytes, nuevo)"""
+        tmp_dir = os.path.join(self.root, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        head = b''
+        tmp = tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False)
+        try:
+            with tmp:
+                while True:
+                    chunk = stream.read(READ_CHUNK)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise ImageError(f'La imagen excede {self.max_bytes} bytes', 413)
+                    if len(head) < 16:
+                        head += chunk[:16 - len(head)]
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            if not size:
+                raise ImageError('El cuerpo de la petición está vacío')
+            extension = detect_format(head)
+            if extension is None:
+                raise ImageError('Formato no soportado (se acepta JPEG, PNG, GIF o WebP)', 415)
+
+            name = f'{digest.hexdigest()}.{extension}'
+            path = self.path(name)
+            if os.path.exists(path):
+                os.unlink(tmp.name)
+                # Se renueva la fecha para que purge_images no lo borre antes
+                # de que la nota lo referencie
+                os.utime(path)
+                return name, size, False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp.name, path)
+            return name, size, True
+        except BaseException:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
+            raise
+
+    # --- Limpieza ---
+
+    def stored_images(self):
+        """Itera (nombre, hora de modificación) de las imágenes originales guardadas"""
+        for directory, subdirs, files in os.walk(self.root):
+            if directory == self.root:
+                subdirs[:] = [d for d in subdirs if d != 'tmp']
+            for filename in files:
+                if _NAME_RE.match(filename):
+                    try:
+                        yield filename, os.stat(os.path.join(directory, filename)).st_mtime
+                    except FileNotFoundError:
+                        continue
+
+    def remove(self, name):
+        """Borra una imagen y su miniatura (si existen)"""
+        for path in (self.path(name), self.thumbnail_path(name)):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    # --- Miniaturas ---
+
+    def ensure_thumbnail(self, name):
+        """Encola la miniatura si falta (no bloquea); sin Pillow no hace nada"""
+        if not HAS_PILLOW or os.path.exists(self.thumbnail_path(name)):
+            return
+        with self._lock:
+            if name in self._pending:
+                return
+            self._pending.add(name)
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(self._workers, thread_name_prefix='thumbnails')
+        self._executor.submit(self._make_thumbnail, name)
+
+    def _make_thumbnail(self, name):
+        from PIL import Image, ImageOps
+
+        target = self.thumbnail_path(name)
+        try:
+            with Image.open(self.path(name)) as image:
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                tmp = f'{target}.{threading.get_ident()}.tmp'
+                image.save(tmp, 'JPEG', quality=80, optimize=True)
+            os.replace(tmp, target)
+            logger.debug('Miniatura generada: %s', name)
+        except Exception:
+            logger.exception('No se pudo generar la miniatura de %s', name)
+        finally:
+            with self._lock:
+                self._pending.discard(name)
+
+    def shutdown(self):
+        """Espera a las miniaturas pendientes y detiene el pool"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+
+images = ImageStore()
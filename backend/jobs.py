@@ -0,0 +1,316 @@
+import json
+import random
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from logging_config import get_logger
+from models import db, Job
+
+logger = get_logger('jobs')
+
+# ============================================
+# TRABAJOS EN SEGUNDO PLANO
+# ============================================
+#
+# Los handlers encolan con jobs.enqueue() dentro de su transacción y responden
+# de inmediato; el trabajo queda en la tabla jobs y solo existe si la petición
+# hizo commit. Hilos worker (en el mismo proceso o en `flask --app app
+# jobs-worker`) lo reclaman con un UPDATE condicionado al estado, así que varios
+# procesos pueden compartir la tabla sin ejecutar dos veces el mismo trabajo.
+#
+# Si la tarea falla se reintenta con espera exponencial hasta maxAttempts; si el
+# proceso muere a la mitad, el trabajo vuelve a pendiente tras JOBS_LOCK_TIMEOUT.
+# Las tareas periódicas (JOBS_SCHEDULE) se encolan para el siguiente múltiplo de
+# su intervalo con dedupKey '<tarea>@<periodo>': una sola vez aunque haya varios
+# procesos.
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Cuántos pendientes se consultan por intento de reclamo
+CLAIM_BATCH = 5
+
+
+class Task:
+    def __init__(self, name, func, max_attempts):
+        self.name = name
+        self.func = func
+        self.max_attempts = max_attempts
+
+
+class JobQueue:
+    """Registro de tareas, cola persistente y pool de hilos worker"""
+
+    def __init__(self, app=None):
+        self.app = None
+        self.tasks = {}
+        self.workers = 2
+        self.poll_interval = 1.0
+        self.scheduler_interval = 30.0
+        self.lock_timeout = 3600
+        self.max_attempts = 5
+        self.retry_base = 5.0
+        self.retry_max = 3600.0
+        self.schedule = {}
+        self._threads = []
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.app = app
+        self.workers = config.get('JOBS_WORKERS', 2)
+        self.poll_interval = config.get('JOBS_POLL_INTERVAL', 1.0)
+        self.scheduler_interval = config.get('JOBS_SCHEDULER_INTERVAL', 30.0)
+        self.lock_timeout = config.get('JOBS_LOCK_TIMEOUT', 3600)
+        self.max_attempts = config.get('JOBS_MAX_ATTEMPTS', 5)
+        self.retry_base = config.get('JOBS_RETRY_BASE_SECONDS', 5.0)
+        self.retry_max = config.get('JOBS_RETRY_MAX_SECONDS', 3600.0)
+        self.schedule = {name: every for name, every in (config.get('JOBS_SCHEDULE') or {}).items() if every}
+        if not event.contains(Session, 'after_commit', self._after_commit):
+            event.listen(Session, 'after_commit', self._after_commit)
+        app.extensions['jobs'] = self
+
+    # --- Registro y encolado ---
+
+    def task(self, name, max_attempts=None):
+        """Decorador que registra una tarea: @jobs.task('send_reset_email')"""
+        def decorator(func):
+            self.tasks[name] = Task(name, func, max_attempts)
+            return func
+        return decorator
+
+    def enqueue(self, name, payload=None, delay=0, run_at=None, dedup_key=None, max_attempts=None):
+        """Agrega un trabajo a la sesión actual; se guarda con el commit de quien lo encola"""
+        task = self.tasks.get(name)
+        if task is None:
+            raise LookupError(f'Tarea desconocida: {name}')
+        job = Job(
+            name=name,
+            payload=json.dumps(payload or {}),
+            status=PENDING,
+            attempts=0,
+            maxAttempts=max_attempts or task.max_attempts or self.max_attempts,
+            runAt=run_at or datetime.utcnow() + timedelta(seconds=delay),
+            dedupKey=dedup_key,
+        )
+        db.session.add(job)
+        db.session.info['jobs_enqueued'] = True
+        return job
+
+    def _after_commit(self, session):
+        # Despierta a los workers de este proceso en cuanto el trabajo es visible
+        if session.info.pop('jobs_enqueued', False):
+            self._wake.set()
+
+    # --- Ejecución ---
+
+    def run_next(self):
+        """Reclama y ejecuta un trabajo pendiente; regresa False si no había ninguno"""
+        claimed = self._claim()
+        if claimed is None:
+            return False
+        job_id, name, payload, attempts, max_attempts = claimed
+        task = self.tasks.get(name)
+        started = time.perf_counter()
+        try:
+            if task is None:
+                raise LookupError(f'Tarea desconocida: {name}')
+            task.func(**json.loads(payload))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            error = f'{type(e).__name__}: {e}'[:2000]
+            if attempts >= max_attempts:
+                logger.error('Trabajo %s (%s) falló definitivamente tras %s intentos: %s',
+                             job_id, name, attempts, error)
+                self._finish(job_id, FAILED, error)
+            else:
+                delay = self.backoff(attempts)
+                logger.warning('Trabajo %s (%s) falló (intento %s de %s), reintento en %.0f s: %s',
+                               job_id, name, attempts, max_attempts, delay, error)
+                self._update(job_id, status=PENDING, lockedAt=None, lastError=error,
+                             runAt=datetime.utcnow() + timedelta(seconds=delay))
+            return True
+        self._finish(job_id, DONE)
+        logger.info('Trabajo %s (%s) completado en %.1f ms', job_id, name,
+                    (time.perf_counter() - started) * 1000)
+        return True
+
+    def run_pending(self):
+        """Ejecuta en este hilo todos los trabajos que ya tocan; regresa cuántos"""
+        count = 0
+        while self.run_next():
+            count += 1
+        return count
+
+    def backoff(self, attempts):
+        """Segundos antes del reintento: exponencial con tope y hasta 50% de variación"""
+        delay = min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+        return delay + random.uniform(0, delay / 2)
+
+    def _claim(self):
+        now = datetime.utcnow()
+        candidates = db.session.execute(
+            db.select(Job.id)
+            .where(Job.status == PENDING, Job.runAt <= now)
+            .order_by(Job.runAt, Job.id)
+            .limit(CLAIM_BATCH)
+        ).scalars().all()
+        for job_id in candidates:
+            # Solo un worker logra cambiar el estado; los demás ven rowcount 0
+            claimed = db.session.execute(
+                db.update(Job)
+                .where(Job.id == job_id, Job.status == PENDING)
+                .values(status=RUNNING, lockedAt=now, attempts=Job.attempts + 1)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return db.session.execute(
+                    db.select(Job.id, Job.name, Job.payload, Job.attempts, Job.maxAttempts)
+                    .where(Job.id == job_id)
+                ).one()
+        db.session.commit()
+        return None
+
+    def _update(self, job_id, **values):
+        db.session.execute(db.update(Job).where(Job.id == job_id).values(**values)
+                           .execution_options(synchronize_session=False))
+        db.session.commit()
+
+    def _finish(self, job_id, status, error=None):
+        self._update(job_id, status=status, lockedAt=None, lastError=error, finishedAt=datetime.utcnow())
+
+    # --- Mantenimiento de la cola ---
+
+    def tick(self):
+        """Recupera trabajos abandonados y encola el siguiente periodo de las tareas periódicas"""
+        self.recover_stale()
+        for name, every in self.schedule.items():
+            self.schedule_next(name, every)
+
+    def recover_stale(self):
+        """Trabajos en ejecución por más de JOBS_LOCK_TIMEOUT: su worker murió"""
+        limit = datetime.utcnow() - timedelta(seconds=self.lock_timeout)
+        stale = (Job.status == RUNNING, Job.lockedAt < limit)
+        failed = db.session.execute(
+            db.update(Job).where(*stale, Job.attempts >= Job.maxAttempts)
+            .values(status=FAILED, lockedAt=None, finishedAt=datetime.utcnow(),
+                    lastError='El worker se detuvo durante la ejecución')
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        retried = db.session.execute(
+            db.update(Job).where(*stale)
+            .values(status=PENDING, lockedAt=None, runAt=datetime.utcnow(),
+                    lastError='El worker se detuvo durante la ejecución')
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if failed or retried:
+            logger.warning('Trabajos abandonados: %s reencolados, %s fallidos', retried, failed)
+
+    def schedule_next(self, name, every):
+        """Encola `name` para el inicio del siguiente periodo de `every` segundos (UTC)"""
+        period = int(time.time() // every) + 1
+        dedup_key = f'{name}@{period}'
+        exists = db.session.execute(db.select(Job.id).where(Job.dedupKey == dedup_key)).first()
+        if exists:
+            return False
+        self.enqueue(name, run_at=datetime.utcfromtimestamp(period * every), dedup_key=dedup_key)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Otro proceso lo encoló primero
+            db.session.rollback()
+            return False
+        return True
+
+    def stats(self):
+        """Trabajos por estado"""
+        rows = db.session.execute(db.select(Job.status, func.count()).group_by(Job.status)).all()
+        counts = {status: 0 for status in (PENDING, RUNNING, DONE, FAILED)}
+        counts.update({status: count for status, count in rows})
+        counts['workers'] = len(self._threads)
+        return counts
+
+    # --- Hilos ---
+
+    def start(self):
+        """Inicia los hilos worker y el planificador en este proceso (idempotente)"""
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                self._threads.append(threading.Thread(
+                    target=self._work_loop, name=f'jobs-worker-{i}', daemon=True))
+            self._threads.append(threading.Thread(
+                target=self._scheduler_loop, name='jobs-scheduler', daemon=True))
+            for thread in self._threads:
+                thread.start()
+        logger.info('Trabajos en segundo plano: %s workers', self.workers)
+
+    def shutdown(self, timeout=30):
+        """Detiene los hilos; el trabajo en curso termina antes de salir"""
+        with self._lock:
+            threads, self._threads = self._threads, []
+        if not threads:
+            return
+        self._stop.set()
+        self._wake.set()
+        for thread in threads:
+            thread.join(timeout)
+
+    def run_forever(self):
+        """Proceso worker dedicado: bloquea hasta Ctrl+C o SIGTERM
+
+        Con SIGTERM (p. ej. al detener el servicio) se sale igual que con Ctrl+C:
+        el trabajo en curso termina y no queda reclamado hasta JOBS_LOCK_TIMEOUT.
+        """
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: self._stop.set())
+        self.start()
+        try:
+            while not self._stop.wait(1):
+                pass
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.shutdown()
+            signal.signal(signal.SIGTERM, previous if previous is not None else signal.SIG_DFL)
+
+    def _work_loop(self):
+        while not self._stop.is_set():
+            ran = False
+            try:
+                with self.app.app_context():
+                    ran = self.run_next()
+            except Exception:
+                # Error de la cola misma (p. ej. base de datos bloqueada): esperar y seguir
+                logger.exception('Error al reclamar trabajos')
+            if not ran:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def _scheduler_loop(self):
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.tick()
+            except Exception:
+                logger.exception('Error al planificar trabajos')
+            self._stop.wait(self.scheduler_interval)
+
+
+jobs = JobQueue()
@@ -0,0 +1,161 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from flask import g, has_request_context, request
+
+# ============================================
+# LOGGING ESTRUCTURADO Y ASÍNCRONO
+# ============================================
+#
+# Los handlers de la API solo encolan el LogRecord (sin formatearlo); un hilo en
+# segundo plano (QueueListener) lo formatea y escribe. Los mensajes usan el
+# estilo perezoso de logging ('%s' + argumentos), así que un payload solo se
+# convierte a texto si el nivel está habilitado y el registro pasa el muestreo.
+
+LOGGER_NAME = 'notas'
+
+# Atributos estándar de LogRecord; el resto viene de `extra=` y va como campo JSON
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+def get_logger(name=None):
+    """Logger de la aplicación (hijo de 'notas')"""
+    return logging.getLogger(f'{LOGGER_NAME}.{name}' if name else LOGGER_NAME)
+
+
+class RequestContextFilter(logging.Filter):
+    """Agrega request_id, método y ruta de la petición en curso"""
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = getattr(g, 'request_id', None)
+            record.http_method = request.method
+            record.http_path = request.path
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Deja pasar solo una fracción de los registros de ciertos niveles
+
+    `rates` mapea nombre de nivel a probabilidad (0.0 - 1.0); WARNING y
+    superiores no se muestrean a menos que se indique explícitamente.
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = {logging.getLevelName(level.upper()): rate for level, rate in (rates or {}).items()}
+
+    def filter(self, record):
+        rate = self.rates.get(record.levelno)
+        return rate is None or rate >= 1 or random.random() < rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler que no formatea en el hilo de la petición y descarta si la cola está llena"""
+
+    dropped = 0
+
+    def prepare(self, record):
+        # El formateo (incluidos los argumentos) se hace en el hilo del listener
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Una línea JSON por registro, con los campos de `extra=` al nivel superior"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Formato legible para desarrollo"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s [%(request_id)s] %(name)s: %(message)s')
+
+    def format(self, record):
+        if not hasattr(record, 'request_id'):
+            record.request_id = '-'
+        return super().format(record)
+
+
+_listener = None
+
+
+def configure_logging(app):
+    """Configura el logger 'notas' y la correlación por request_id"""
+    global _listener
+    config = app.config
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(config.get('LOG_LEVEL', 'INFO'))
+    logger.propagate = False
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter() if config.get('LOG_FORMAT', 'json') == 'json' else TextFormatter())
+
+    if _listener is not None:
+        _listener.stop()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    if config.get('LOG_ASYNC', True):
+        handler = NonBlockingQueueHandler(queue.Queue(config.get('LOG_QUEUE_SIZE', 10000)))
+        _listener = QueueListener(handler.queue, stream, respect_handler_level=False)
+        _listener.start()
+    else:
+        handler = stream
+        _listener = None
+    handler.addFilter(SamplingFilter(config.get('LOG_SAMPLE_RATES')))
+    handler.addFilter(RequestContextFilter())
+    logger.addHandler(handler)
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        response.headers['X-Request-ID'] = g.get('request_id', '')
+        started = g.get('request_started')
+        access = logging.getLogger(f'{LOGGER_NAME}.access')
+        if started is not None and access.isEnabledFor(logging.INFO):
+            access.info('%s %s %s', request.method, request.path, response.status_code, extra={
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - started) * 1000, 2),
+            })
+        return response
+
+    return logger
+
+
+@atexit.register
+def _flush_logs():
+    if _listener is not None:
+        _listener.stop()
@@ -0,0 +1,97 @@
+import threading
+
+from logging_config import get_logger
+
+logger = get_logger('mailer')
+
+# ============================================
+# ENVÍO DE CORREO
+# ============================================
+#
+# Los correos se envían desde los trabajos en segundo plano (ver tasks.py),
+# nunca dentro de una petición: un servidor SMTP lento o caído no debe frenar
+# la respuesta. MAIL_BACKEND elige cómo se entregan:
+#   'smtp'    servidor SMTP real (MAIL_SMTP_*)
+#   'console' solo se registran en el log (desarrollo)
+#   'memory'  se guardan en `outbox` (pruebas y benchmarks)
+
+
+class SMTPBackend:
+    def __init__(self, host, port, username=None, password=None, use_tls=False, timeout=10):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+
+    def send(self, message):
+        import smtplib  # solo lo necesita este backend
+
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username:
+                smtp.login(self.username, self.password)
+            smtp.send_message(message)
+
+
+class ConsoleBackend:
+    def send(self, message):
+        logger.info('Correo para %s: %s\n%s', message['To'], message['Subject'], message.get_content())
+
+
+class MemoryBackend:
+    def __init__(self):
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def send(self, message):
+        with self._lock:
+            self.outbox.append(message)
+
+
+class Mailer:
+    """Arma los mensajes y los entrega con el backend de MAIL_BACKEND"""
+
+    def __init__(self, app=None):
+        self.sender = 'Notas App <no-reply@localhost>'
+        self.backend = ConsoleBackend()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.sender = config.get('MAIL_FROM', self.sender)
+        kind = config.get('MAIL_BACKEND', 'console')
+        if kind == 'smtp':
+            self.backend = SMTPBackend(
+                config['MAIL_SMTP_HOST'], config['MAIL_SMTP_PORT'],
+                username=config.get('MAIL_SMTP_USERNAME'), password=config.get('MAIL_SMTP_PASSWORD'),
+                use_tls=config.get('MAIL_SMTP_USE_TLS', False), timeout=config.get('MAIL_SMTP_TIMEOUT', 10))
+        elif kind == 'console':
+            self.backend = ConsoleBackend()
+        elif kind == 'memory':
+            self.backend = MemoryBackend()
+        else:
+            raise ValueError(f'MAIL_BACKEND desconocido: {kind}')
+        app.extensions['mailer'] = self
+
+    @property
+    def outbox(self):
+        """Mensajes enviados con el backend 'memory'"""
+        return getattr(self.backend, 'outbox', [])
+
+    def send(self, to, subject, body):
+        """Envía un correo de texto; los errores se propagan para que el trabajo se reintente"""
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = to
+        message['Subject'] = subject
+        message.set_content(body)
+        self.backend.send(message)
+
+
+mailer = Mailer()
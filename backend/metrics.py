@@ -0,0 +1,215 @@
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as Tally
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from logging_config import get_logger
+from models import db
+
+logger = get_logger('metrics')
+
+# ============================================
+# MÉTRICAS (formato de texto de Prometheus)
+# ============================================
+#
+# Implementación mínima sin dependencias: cada familia guarda sus series por
+# tupla de etiquetas en un dict protegido por un lock; registrar una
+# observación es O(1) (más una búsqueda binaria en los buckets).
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class _Family:
+    kind = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(_Family):
+    kind = 'counter'
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._series[labels] = self._series.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            series = dict(self._series)
+        return self.header() + [f'{self.name}{_labels(self.labelnames, k)} {v}' for k, v in series.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Family):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # [conteo por bucket..., +Inf], suma
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        with self._lock:
+            series = {k: (list(v[0]), v[1]) for k, v in self._series.items()}
+        lines = self.header()
+        for labels, (counts, total) in series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Metrics:
+    """Instrumentación de peticiones y consultas SQL de la API"""
+
+    def __init__(self, app=None):
+        self.request_latency = Histogram(
+            'notas_http_request_duration_seconds', 'Latencia de las peticiones HTTP',
+            ('method', 'endpoint'))
+        self.requests = Counter(
+            'notas_http_requests_total', 'Peticiones HTTP por código de estado',
+            ('method', 'endpoint', 'status'))
+        self.in_flight = Gauge(
+            'notas_http_requests_in_flight', 'Peticiones HTTP en curso')
+        self.sql_per_request = Histogram(
+            'notas_sql_queries_per_request', 'Consultas SQL ejecutadas por petición',
+            ('endpoint',), QUERY_COUNT_BUCKETS)
+        self.sql_latency = Histogram(
+            'notas_sql_query_duration_seconds', 'Duración de las consultas SQL',
+            ('endpoint',))
+        self.slow_queries = Counter(
+            'notas_sql_slow_queries_total', 'Consultas SQL más lentas que el umbral configurado',
+            ('endpoint',))
+        self.n_plus_one = Counter(
+            'notas_sql_n_plus_one_total', 'Peticiones que repiten la misma consulta SQL (patrón N+1)',
+            ('endpoint',))
+        self.families = [self.request_latency, self.requests, self.in_flight, self.sql_per_request,
+                         self.sql_latency, self.slow_queries, self.n_plus_one]
+        self.slow_query_seconds = 0.1
+        self.n_plus_one_threshold = 10
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions['metrics'] = self
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        self.slow_query_seconds = app.config.get('METRICS_SLOW_QUERY_MS', 100) / 1000
+        self.n_plus_one_threshold = app.config.get('METRICS_N_PLUS_ONE_THRESHOLD', 10)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        with app.app_context():
+            for engine in db.engines.values():
+                event.listen(engine, 'before_cursor_execute', self._before_cursor_execute)
+                event.listen(engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # --- Peticiones ---
+
+    @staticmethod
+    def _endpoint():
+        # La regla (/api/notes/<note_id>) y no la ruta, para no crear una serie por nota
+        return request.url_rule.rule if request.url_rule else 'no_encontrada'
+
+    def _before_request(self):
+        g.metrics_started = time.perf_counter()
+        g.sql_count = 0
+        g.sql_statements = Tally()
+        self.in_flight.inc()
+
+    def _after_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        endpoint = self._endpoint()
+        self.request_latency.observe(time.perf_counter() - started, request.method, endpoint)
+        self.requests.inc(request.method, endpoint, response.status_code)
+        self.sql_per_request.observe(g.sql_count, endpoint)
+
+        statement, repeats = next(iter(g.sql_statements.most_common(1)), (None, 0))
+        if repeats >= self.n_plus_one_threshold:
+            self.n_plus_one.inc(endpoint)
+            logger.warning('Posible N+1 en %s: consulta repetida %s veces: %s',
+                           endpoint, repeats, statement)
+        return response
+
+    def _teardown_request(self, exc):
+        if g.pop('metrics_started', None) is not None:
+            self.in_flight.dec()
+
+    # --- SQL ---
+
+    # El inicio se guarda en el contexto de ejecución: vive lo que la sentencia,
+    # así que una que falla (sin after_cursor_execute) no deja nada pendiente
+
+    @staticmethod
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if context is not None:
+            context._query_started = time.perf_counter()
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        endpoint = 'sin_peticion'
+        if has_request_context() and 'sql_statements' in g:
+            endpoint = self._endpoint()
+            g.sql_count += 1
+            g.sql_statements[statement] += 1
+        self.sql_latency.observe(elapsed, endpoint)
+        if elapsed >= self.slow_query_seconds:
+            self.slow_queries.inc(endpoint)
+            logger.warning('Consulta lenta (%.1f ms) en %s: %s', elapsed * 1000, endpoint, statement)
+
+    # --- Exposición ---
+
+    def render(self):
+        """Todas las métricas en formato de texto de Prometheus"""
+        lines = []
+        for family in self.families:
+            lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
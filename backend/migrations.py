@@ -0,0 +1,188 @@
+from datetime import datetime
+
+from sqlalchemy import exc, inspect, text
+from sqlalchemy.schema import CreateColumn
+
+from logging_config import get_logger
+from models import db, IdempotencyKey, Note, NoteChange, NoteRevision, NoteSummary, SchemaVersion
+from search import ensure_search_index
+from sharding import shards, advance_sequence, sequence_position, SHARD_MODEL_TABLES
+from summaries import recompute_summaries
+from sync import backfill_changes
+
+logger = get_logger('migrations')
+
+# ============================================
+# VERSIÓN DEL ESQUEMA Y MIGRACIONES
+# ============================================
+#
+# Cada base (la central y cada shard) guarda en schema_version el número de la
+# última migración aplicada. Al arrancar, upgrade_schema() hace una consulta
+# por base y, si está al día, no toca nada más: ni create_all(), ni revisión
+# de índices, ni recorrer las notas para la bitácora.
+#
+# Para cambiar el esquema: modificar el modelo en models.py y agregar al final
+# de este archivo una función con @migration(<siguiente número>, '<qué hace>').
+# Recibe el bind (None = base central, 'shard<i>') y debe poder repetirse:
+# varios procesos pueden arrancar a la vez sobre una base desactualizada, y en
+# una base nueva la migración 1 ya crea las tablas en su forma actual. Las
+# funciones create_table, create_indexes y add_column revisan antes de crear.
+
+MIGRATIONS = []
+
+
+def migration(version, description):
+    """Decorador que registra una migración del esquema"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return decorator
+
+
+def latest_version():
+    return MIGRATIONS[-1][0]
+
+
+def schema_version(engine):
+    """Versión guardada en la base; 0 si es nueva o anterior a las migraciones"""
+    try:
+        with engine.connect() as connection:
+            return connection.execute(db.select(SchemaVersion.version)).scalar() or 0
+    except exc.DBAPIError:
+        # Sin tabla schema_version
+        return 0
+
+
+def _set_version(engine, version):
+    with engine.begin() as connection:
+        SchemaVersion.__table__.create(connection, checkfirst=True)
+        updated = connection.execute(
+            db.update(SchemaVersion).values(version=version, updatedAt=datetime.utcnow())
+        ).rowcount
+        if not updated:
+            connection.execute(db.insert(SchemaVersion).values(id=1, version=version,
+                                                               updatedAt=datetime.utcnow()))
+
+
+def upgrade_schema():
+    """Aplica a cada base las migraciones pendientes; regresa cuántas se aplicaron"""
+    latest = latest_version()
+    applied = 0
+    for key in shards.note_binds():
+        engine = db.engines[key]
+        current = schema_version(engine)
+        if current > latest:
+            logger.warning('La base %s tiene el esquema %s, más nuevo que este código (%s)',
+                           key or 'central', current, latest)
+        for version, description, func in MIGRATIONS:
+            if version > current:
+                logger.info('Migración %s en %s: %s', version, key or 'central', description)
+                func(key)
+                _set_version(engine, version)
+                applied += 1
+    return applied
+
+
+# ============================================
+# OPERACIONES PARA LAS MIGRACIONES
+# ============================================
+
+def stores(key, table):
+    """¿La base `key` lleva esta tabla? Los shards solo guardan las de notas"""
+    return key is None or table in SHARD_MODEL_TABLES
+
+
+def create_table(key, table):
+    if stores(key, table):
+        table.create(db.engines[key], checkfirst=True)
+
+
+def create_indexes(key, table):
+    """Índices del modelo que falten (create_all() no los agrega a tablas existentes)"""
+    if stores(key, table):
+        for index in table.indexes:
+            index.create(db.engines[key], checkfirst=True)
+
+
+def add_column(key, table, name):
+    """ALTER TABLE ... ADD COLUMN con la definición del modelo, si la columna falta
+
+    En SQLite una columna NOT NULL necesita server_default en el modelo.
+    """
+    if not stores(key, table):
+        return False
+    engine = db.engines[key]
+    if name in {column['name'] for column in inspect(engine).get_columns(table.name)}:
+        return False
+    definition = CreateColumn(table.c[name]).compile(dialect=engine.dialect)
+    with engine.begin() as connection:
+        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {definition}'))
+    return True
+
+
+# ============================================
+# MIGRACIONES
+# ============================================
+
+@migration(1, 'Esquema inicial: tablas, índices, bitácora de cambios y FTS5')
+def initial_schema(key):
+    for table in db.metadata.sorted_tables:
+        create_table(key, table)
+        create_indexes(key, table)
+    # Notas anteriores a la bitácora de cambios
+    with shards.using(key):
+        backfill_changes()
+    # Índice de búsqueda de texto completo (FTS5)
+    ensure_search_index(db.engines[key])
+
+
+@migration(2, 'Tabla idempotency_keys (respuestas de Idempotency-Key)')
+def idempotency_keys(key):
+    create_table(key, IdempotencyKey.__table__)
+    create_indexes(key, IdempotencyKey.__table__)
+
+
+@migration(3, 'Tabla note_summaries con los totales de cada usuario')
+def note_summaries(key):
+    create_table(key, NoteSummary.__table__)
+    recompute_summaries(db.engines[key])
+
+
+@migration(4, 'Número de revisión de las notas y tabla note_revisions')
+def note_revisions(key):
+    add_column(key, Note.__table__, 'revision')
+    create_table(key, NoteRevision.__table__)
+    create_indexes(key, NoteRevision.__table__)
+
+
+def _note_id_constraints(connection):
+    """Restricciones UNIQUE de note_changes que cubren solo noteId (esquema anterior a la 5)"""
+    return [constraint for constraint in inspect(connection).get_unique_constraints('note_changes')
+            if constraint['column_names'] == ['noteId']]
+
+
+@migration(5, 'Bitácora e historial únicos por usuario: (userId, noteId) en lugar de noteId')
+def per_user_note_keys(key):
+    if not stores(key, NoteChange.__table__):
+        return
+    engine = db.engines[key]
+    with engine.begin() as connection:
+        constraints = _note_id_constraints(connection)
+        if constraints and engine.dialect.name == 'sqlite':
+            # SQLite no puede quitar una restricción: se copia la tabla
+            position = sequence_position(connection)
+            connection.execute(text('DROP INDEX IF EXISTS ix_note_changes_user_id'))
+            connection.execute(text('ALTER TABLE note_changes RENAME TO note_changes_old'))
+            NoteChange.__table__.create(connection)
+            connection.execute(text(
+                'INSERT INTO note_changes (id, "userId", "noteId", op, "changedAt") '
+                'SELECT id, "userId", "noteId", op, "changedAt" FROM note_changes_old'))
+            connection.execute(text('DROP TABLE note_changes_old'))
+            advance_sequence(connection, position)
+        else:
+            for constraint in constraints:
+                connection.execute(text(f'ALTER TABLE note_changes DROP CONSTRAINT "{constraint["name"]}"'))
+        connection.execute(text('DROP INDEX IF EXISTS ix_note_revisions_note_revision'))
+    create_indexes(key, NoteChange.__table__)
+    create_indexes(key, NoteRevision.__table__)
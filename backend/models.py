@@ -1,9 +1,34 @@
+from flask import current_app, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from datetime import datetime, timedelta
-import hashlib
 import secrets
+import uuid
 
-db = SQLAlchemy()
+from hashers import password_hasher
+from logging_config import get_logger
+
+logger = get_logger('models')
+
+
+class RoutingSession(Session):
+    """Sesión que lleva las tablas de notas a la base (shard) del usuario actual
+
+    Sin shards configurados se comporta igual que la sesión de Flask-SQLAlchemy.
+    El enrutador (sharding.py) decide el shard a partir del JWT de la petición.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            router = current_app.extensions.get('shards')
+            if router is not None and router.enabled:
+                key = router.current()
+                if key is not None and router.is_sharded(mapper, clause):
+                    return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 
 class User(db.Model):
@@ -23,13 +48,19 @@ class User(db.Model):
     notes = db.relationship('Note', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
-        """Hashea la contraseña usando SHA-256"""
-        self.password = hashlib.sha256(password.encode()).hexdigest()
+        """Hashea la contraseña con el algoritmo configurado (scrypt por defecto)"""
+        self.password = password_hasher.hash(password)
     
     def check_password(self, password):
-        """Verifica si la contraseña es correcta"""
-        hashed = hashlib.sha256(password.encode()).hexdigest()
-        return self.password == hashed
+        """Verifica si la contraseña es correcta
+        
+        Si el hash guardado usa un algoritmo o costo anterior, se vuelve a
+        hashear en el momento (quien llama debe hacer commit).
+        """
+        valid, needs_rehash = password_hasher.verify(password, self.password)
+        if valid and needs_rehash:
+            self.set_password(password)
+        return valid
     
     def generate_reset_token(self):
         """Genera un token de recuperación de contraseña (válido por 1 hora)"""
@@ -52,6 +83,10 @@ class User(db.Model):
         self.reset_token = None
         self.reset_token_expiry = None
     
+    def snapshot(self):
+        """Copia de las columnas del usuario para guardarla en caché"""
+        return {name: getattr(self, name) for name in USER_SNAPSHOT_FIELDS}
+    
     def to_dict(self):
         """Convierte el usuario a diccionario (sin contraseña)"""
         return {
@@ -61,6 +96,12 @@ class User(db.Model):
         }
 
 
+# Columnas que se guardan en caché para las búsquedas de usuario; sin secretos
+# (hash de la contraseña ni código de recuperación): login y recuperación leen
+# al usuario de la base
+USER_SNAPSHOT_FIELDS = ('id', 'name', 'email', 'device_id')
+
+
 class Note(db.Model):
     """Modelo de Nota"""
     __tablename__ = 'notes'
@@ -72,6 +113,8 @@ class Note(db.Model):
     userId = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     createdAt = db.Column(db.DateTime, default=datetime.utcnow)
     updatedAt = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Sube cuando cambian título o contenido (ver revisions.py)
+    revision = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     def to_dict(self):
         """Convierte la nota a diccionario compatible con Android"""
@@ -79,7 +122,7 @@ class Note(db.Model):
             created_at = self.createdAt.isoformat() + 'Z' if self.createdAt else datetime.utcnow().isoformat() + 'Z'
             updated_at = self.updatedAt.isoformat() + 'Z' if self.updatedAt else datetime.utcnow().isoformat() + 'Z'
         except Exception as e:
-            print(f"⚠️ Error al convertir fechas: {e}")
+            logger.warning('Error al convertir fechas de la nota %s: %s', self.id, e)
             now = datetime.utcnow().isoformat() + 'Z'
             created_at = now
             updated_at = now
@@ -89,8 +132,190 @@ class Note(db.Model):
             'title': self.title,
             'content': self.content,
             'imageUrl': self.imageUrl,
+            'thumbnailUrl': thumbnail_url(self.imageUrl),
             'userId': str(self.userId),
             'createdAt': created_at,
-            'updatedAt': updated_at
+            'updatedAt': updated_at,
+            'revision': self.revision
         }
+    
+    @classmethod
+    def columns_for(cls, fields=None):
+        """Columnas a seleccionar para una proyección de campos (None = todas)"""
+        names = fields or NOTE_FIELDS
+        return [getattr(cls, name) for name in names]
+
+
+# Campos públicos de una nota (orden de serialización)
+NOTE_FIELDS = ('id', 'title', 'content', 'imageUrl', 'userId', 'createdAt', 'updatedAt', 'revision')
+
+
+def parse_note_id(value):
+    """Id de nota propuesto por el cliente en forma canónica, o None si no es un UUID"""
+    if not isinstance(value, str):
+        return None
+    try:
+        return str(uuid.UUID(value))
+    except ValueError:
+        return None
+
 
+# Imágenes subidas al servidor (ver images.py): /api/images/<sha256>.<ext>
+IMAGE_URL_PREFIX = '/api/images/'
+
+
+def image_url(name):
+    return IMAGE_URL_PREFIX + name
+
+
+def thumbnail_url(url):
+    """URL de la miniatura de una imagen subida al servidor; None para URLs externas"""
+    if url and url.startswith(IMAGE_URL_PREFIX):
+        return f'{url}?size=thumb'
+    return None
+
+# Índice compuesto para la paginación por cursor de GET /api/notes:
+# filtra por usuario y recorre en orden (createdAt DESC, id) sin ordenar en memoria
+db.Index('ix_notes_user_created_id', Note.userId, Note.createdAt.desc(), Note.id)
+
+# Índice para consultas por fecha de modificación (sincronización incremental)
+db.Index('ix_notes_user_updated', Note.userId, Note.updatedAt)
+
+
+class NoteChange(db.Model):
+    """Bitácora de cambios de notas para la sincronización incremental
+    
+    Se guarda un solo registro por nota y usuario (el cambio más reciente); al
+    eliminar una nota su registro queda como tombstone con op='delete'. El id
+    autoincremental es la posición que se entrega al cliente como token.
+    """
+    __tablename__ = 'note_changes'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    userId = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    noteId = db.Column(db.String(36), nullable=False)
+    op = db.Column(db.String(10), nullable=False)  # 'upsert' | 'delete'
+    changedAt = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_note_changes_user_id', 'userId', 'id'),
+        # Por usuario: el tombstone de una nota borrada no choca con el id que
+        # otro usuario proponga después (ni al mover usuarios entre shards)
+        db.Index('ix_note_changes_user_note', 'userId', 'noteId', unique=True),
+        # AUTOINCREMENT: SQLite no debe reutilizar el id de un registro reemplazado
+        {'sqlite_autoincrement': True},
+    )
+
+
+class NoteRevision(db.Model):
+    """Delta inverso de una nota: cómo volver de `revision` + 1 a `revision` (ver revisions.py)"""
+    __tablename__ = 'note_revisions'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    noteId = db.Column(db.String(36), nullable=False)
+    userId = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    revision = db.Column(db.Integer, nullable=False)
+    delta = db.Column(db.LargeBinary, nullable=False)  # JSON comprimido con zlib
+    createdAt = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_note_revisions_user_note_revision', 'userId', 'noteId', 'revision', unique=True),
+    )
+
+
+class NoteSummary(db.Model):
+    """Totales de las notas de un usuario (ver summaries.py)
+    
+    Se ajusta en la misma transacción que cada alta, edición o borrado y vive
+    en la misma base que las notas del usuario.
+    """
+    __tablename__ = 'note_summaries'
+    
+    userId = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True, autoincrement=False)
+    noteCount = db.Column(db.Integer, nullable=False, default=0)
+    contentBytes = db.Column(db.BigInteger, nullable=False, default=0)  # UTF-8
+    withImages = db.Column(db.Integer, nullable=False, default=0)
+    lastUpdatedAt = db.Column(db.DateTime, nullable=True)  # MAX(updatedAt) de sus notas
+
+
+class Job(db.Model):
+    """Trabajo en segundo plano (ver jobs.py)
+    
+    Se crea en la misma transacción que el cambio que lo origina, así que solo
+    existe si ese cambio se confirmó. dedupKey (única) evita encolar dos veces el
+    mismo trabajo, p. ej. una tarea periódica desde varios procesos.
+    """
+    __tablename__ = 'jobs'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    name = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')  # JSON con los argumentos
+    status = db.Column(db.String(10), nullable=False, default='pending')  # pending | running | done | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    maxAttempts = db.Column(db.Integer, nullable=False, default=5)
+    runAt = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    lockedAt = db.Column(db.DateTime, nullable=True)
+    lastError = db.Column(db.Text, nullable=True)
+    dedupKey = db.Column(db.String(200), unique=True, nullable=True)
+    createdAt = db.Column(db.DateTime, default=datetime.utcnow)
+    finishedAt = db.Column(db.DateTime, nullable=True)
+    
+    __table_args__ = (
+        # Los workers buscan los trabajos pendientes que ya tocan, en orden
+        db.Index('ix_jobs_status_run_at', 'status', 'runAt'),
+    )
+
+
+class TokenRevocation(db.Model):
+    """Revocación de JWT (ver revocation.py)
+    
+    Con jti: revoca ese token. Sin jti: revoca todos los tokens del usuario
+    emitidos antes de notBefore. expiresAt es cuándo vence el último token
+    afectado; después la fila ya no sirve y se purga.
+    """
+    __tablename__ = 'token_revocations'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    userId = db.Column(db.Integer, nullable=False)
+    jti = db.Column(db.String(36), nullable=True, unique=True)
+    notBefore = db.Column(db.DateTime, nullable=True)
+    expiresAt = db.Column(db.DateTime, nullable=False, index=True)
+    createdAt = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class UserShard(db.Model):
+    """Ubicación de un usuario que se está moviendo o se movió de shard (ver sharding.py)
+    
+    Mientras exista la fila manda sobre el hash; `shard` es la base donde
+    están sus notas ('' = base central) y `target` a dónde se están copiando.
+    """
+    __tablename__ = 'user_shards'
+    
+    userId = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    shard = db.Column(db.String(20), nullable=False)
+    target = db.Column(db.String(20), nullable=True)
+    state = db.Column(db.String(10), nullable=False)  # 'moving' | 'moved'
+    updatedAt = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class SchemaVersion(db.Model):
+    """Última migración aplicada a esta base (una sola fila; ver migrations.py)"""
+    __tablename__ = 'schema_version'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    version = db.Column(db.Integer, nullable=False)
+    updatedAt = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class IdempotencyKey(db.Model):
+    """Respuesta guardada de una escritura con Idempotency-Key (ver idempotency.py)"""
+    __tablename__ = 'idempotency_keys'
+    
+    userId = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    key = db.Column(db.String(255), primary_key=True)
+    fingerprint = db.Column(db.String(64), nullable=False)  # SHA-256 de método, ruta y cuerpo
+    status = db.Column(db.Integer, nullable=True)  # NULL = petición en curso
+    body = db.Column(db.LargeBinary, nullable=True)  # respuesta comprimida con zlib
+    etag = db.Column(db.String(100), nullable=True)
+    createdAt = db.Column(db.DateTime, default=datetime.utcnow)
+    expiresAt = db.Column(db.DateTime, nullable=False, index=True)
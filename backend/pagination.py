@@ -0,0 +1,65 @@
+import base64
+import binascii
+from datetime import datetime
+
+# Límites de paginación para GET /api/notes
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class PaginationError(ValueError):
+    """Error en los parámetros de paginación enviados por el cliente"""
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    """Convierte el parámetro `limit` a entero dentro del rango permitido"""
+    if value is None or value == '':
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('El parámetro limit debe ser un número entero')
+    if limit < 1:
+        raise PaginationError('El parámetro limit debe ser mayor que 0')
+    return min(limit, maximum)
+
+
+def parse_offset(value):
+    """Convierte el parámetro `offset` a entero no negativo"""
+    if value is None or value == '':
+        return 0
+    try:
+        offset = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('El parámetro offset debe ser un número entero')
+    if offset < 0:
+        raise PaginationError('El parámetro offset no puede ser negativo')
+    return offset
+
+
+def encode_cursor(created_at, note_id):
+    """Genera un cursor opaco a partir de la clave (createdAt, id)"""
+    raw = f'{created_at.isoformat()}|{note_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decodifica un cursor opaco y regresa la tupla (createdAt, id)"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, note_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), note_id
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise PaginationError('Cursor inválido')
+
+
+def parse_fields(value, allowed):
+    """Convierte `fields=a,b,c` en una tupla validada (None = todos los campos)"""
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        raise PaginationError(f'Campos desconocidos: {", ".join(unknown)}')
+    return fields or None
@@ -0,0 +1,211 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from flask import request
+
+# ============================================
+# LÍMITE DE INTENTOS (TOKEN BUCKET)
+# ============================================
+#
+# Cada llave (regla + IP, email o deviceId) tiene una cubeta con `capacity`
+# fichas que se recargan a `capacity / period` fichas por segundo; cada intento
+# consume una. Solo se guardan dos números por llave y cada verificación es O(1).
+
+
+class RateLimitExceeded(Exception):
+    """Se agotaron los intentos permitidos; retry_after en segundos"""
+
+    def __init__(self, rule, scope, retry_after):
+        super().__init__(f'Límite de intentos excedido ({rule}, {scope})')
+        self.rule = rule
+        self.scope = scope
+        self.retry_after = retry_after
+
+
+def parse_limit(value):
+    """'10/60' -> (capacidad 10, recarga 10/60 fichas por segundo)"""
+    count, _, period = str(value).partition('/')
+    capacity = int(count)
+    return capacity, capacity / float(period or 1)
+
+
+class MemoryStore:
+    """Cubetas en memoria del proceso, LRU acotado a `max_keys` llaves"""
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def consume(self, key, capacity, rate, cost=1):
+        """Regresa (permitido, segundos hasta tener `cost` fichas)"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._buckets.get(key)
+            if state is None:
+                tokens = capacity
+                state = self._buckets[key] = [tokens, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+                    self.evictions += 1
+            else:
+                tokens = min(capacity, state[0] + (now - state[1]) * rate)
+                self._buckets.move_to_end(key)
+            state[1] = now
+            if tokens >= cost:
+                state[0] = tokens - cost
+                return True, 0
+            state[0] = tokens
+            return False, (cost - tokens) / rate
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                self._buckets.clear()
+            else:
+                self._buckets.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'keys': len(self._buckets),
+                    'maxKeys': self.max_keys, 'evictions': self.evictions}
+
+
+# La recarga y el consumo se hacen en un solo paso atómico dentro de Redis
+_REDIS_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local retry = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    retry = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(retry)}
+"""
+
+
+class RedisStore:
+    """Cubetas compartidas entre workers y servidores (requiere el paquete `redis`)"""
+
+    def __init__(self, url, prefix='notas:rl:'):
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("RATELIMIT_STORAGE='redis' requiere instalar el paquete redis")
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_SCRIPT)
+        self.prefix = prefix
+
+    def consume(self, key, capacity, rate, cost=1):
+        allowed, retry = self._script(keys=[self.prefix + key], args=[capacity, rate, time.time(), cost])
+        return bool(allowed), float(retry)
+
+    def reset(self, key=None):
+        if key is not None:
+            self._client.delete(self.prefix + key)
+            return
+        for name in self._client.scan_iter(self.prefix + '*'):
+            self._client.delete(name)
+
+    def stats(self):
+        return {'backend': 'redis'}
+
+
+# ============================================
+# EXTENSIÓN
+# ============================================
+
+
+def _client_ip():
+    # Detrás de un proxy, aplicar werkzeug.middleware.proxy_fix.ProxyFix para que remote_addr sea el cliente
+    return request.remote_addr or ''
+
+
+def _body_field(name):
+    data = request.get_json(silent=True)
+    value = data.get(name) if isinstance(data, dict) else None
+    return value.strip().lower() if isinstance(value, str) and value.strip() else None
+
+
+# Cómo obtener el valor de cada alcance a partir de la petición
+SCOPES = {
+    'ip': _client_ip,
+    'email': lambda: _body_field('email'),
+    'device': lambda: _body_field('deviceId'),
+}
+
+
+class RateLimiter:
+    """Límites por endpoint según RATELIMIT_RULES; el almacén se elige con RATELIMIT_STORAGE"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.store = MemoryStore()
+        self.rules = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.enabled = config.get('RATELIMIT_ENABLED', True)
+        kind = config.get('RATELIMIT_STORAGE', 'memory')
+        if kind == 'memory':
+            self.store = MemoryStore(config.get('RATELIMIT_MAX_KEYS', 100000))
+        elif kind == 'redis':
+            self.store = RedisStore(config['RATELIMIT_REDIS_URL'])
+        else:
+            raise ValueError(f'RATELIMIT_STORAGE desconocido: {kind}')
+        self.rules = {
+            rule: {scope: parse_limit(limit) for scope, limit in scopes.items() if limit}
+            for rule, scopes in (config.get('RATELIMIT_RULES') or {}).items()
+        }
+        app.extensions['ratelimit'] = self
+
+    def check(self, rule):
+        """Consume un intento de cada alcance de la regla; lanza RateLimitExceeded si alguno se agotó"""
+        if not self.enabled:
+            return
+        denied = None
+        for scope, (capacity, rate) in self.rules.get(rule, {}).items():
+            value = SCOPES[scope]()
+            if value is None:
+                continue
+            allowed, retry_after = self.store.consume(f'{rule}:{scope}:{value}', capacity, rate)
+            if not allowed and (denied is None or retry_after > denied[1]):
+                denied = (scope, retry_after)
+        if denied:
+            raise RateLimitExceeded(rule, denied[0], max(1, math.ceil(denied[1])))
+
+    def limit(self, rule):
+        """Decorador para un endpoint: @limiter.limit('login')"""
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                self.check(rule)
+                return view(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self, key=None):
+        self.store.reset(key)
+
+    def stats(self):
+        return self.store.stats()
+
+
+limiter = RateLimiter()
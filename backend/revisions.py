@@ -0,0 +1,169 @@
+import json
+import zlib
+from datetime import datetime
+
+from flask import current_app
+
+from models import db, NoteRevision
+
+# ============================================
+# DELTAS DE TEXTO E HISTORIAL DE REVISIONES
+# ============================================
+#
+# Un delta es una lista de operaciones {"offset", "delete", "insert"} sobre el
+# contenido base: en la posición `offset` (en caracteres, no bytes) se quitan
+# `delete` caracteres y se pone `insert`. Los offsets se refieren al texto base
+# y las operaciones van en orden, sin traslaparse. PATCH /api/notes/<id> lo usa
+# para que editar una letra no reenvíe toda la nota.
+#
+# Cada nota lleva un número de revisión que sube cuando cambian título o
+# contenido. Con NOTE_HISTORY_ENABLED se guarda por cada cambio el delta
+# inverso (de la versión nueva a la anterior), comprimido: una edición chica
+# ocupa unos bytes en lugar de otra copia de la nota. Para reconstruir una
+# revisión se aplican los deltas inversos desde la versión actual hacia atrás.
+# Se conservan las últimas NOTE_HISTORY_MAX_REVISIONS de cada nota.
+
+
+class DeltaError(ValueError):
+    """Delta de texto inválido o que no aplica sobre el contenido base"""
+
+
+def _parse_op(op):
+    if not isinstance(op, dict):
+        raise DeltaError('Cada operación del delta debe ser un objeto')
+    offset, delete, insert = op.get('offset'), op.get('delete', 0), op.get('insert', '')
+    if type(offset) is not int or type(delete) is not int or offset < 0 or delete < 0:
+        raise DeltaError('offset y delete deben ser enteros no negativos')
+    if not isinstance(insert, str):
+        raise DeltaError('insert debe ser texto')
+    return offset, delete, insert
+
+
+def parse_delta(ops, max_ops):
+    """Valida la lista de operaciones; regresa tuplas (offset, delete, insert)"""
+    if not isinstance(ops, list) or not ops:
+        raise DeltaError('El delta debe ser una lista de operaciones')
+    if len(ops) > max_ops:
+        raise DeltaError(f'El delta excede el máximo de {max_ops} operaciones')
+    return [_parse_op(op) for op in ops]
+
+
+def apply_delta(text, ops):
+    """Aplica las operaciones sobre `text`; DeltaError si se salen o se traslapan"""
+    pieces = []
+    position = 0
+    for offset, delete, insert in ops:
+        if offset < position:
+            raise DeltaError('Las operaciones del delta deben ir en orden y sin traslaparse')
+        if offset + delete > len(text):
+            raise DeltaError('El delta se sale del contenido base')
+        pieces.append(text[position:offset])
+        pieces.append(insert)
+        position = offset + delete
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+
+def reverse_delta(text, ops):
+    """Operaciones que regresan del resultado de apply_delta(text, ops) a `text`"""
+    reverse = []
+    shift = 0
+    for offset, delete, insert in ops:
+        reverse.append((offset + shift, len(insert), text[offset:offset + delete]))
+        shift += len(insert) - delete
+    return reverse
+
+
+def diff_text(old, new):
+    """Delta de `old` a `new` con una sola operación (prefijo y sufijo comunes)
+
+    Es lineal y basta para el caso común de una edición en una sola zona; no
+    busca el delta mínimo.
+    """
+    if old == new:
+        return []
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return [(prefix, len(old) - prefix - suffix, new[prefix:len(new) - suffix])]
+
+
+# ============================================
+# HISTORIAL
+# ============================================
+
+def history_enabled():
+    return current_app.config.get('NOTE_HISTORY_ENABLED', True)
+
+
+def record_revision(note_id, user_id, revision, before, after, reverse=None):
+    """Guarda en la sesión el delta inverso de `revision` a `revision` + 1 (sin commit)
+
+    `before`/`after` son (title, content). Si ya se tiene el delta inverso del
+    contenido (PATCH con delta) se pasa en `reverse`; si no, se calcula.
+    """
+    if not history_enabled():
+        return
+    (old_title, old_content), (new_title, new_content) = before, after
+    change = {'ops': reverse if reverse is not None else diff_text(new_content, old_content)}
+    if old_title != new_title:
+        change['title'] = old_title
+    db.session.add(NoteRevision(
+        noteId=note_id, userId=user_id, revision=revision,
+        delta=zlib.compress(json.dumps(change, ensure_ascii=False, separators=(',', ':')).encode()),
+        createdAt=datetime.utcnow()
+    ))
+    keep = current_app.config['NOTE_HISTORY_MAX_REVISIONS']
+    if revision > keep:
+        db.session.execute(
+            db.delete(NoteRevision)
+            .where(NoteRevision.userId == user_id, NoteRevision.noteId == note_id,
+                   NoteRevision.revision <= revision - keep)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def list_revisions(note_id, user_id):
+    """(revision, createdAt, bytes del delta) guardadas de la nota, de la más nueva a la más vieja"""
+    return db.session.execute(
+        db.select(NoteRevision.revision, NoteRevision.createdAt, db.func.length(NoteRevision.delta))
+        .where(NoteRevision.userId == user_id, NoteRevision.noteId == note_id)
+        .order_by(NoteRevision.revision.desc())
+    ).all()
+
+
+def restore_revision(note, revision):
+    """(title, content) de la nota en `revision`, o None si ya no está en el historial"""
+    if revision == note.revision:
+        return note.title, note.content
+    if revision < 1 or revision > note.revision:
+        return None
+    deltas = db.session.execute(
+        db.select(NoteRevision.revision, NoteRevision.delta)
+        .where(NoteRevision.userId == note.userId, NoteRevision.noteId == note.id,
+               NoteRevision.revision >= revision,
+               NoteRevision.revision < note.revision)
+        .order_by(NoteRevision.revision.desc())
+    ).all()
+    # Hace falta la cadena completa de note.revision - 1 hasta `revision`
+    if [row.revision for row in deltas] != list(range(note.revision - 1, revision - 1, -1)):
+        return None
+    title, content = note.title, note.content
+    for row in deltas:
+        change = json.loads(zlib.decompress(row.delta))
+        content = apply_delta(content, change['ops'])
+        title = change.get('title', title)
+    return title, content
+
+
+def delete_revisions(user_id, note_ids):
+    """Borra el historial de notas eliminadas (sin commit)"""
+    db.session.execute(
+        db.delete(NoteRevision)
+        .where(NoteRevision.userId == user_id, NoteRevision.noteId.in_(list(note_ids)))
+        .execution_options(synchronize_session=False)
+    )
@@ -0,0 +1,179 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import datetime
+
+from logging_config import get_logger
+from models import db, TokenRevocation
+
+logger = get_logger('revocation')
+
+# ============================================
+# REVOCACIÓN DE TOKENS JWT
+# ============================================
+#
+# Los JWT se verifican sin consultar la base de datos; para poder invalidarlos
+# antes de que venzan, cada proceso guarda en memoria la tabla
+# token_revocations:
+#   - revocación de un usuario (reset-password, unlink-device): todos sus
+#     tokens emitidos antes de `notBefore` dejan de valer. Son pocas, se
+#     guardan exactas en un dict usuario -> notBefore.
+#   - revocación de un token (refresh token ya usado): su jti va a un filtro de
+#     Bloom. Un jti que no está en el filtro seguro no fue revocado; si el
+#     filtro dice que sí, se confirma en la base (falso positivo con
+#     probabilidad REVOCATION_ERROR_RATE).
+# Las filas nuevas se leen de forma incremental (id > último visto) cada
+# REVOCATION_REFRESH_SECONDS; ese es el retraso máximo entre procesos. Las
+# filas vencidas se descartan al reconstruir el filtro.
+
+
+class BloomFilter:
+    """Conjunto aproximado sin falsos negativos en un arreglo de bits"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class RevocationList:
+    """Consulta `is_revoked(payload)` para el token_in_blocklist_loader de JWT"""
+
+    def __init__(self, app=None):
+        self.capacity = 100000
+        self.error_rate = 0.001
+        self.refresh_interval = 5.0
+        self.rebuild_interval = 3600.0
+        self._filter = BloomFilter(self.capacity, self.error_rate)
+        self._not_before = {}
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._built_at = None
+        self._lock = threading.Lock()
+        self.confirmations = 0
+        self.false_positives = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        self.capacity = config.get('REVOCATION_CAPACITY', 100000)
+        self.error_rate = config.get('REVOCATION_ERROR_RATE', 0.001)
+        self.refresh_interval = config.get('REVOCATION_REFRESH_SECONDS', 5.0)
+        self.rebuild_interval = config.get('REVOCATION_REBUILD_SECONDS', 3600.0)
+        # Lo cargado de otra base no vale para esta: la primera consulta la lee completa
+        self._filter = BloomFilter(self.capacity, self.error_rate)
+        self._not_before = {}
+        self._last_id = 0
+        self._built_at = None
+        app.extensions['revocation'] = self
+
+    # --- Revocar (en la sesión actual; se guarda con el commit del handler) ---
+
+    def revoke_user(self, user_id, expires_at):
+        """Invalida los tokens del usuario emitidos hasta este segundo
+
+        `expires_at` es cuándo vence el último token afectado (ya no hace falta la fila).
+        """
+        # iat de los JWT va en segundos enteros: un token emitido en este mismo segundo sigue valiendo
+        not_before = datetime.utcfromtimestamp(int(time.time()))
+        db.session.add(TokenRevocation(userId=user_id, notBefore=not_before, expiresAt=expires_at))
+        with self._lock:
+            self._not_before[user_id] = max(self._not_before.get(user_id, 0), _epoch(not_before))
+
+    def revoke_token(self, payload):
+        """Invalida un token concreto por su jti (p. ej. un refresh token ya usado)"""
+        db.session.add(TokenRevocation(userId=int(payload['sub']), jti=payload['jti'],
+                                       expiresAt=datetime.utcfromtimestamp(payload['exp'])))
+        with self._lock:
+            self._filter.add(payload['jti'])
+
+    # --- Verificar ---
+
+    def is_revoked(self, payload):
+        self.refresh()
+        not_before = self._not_before.get(int(payload['sub']))
+        if not_before is not None and payload['iat'] < not_before:
+            return True
+        jti = payload.get('jti')
+        if jti is None or jti not in self._filter:
+            return False
+        self.confirmations += 1
+        revoked = db.session.execute(
+            db.select(TokenRevocation.id).where(TokenRevocation.jti == jti)
+        ).first() is not None
+        if not revoked:
+            self.false_positives += 1
+        return revoked
+
+    def refresh(self, force=False):
+        """Lee las revocaciones nuevas de la base; reconstruye todo cada REVOCATION_REBUILD_SECONDS"""
+        now = time.monotonic()
+        # La primera carga bloquea: antes de ella no se sabe nada de las revocaciones
+        force = force or self._built_at is None
+        if not force and now - self._refreshed_at < self.refresh_interval:
+            return
+        # Un solo hilo refresca; los demás siguen con el estado actual
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            if force or now - self._built_at >= self.rebuild_interval:
+                self._rebuild()
+                self._built_at = now
+            else:
+                self._load(TokenRevocation.id > self._last_id)
+            self._refreshed_at = now
+        finally:
+            self._lock.release()
+
+    def _rebuild(self):
+        self._filter = BloomFilter(self.capacity, self.error_rate)
+        self._not_before = {}
+        self._last_id = 0
+        self._load(TokenRevocation.expiresAt > datetime.utcnow())
+        if self._filter.count >= self.capacity:
+            logger.warning('Revocaciones vigentes (%s) por encima de REVOCATION_CAPACITY; '
+                           'aumentan los falsos positivos', self._filter.count)
+
+    def _load(self, condition):
+        rows = db.session.execute(
+            db.select(TokenRevocation.id, TokenRevocation.userId, TokenRevocation.jti, TokenRevocation.notBefore)
+            .where(condition)
+            .order_by(TokenRevocation.id)
+        ).all()
+        for row in rows:
+            if row.jti is not None:
+                self._filter.add(row.jti)
+            else:
+                not_before = _epoch(row.notBefore)
+                self._not_before[row.userId] = max(self._not_before.get(row.userId, 0), not_before)
+            self._last_id = max(self._last_id, row.id)
+
+    def stats(self):
+        return {'tokens': self._filter.count, 'users': len(self._not_before),
+                'filterBytes': len(self._filter.bits), 'confirmations': self.confirmations,
+                'falsePositives': self.false_positives}
+
+
+def _epoch(value):
+    return (value - datetime(1970, 1, 1)).total_seconds()
+
+
+revocations = RevocationList()
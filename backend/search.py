@@ -0,0 +1,172 @@
+import re
+
+from sqlalchemy import column, literal_column, table, text
+
+from models import db, Note
+
+# ============================================
+# ÍNDICE FTS5 (SQLite)
+# ============================================
+#
+# notes_fts es una tabla FTS5 de contenido externo: no duplica el texto, lo lee
+# de la vista notes_fts_source (rowid de notes + columnas indexadas). La columna
+# `owner` guarda el token 'u<userId>' para que el filtro por usuario se resuelva
+# dentro del índice en lugar de filtrar después todas las coincidencias.
+# Los triggers mantienen el índice al día con cualquier INSERT/UPDATE/DELETE,
+# incluidos los del endpoint de lotes.
+#
+# Nota: VACUUM puede renumerar los rowid de `notes` (su llave primaria no es
+# INTEGER), así que después de un VACUUM hay que ejecutar rebuild_search_index().
+
+SEARCH_DDL = [
+    """CREATE VIEW IF NOT EXISTS notes_fts_source AS
+       SELECT rowid AS note_rowid, title, content, 'u' || userId AS owner FROM notes""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+           title, content, owner,
+           content='notes_fts_source', content_rowid='note_rowid',
+           tokenize='unicode61 remove_diacritics 2', prefix='2 3')""",
+    """CREATE TRIGGER IF NOT EXISTS notes_fts_ai AFTER INSERT ON notes BEGIN
+           INSERT INTO notes_fts(rowid, title, content, owner)
+           VALUES (new.rowid, new.title, new.content, 'u' || new.userId);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS notes_fts_ad AFTER DELETE ON notes BEGIN
+           INSERT INTO notes_fts(notes_fts, rowid, title, content, owner)
+           VALUES ('delete', old.rowid, old.title, old.content, 'u' || old.userId);
+       END""",
+    """CREATE TRIGGER IF NOT EXISTS notes_fts_au AFTER UPDATE OF title, content, userId ON notes BEGIN
+           INSERT INTO notes_fts(notes_fts, rowid, title, content, owner)
+           VALUES ('delete', old.rowid, old.title, old.content, 'u' || old.userId);
+           INSERT INTO notes_fts(rowid, title, content, owner)
+           VALUES (new.rowid, new.title, new.content, 'u' || new.userId);
+       END""",
+]
+
+# Pesos de bm25 por columna: el título pesa más que el contenido
+RANK_WEIGHTS = (10.0, 1.0, 0.0)
+MAX_QUERY_TERMS = 10
+
+# Campos por defecto en resultados de búsqueda (sin el contenido completo)
+SEARCH_FIELDS = ('id', 'title', 'imageUrl', 'userId', 'createdAt', 'updatedAt')
+
+_fts = table('notes_fts', column('rowid'), column('notes_fts'))
+_fts_enabled = None
+
+
+class SearchError(ValueError):
+    """Consulta de búsqueda inválida"""
+
+
+def _has_fts5(connection):
+    try:
+        options = connection.execute(text('PRAGMA compile_options')).scalars().all()
+    except Exception:
+        return False
+    return 'ENABLE_FTS5' in options
+
+
+def ensure_search_index(engine=None):
+    """Crea el índice y sus triggers si no existen; regresa True si FTS5 está disponible
+
+    `engine`: base donde crearlo (cada shard tiene el suyo); por defecto la principal.
+    """
+    global _fts_enabled
+    engine = engine or db.engine
+    if engine.dialect.name != 'sqlite':
+        _fts_enabled = False
+        return False
+    with engine.begin() as connection:
+        if not _has_fts5(connection):
+            _fts_enabled = False
+            return False
+        existed = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+        )).first() is not None
+        for statement in SEARCH_DDL:
+            connection.execute(text(statement))
+        if not existed:
+            # Base de datos previa al índice: indexar las notas existentes
+            connection.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"))
+    _fts_enabled = True
+    return True
+
+
+def rebuild_search_index(engine=None):
+    """Reconstruye el índice completo a partir de la tabla notes"""
+    engine = engine or db.engine
+    if not ensure_search_index(engine):
+        return False
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')"))
+    return True
+
+
+def _search_enabled():
+    global _fts_enabled
+    if _fts_enabled is None:
+        _fts_enabled = db.engine.dialect.name == 'sqlite' and db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'notes_fts'"
+        )).first() is not None
+    return _fts_enabled
+
+
+# ============================================
+# CONSULTAS
+# ============================================
+
+def query_terms(raw):
+    """Separa la búsqueda del usuario en palabras (sin sintaxis FTS5)"""
+    terms = re.findall(r'\w+', raw or '')
+    if not terms:
+        raise SearchError('El parámetro q es requerido')
+    return terms[:MAX_QUERY_TERMS]
+
+
+def escape_like(term):
+    """Escapa los comodines de LIKE (`_` es parte de \\w, así que llega en los términos)"""
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_match_expression(user_id, terms):
+    """Expresión MATCH: todas las palabras como prefijo, solo en notas del usuario"""
+    words = ' '.join(f'"{term}"*' for term in terms)
+    return f'owner:u{int(user_id)} AND {{title content}}:({words})'
+
+
+def search_notes(user_id, raw_query, fields, limit, offset):
+    """Busca en título y contenido; regresa (filas, hay_más) ordenadas por relevancia
+
+    Cada fila trae los campos pedidos más `titleHighlight` y `snippet` con las
+    coincidencias marcadas con <b>...</b>.
+    """
+    terms = query_terms(raw_query)
+    columns = Note.columns_for(fields)
+
+    if _search_enabled():
+        fts_column = literal_column('notes_fts')
+        score = db.func.bm25(fts_column, *RANK_WEIGHTS)
+        stmt = (
+            db.select(*columns,
+                      db.func.highlight(fts_column, 0, '<b>', '</b>').label('titleHighlight'),
+                      db.func.snippet(fts_column, 1, '<b>', '</b>', '…', 12).label('snippet'))
+            .select_from(_fts)
+            .join(Note, literal_column('notes.rowid') == _fts.c.rowid)
+            .where(_fts.c.notes_fts.match(build_match_expression(user_id, terms)),
+                   Note.userId == user_id)
+            .order_by(score)
+        )
+    else:
+        # Sin FTS5 (otro motor de BD): búsqueda simple por LIKE, sin resaltado
+        patterns = [f'%{escape_like(term)}%' for term in terms]
+        conditions = [db.or_(Note.title.ilike(pattern, escape='\\'),
+                             Note.content.ilike(pattern, escape='\\'))
+                      for pattern in patterns]
+        stmt = (
+            db.select(*columns,
+                      Note.title.label('titleHighlight'),
+                      db.literal(None).label('snippet'))
+            .where(Note.userId == user_id, *conditions)
+            .order_by(Note.updatedAt.desc())
+        )
+
+    rows = db.session.execute(stmt.limit(limit + 1).offset(offset)).all()
+    return rows[:limit], len(rows) > limit
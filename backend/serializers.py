@@ -0,0 +1,102 @@
+import json
+from datetime import datetime
+
+from flask import Response, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+from models import NOTE_FIELDS, thumbnail_url
+
+try:
+    import orjson
+except ImportError:  # orjson es opcional: sin él se usa json de la biblioteca estándar
+    orjson = None
+
+# ============================================
+# CODIFICADOR JSON
+# ============================================
+
+
+def dumps(obj, default=None):
+    """Serializa a bytes JSON compacto (orjson si está instalado)"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask que usa orjson cuando está disponible
+
+    Los tipos que orjson no conoce (y las fechas, para conservar el formato de
+    Flask) pasan por DefaultJSONProvider.default.
+    """
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj, default=self.default).decode()
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj, default=self.default), mimetype=self.mimetype)
+
+
+# ============================================
+# SERIALIZACIÓN DE NOTAS
+# ============================================
+
+
+def _iso(value):
+    return (value or datetime.utcnow()).isoformat() + 'Z'
+
+
+_CONVERTERS = {'createdAt': _iso, 'updatedAt': _iso, 'userId': str}
+
+
+def note_serializer(fields=None, offset=0):
+    """Función que convierte una fila de columnas de Note en el dict de la API
+
+    Trabaja por posición sobre filas de un SELECT de columnas (sin hidratar
+    objetos del ORM); `offset` es la posición de la primera columna de la nota.
+    El formato es el mismo que Note.to_dict(); con imageUrl se agrega thumbnailUrl.
+    """
+    names = tuple(fields or NOTE_FIELDS)
+    end = offset + len(names)
+    converted = [(name, _CONVERTERS[name]) for name in names if name in _CONVERTERS]
+    with_thumbnail = 'imageUrl' in names
+
+    def serialize(row):
+        note = dict(zip(names, row[offset:end]))
+        for name, convert in converted:
+            note[name] = convert(note[name])
+        if with_thumbnail:
+            note['thumbnailUrl'] = thumbnail_url(note['imageUrl'])
+        return note
+
+    return serialize
+
+
+def json_array_response(result, serialize, stream_threshold=1000, chunk_size=500):
+    """Respuesta JSON con un arreglo a partir de un resultado de SQLAlchemy
+
+    Si hay menos de `stream_threshold` filas se responde de una vez; si no, el
+    arreglo se envía por partes de `chunk_size` filas para que la memoria no
+    crezca con el tamaño de la colección.
+    """
+    first = result.fetchmany(stream_threshold)
+    if len(first) < stream_threshold:
+        return Response(dumps([serialize(row) for row in first]), mimetype='application/json')
+
+    def generate():
+        yield b'['
+        # Cada bloque se codifica como arreglo y se le quitan los corchetes
+        yield dumps([serialize(row) for row in first])[1:-1]
+        while True:
+            rows = result.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield b',' + dumps([serialize(row) for row in rows])[1:-1]
+        yield b']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
@@ -0,0 +1,420 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import g, request
+from flask_jwt_extended import get_jwt, verify_jwt_in_request
+from sqlalchemy import TextClause, exc, inspect, text
+from sqlalchemy.sql.util import find_tables
+
+from database import shard_bind
+from logging_config import get_logger
+from models import db, Note, NoteChange, NoteRevision, NoteSummary, User, UserShard
+
+logger = get_logger('sharding')
+
+# ============================================
+# NOTAS REPARTIDAS POR USUARIO (SHARDS)
+# ============================================
+#
+# Con SHARD_URLS definida, las notas de cada usuario (notes, note_changes y el
+# índice FTS) viven en una sola de las bases 'shard<i>'; users, jobs,
+# revocaciones y demás tablas siguen en la base central. Así las escrituras de
+# usuarios distintos no compiten por el mismo bloqueo de escritura de SQLite.
+#
+# El shard se elige con rendezvous hashing sobre las primeras SHARD_COUNT
+# bases: al pasar de N a N+1 shards solo se mueve ~1/(N+1) de los usuarios, y
+# cada uno directamente a la base nueva. RoutingSession (models.py) consulta a
+# este enrutador en cada sentencia que toca tablas de notas; el usuario sale
+# del JWT de la petición o de shards.use(user_id) fuera de una petición.
+#
+# Rebalanceo en línea (`flask --app app shards-rebalance --to N`), por lotes:
+#   1. user_shards marca al usuario 'moving': sus escrituras de notas responden
+#      503 con Retry-After (las lecturas siguen en el shard de origen).
+#   2. Tras 2 * SHARD_DIRECTORY_REFRESH_SECONDS todos los procesos lo vieron;
+#      se copian sus notas y bitácora al destino.
+#   3. Se marca 'moved' con el destino, se espera otra vez y se borran las
+#      filas del origen.
+# Después de cambiar SHARD_COUNT=N y reiniciar, `shards-rebalance --finalize`
+# borra las entradas del directorio que ya coinciden con el hash.
+#
+# La llave primaria de notes es el UUID y solo es única dentro de cada base;
+# bitácora e historial son únicos por (usuario, nota). Los ids que propone el
+# cliente se rechazan si ya son de otro usuario en cualquier base, como nota o
+# como tombstone (notes_owned_elsewhere). Si aun así algo choca al copiar, el
+# rebalanceo deja a ese usuario en su shard actual en lugar de fallar a la mitad.
+
+SHARDED_TABLES = frozenset({'notes', 'note_changes', 'note_revisions', 'note_summaries',
+                            'notes_fts', 'notes_fts_source'})
+SHARD_MODEL_TABLES = (Note.__table__, NoteChange.__table__, NoteRevision.__table__, NoteSummary.__table__)
+
+MOVING = 'moving'
+MOVED = 'moved'
+
+
+class ShardMoving(Exception):
+    """Las notas del usuario se están copiando a otro shard"""
+
+
+class NoteIdCollision(Exception):
+    """Ids de notas del usuario que en el shard destino ya son de otro usuario"""
+
+    def __init__(self, user_id, note_ids):
+        super().__init__(f'Usuario {user_id}: ids de notas ya usados en el destino: {sorted(note_ids)}')
+        self.user_id = user_id
+        self.note_ids = note_ids
+
+
+@lru_cache(maxsize=65536)
+def rendezvous(user_id, count):
+    """Bind del shard de `user_id` entre los primeros `count`; None = base central"""
+    if count <= 0:
+        return None
+    key = str(user_id).encode()
+    best = max(range(count), key=lambda index: hashlib.blake2b(
+        key, digest_size=8, salt=index.to_bytes(8, 'little')).digest())
+    return shard_bind(best)
+
+
+class ShardRouter:
+    """Elige la base de las notas de cada usuario"""
+
+    def __init__(self, app=None):
+        self.enabled = False
+        self.count = 0
+        self.keys = []
+        self.refresh_interval = 5.0
+        self._directory = {}
+        self._moving = 0
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        config = app.config
+        urls = config.get('SHARD_URLS') or []
+        self.keys = [shard_bind(index) for index in range(len(urls))]
+        self.count = config.get('SHARD_COUNT', len(urls))
+        if self.count > len(urls):
+            raise ValueError(f'SHARD_COUNT={self.count} pero SHARD_URLS solo tiene {len(urls)} bases')
+        self.refresh_interval = config.get('SHARD_DIRECTORY_REFRESH_SECONDS', 5.0)
+        self.enabled = bool(urls)
+        if self.enabled:
+            app.before_request(self._reject_moving_writes)
+        app.extensions['shards'] = self
+
+    # --- Directorio de usuarios movidos ---
+
+    def refresh(self, force=False):
+        """Relee user_shards cada SHARD_DIRECTORY_REFRESH_SECONDS"""
+        now = time.monotonic()
+        force = force or self._refreshed_at is None
+        if not force and now - self._refreshed_at < self.refresh_interval:
+            return
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            # Conexión aparte: puede llamarse mientras la sesión elige un bind
+            with db.engines[None].connect() as connection:
+                rows = connection.execute(
+                    db.select(UserShard.userId, UserShard.shard, UserShard.state)
+                ).all()
+            self._directory = {row.userId: (row.shard or None, row.state) for row in rows}
+            self._moving = sum(1 for row in rows if row.state == MOVING)
+            self._refreshed_at = now
+        finally:
+            self._lock.release()
+
+    def shard_for(self, user_id):
+        """Bind donde están hoy las notas del usuario (None = base central)"""
+        if not self.enabled:
+            return None
+        self.refresh()
+        entry = self._directory.get(user_id)
+        if entry is not None:
+            return entry[0]
+        return rendezvous(user_id, self.count)
+
+    def is_moving(self, user_id):
+        self.refresh()
+        entry = self._directory.get(user_id)
+        return entry is not None and entry[1] == MOVING
+
+    # --- Shard de la petición actual ---
+
+    def use(self, user_id):
+        """Fija el shard de las consultas de notas del contexto actual"""
+        g.shard_key = self.shard_for(user_id)
+
+    @contextmanager
+    def using(self, key):
+        """Consultas de notas contra un bind concreto (mantenimiento y migración)"""
+        missing = object()
+        previous = g.get('shard_key', missing)
+        g.shard_key = key
+        try:
+            yield
+        finally:
+            if previous is missing:
+                g.pop('shard_key', None)
+            else:
+                g.shard_key = previous
+
+    def current(self):
+        """Bind del contexto actual: shards.use() o el usuario del JWT verificado"""
+        if 'shard_key' in g:
+            return g.shard_key
+        payload = g.get('_jwt_extended_jwt')
+        if not payload:
+            return None
+        key = g.shard_key = self.shard_for(int(payload['sub']))
+        return key
+
+    def is_sharded(self, mapper, clause):
+        """¿La sentencia toca tablas de notas?"""
+        if mapper is not None:
+            return inspect(mapper).local_table.name in SHARDED_TABLES
+        if clause is None:
+            return False
+        if isinstance(clause, TextClause):
+            # SQL literal: solo se usa para el índice FTS
+            return True
+        return any(getattr(table, 'name', None) in SHARDED_TABLES
+                   for table in find_tables(clause, include_crud=True, include_joins=True))
+
+    def note_binds(self):
+        """Bases que pueden guardar notas: la central y cada shard"""
+        return [None] + self.keys
+
+    def _reject_moving_writes(self):
+        self.refresh()
+        if not self._moving or request.method in ('GET', 'HEAD', 'OPTIONS'):
+            return
+        if not request.path.startswith('/api/notes'):
+            return
+        try:
+            verify_jwt_in_request(optional=True)
+        except Exception:
+            # Token inválido: que lo rechace la vista con su respuesta habitual
+            return
+        payload = get_jwt()
+        if payload and self.is_moving(int(payload['sub'])):
+            raise ShardMoving()
+
+    def stats(self):
+        return {'count': self.count, 'available': len(self.keys),
+                'directory': len(self._directory), 'moving': self._moving}
+
+
+shards = ShardRouter()
+
+
+def notes_owned_elsewhere(note_ids, user_id):
+    """Ids de `note_ids` que son de otro usuario (nota o tombstone) en otra base
+
+    Quien llama ya revisó la base del usuario (su sesión); aquí se revisan las
+    demás, para que un rebalanceo posterior no encuentre el id repetido.
+    """
+    note_ids = [note_id for note_id in note_ids if note_id]
+    if not shards.enabled or not note_ids:
+        return set()
+    home = shards.shard_for(user_id)
+    notes, changes = Note.__table__, NoteChange.__table__
+    taken = set()
+    for key in shards.note_binds():
+        if key == home:
+            continue
+        with db.engines[key].connect() as connection:
+            taken.update(connection.execute(db.union(
+                db.select(notes.c.id).where(notes.c.id.in_(note_ids), notes.c.userId != user_id),
+                db.select(changes.c.noteId).where(changes.c.noteId.in_(note_ids),
+                                                  changes.c.userId != user_id),
+            )).scalars())
+    return taken
+
+
+# ============================================
+# MIGRACIÓN ENTRE SHARDS
+# ============================================
+
+def sequence_position(connection):
+    """Último id usado de note_changes (los syncToken de los clientes)"""
+    position = connection.execute(db.select(db.func.max(NoteChange.id))).scalar() or 0
+    if connection.dialect.name == 'sqlite':
+        seq = connection.execute(text(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'note_changes'"
+        )).scalar()
+        position = max(position, seq or 0)
+    return position
+
+
+def advance_sequence(connection, position):
+    """Los ids nuevos del destino deben ser mayores que cualquier syncToken ya entregado"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        seq = connection.execute(text(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'note_changes'"
+        )).first()
+        if seq is None:
+            connection.execute(text(
+                "INSERT INTO sqlite_sequence (name, seq) VALUES ('note_changes', :position)"
+            ), {'position': position})
+        elif seq[0] < position:
+            connection.execute(text(
+                "UPDATE sqlite_sequence SET seq = :position WHERE name = 'note_changes'"
+            ), {'position': position})
+    elif dialect == 'postgresql':
+        connection.execute(text(
+            "SELECT setval(pg_get_serial_sequence('note_changes', 'id'), "
+            "GREATEST(:position, (SELECT COALESCE(MAX(id), 1) FROM note_changes)))"
+        ), {'position': position})
+    else:
+        logger.warning('No se puede ajustar la secuencia de note_changes en %s', dialect)
+
+
+def _delete_user_rows(connection, user_id):
+    connection.execute(db.delete(Note.__table__).where(Note.__table__.c.userId == user_id))
+    connection.execute(db.delete(NoteChange.__table__).where(NoteChange.__table__.c.userId == user_id))
+    connection.execute(db.delete(NoteRevision.__table__).where(NoteRevision.__table__.c.userId == user_id))
+    connection.execute(db.delete(NoteSummary.__table__).where(NoteSummary.__table__.c.userId == user_id))
+
+
+def copy_user_notes(user_id, source, target):
+    """Copia notas, bitácora, historial y totales del usuario; repetible (borra primero lo del destino)"""
+    notes, changes, summaries = Note.__table__, NoteChange.__table__, NoteSummary.__table__
+    revisions = NoteRevision.__table__
+    with db.engines[source].connect() as connection:
+        note_rows = [dict(row) for row in connection.execute(
+            db.select(notes).where(notes.c.userId == user_id)).mappings()]
+        change_rows = [dict(row) for row in connection.execute(
+            db.select(changes).where(changes.c.userId == user_id).order_by(changes.c.id)).mappings()]
+        revision_rows = [dict(row) for row in connection.execute(
+            db.select(revisions).where(revisions.c.userId == user_id)).mappings()]
+        summary_rows = [dict(row) for row in connection.execute(
+            db.select(summaries).where(summaries.c.userId == user_id)).mappings()]
+        position = sequence_position(connection)
+    for row in (*change_rows, *revision_rows):
+        # Ids nuevos en el destino, en el mismo orden
+        del row['id']
+    with db.engines[target].begin() as connection:
+        if note_rows:
+            collisions = set(connection.execute(
+                db.select(notes.c.id).where(notes.c.id.in_([row['id'] for row in note_rows]),
+                                            notes.c.userId != user_id)
+            ).scalars())
+            if collisions:
+                raise NoteIdCollision(user_id, collisions)
+        advance_sequence(connection, position)
+        _delete_user_rows(connection, user_id)
+        if note_rows:
+            connection.execute(db.insert(notes), note_rows)
+        if change_rows:
+            connection.execute(db.insert(changes), change_rows)
+        if revision_rows:
+            connection.execute(db.insert(revisions), revision_rows)
+        if summary_rows:
+            connection.execute(db.insert(summaries), summary_rows)
+    return len(note_rows)
+
+
+def delete_user_notes(user_id, key):
+    with db.engines[key].begin() as connection:
+        _delete_user_rows(connection, user_id)
+
+
+def _set_directory(entries):
+    for user_id, shard, target, state in entries:
+        db.session.merge(UserShard(userId=user_id, shard=shard or '', target=target or '', state=state))
+    db.session.commit()
+    shards.refresh(force=True)
+
+
+def plan_moves(count):
+    """(usuario, origen, destino) de los usuarios que cambian de base con `count` shards"""
+    shards.refresh(force=True)
+    user_ids = db.session.execute(db.select(User.id).order_by(User.id)).scalars().all()
+    moves = []
+    for user_id in user_ids:
+        source, target = shards.shard_for(user_id), rendezvous(user_id, count)
+        if source != target:
+            moves.append((user_id, source, target))
+    return moves
+
+
+def rebalance(count, batch_size=100, wait=None):
+    """Mueve en línea a los usuarios cuyo shard cambia al usar `count` shards
+
+    Regresa cuántos se movieron; quien tenga un id de nota que en el destino
+    ya es de otro usuario se queda en su shard (fijado en el directorio).
+    """
+    if count > len(shards.keys):
+        raise ValueError(f'Solo hay {len(shards.keys)} bases en SHARD_URLS')
+    if wait is None:
+        # Tiempo para que todos los procesos relean el directorio
+        wait = shards.refresh_interval * 2 + 1
+    moves = plan_moves(count)
+    logger.info('Rebalanceo a %s shards: %s usuarios por mover', count, len(moves))
+    stuck = 0
+    for start in range(0, len(moves), batch_size):
+        batch = moves[start:start + batch_size]
+        _set_directory((user_id, source, target, MOVING) for user_id, source, target in batch)
+        time.sleep(wait)
+        copied = 0
+        kept = set()
+        try:
+            for user_id, source, target in batch:
+                try:
+                    copied += copy_user_notes(user_id, source, target)
+                except (NoteIdCollision, exc.IntegrityError) as e:
+                    # La copia es una transacción: el destino queda sin cambios
+                    logger.warning('Rebalanceo: el usuario %s se queda en %s: %s',
+                                   user_id, source or 'central', e)
+                    kept.add(user_id)
+        except Exception:
+            # Error inesperado: el lote vuelve a su origen para que sus escrituras
+            # no sigan en 503; lo ya copiado al destino lo borra finalize()
+            _set_directory((user_id, source, None, MOVED) for user_id, source, _ in batch)
+            raise
+        _set_directory((user_id, source if user_id in kept else target, None, MOVED)
+                       for user_id, source, target in batch)
+        time.sleep(wait)
+        for user_id, source, _ in batch:
+            if user_id not in kept:
+                delete_user_notes(user_id, source)
+        stuck += len(kept)
+        logger.info('Rebalanceo: %s de %s usuarios procesados (%s notas en este lote)',
+                    start + len(batch), len(moves), copied)
+    return len(moves) - stuck
+
+
+def finalize():
+    """Con SHARD_COUNT ya actualizado en todos los procesos: limpia directorio y restos"""
+    shards.refresh(force=True)
+    redundant = [
+        user_shard for user_shard in db.session.execute(
+            db.select(UserShard).where(UserShard.state == MOVED)).scalars()
+        if (user_shard.shard or None) == rendezvous(user_shard.userId, shards.count)
+    ]
+    for user_shard in redundant:
+        db.session.delete(user_shard)
+    db.session.commit()
+    shards.refresh(force=True)
+    # Notas de usuarios que ya no viven en esa base (p. ej. rebalanceo interrumpido)
+    orphans = 0
+    notes, changes, summaries = Note.__table__, NoteChange.__table__, NoteSummary.__table__
+    for key in shards.note_binds():
+        with db.engines[key].connect() as connection:
+            user_ids = connection.execute(
+                db.union(db.select(notes.c.userId), db.select(changes.c.userId),
+                         db.select(summaries.c.userId))
+            ).scalars().all()
+        for user_id in user_ids:
+            if shards.shard_for(user_id) != key and not shards.is_moving(user_id):
+                delete_user_notes(user_id, key)
+                orphans += 1
+    logger.info('Directorio: %s entradas eliminadas; %s usuarios con restos borrados',
+                len(redundant), orphans)
+    return len(redundant), orphans
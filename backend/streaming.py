@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+from models import db, NoteChange
+from serializers import dumps, note_serializer
+from sharding import shards
+from sync import OP_DELETE, encode_sync_token, fetch_changes
+
+# ============================================
+# STREAM DE CAMBIOS (SERVER-SENT EVENTS)
+# ============================================
+#
+# Eventos que recibe el cliente:
+#   upsert  nota creada o modificada (mismo formato que GET /api/notes/<id>)
+#   delete  {"id": ...} nota eliminada
+#   resync  {"since": token}: se perdieron cambios; obtenerlos con
+#           GET /api/notes/changes?since=token (el stream sigue en vivo)
+#   ready   {"since": token}: posición actual al abrir el stream
+# El id de cada evento es el mismo syncToken de /api/notes/changes, así que al
+# reconectar con Last-Event-ID se reciben los cambios ocurridos mientras tanto.
+# Sin eventos se envía un comentario cada SSE_HEARTBEAT_SECONDS para que
+# proxies y NAT no cierren la conexión.
+
+HEARTBEAT = b': ping\n\n'
+
+
+def sse_event(event, data, event_id=None):
+    """Un evento SSE con `data` en JSON (una sola línea)"""
+    head = f'id: {event_id}\n' if event_id is not None else ''
+    return f'{head}event: {event}\ndata: '.encode() + dumps(data) + b'\n\n'
+
+
+class NoteEventStream:
+    """Cuerpo de la respuesta de GET /api/notes/stream
+
+    Se puede iterar en un hilo (servidor WSGI) o con `async for` en el event
+    loop (asgi.py), donde un stream inactivo no ocupa ningún hilo; solo las
+    lecturas de la bitácora corren en el pool por defecto del loop.
+    """
+
+    def __init__(self, app, bus, subscriber, since=None, duration=3600, heartbeat=15,
+                 poll_on_heartbeat=False, retry_ms=3000):
+        self.app = app
+        self.bus = bus
+        self.subscriber = subscriber
+        self.user_id = subscriber.user_id
+        self.last_id = since
+        self.deadline = time.monotonic() + duration
+        self.heartbeat = heartbeat
+        self.poll_on_heartbeat = poll_on_heartbeat
+        self.retry_ms = retry_ms
+        self._serialize = note_serializer(offset=3)
+
+    # --- Lecturas de la bitácora (bloqueantes) ---
+
+    def _latest_id(self):
+        return db.session.execute(
+            db.select(db.func.max(NoteChange.id)).where(NoteChange.userId == self.user_id)
+        ).scalar() or 0
+
+    def _open(self):
+        with self.app.app_context():
+            shards.use(self.user_id)
+            frames = [f'retry: {self.retry_ms}\n\n'.encode()]
+            if self.last_id is None:
+                self.last_id = self._latest_id()
+            else:
+                frames.append(self._fetch())
+            token = encode_sync_token(self.last_id)
+            frames.append(sse_event('ready', {'since': token}, token))
+            return b''.join(frames)
+
+    def _fetch(self):
+        """Eventos de los cambios posteriores a la última posición entregada"""
+        rows, has_more = fetch_changes(self.user_id, self.last_id, self.bus.buffer_size)
+        frames = []
+        for row in rows:
+            token = encode_sync_token(row.changeId)
+            if row.op == OP_DELETE or row.id is None:
+                frames.append(sse_event('delete', {'id': row.noteId}, token))
+            else:
+                frames.append(sse_event('upsert', self._serialize(row), token))
+        if rows:
+            self.last_id = rows[-1].changeId
+        if has_more:
+            frames.append(self._resync())
+        return b''.join(frames)
+
+    def _resync(self):
+        """El cliente recupera lo pendiente por su cuenta; el stream salta al final"""
+        since = encode_sync_token(self.last_id)
+        self.last_id = self._latest_id()
+        return sse_event('resync', {'since': since}, encode_sync_token(self.last_id))
+
+    def _on_wake(self, woke):
+        with self.app.app_context():
+            shards.use(self.user_id)
+            _, overflowed = self.subscriber.drain()
+            if overflowed:
+                return self._resync()
+            frames = self._fetch() if woke or self.poll_on_heartbeat else b''
+            # Un aviso sin cambios nuevos (p. ej. de otra transacción revertida) no envía nada
+            return frames or (b'' if woke else HEARTBEAT)
+
+    def _timeout(self):
+        return min(self.heartbeat, self.deadline - time.monotonic())
+
+    # --- Iteración ---
+
+    def __iter__(self):
+        try:
+            yield self._open()
+            while (timeout := self._timeout()) > 0:
+                woke = self.subscriber.wait(timeout)
+                if self.subscriber.closed:
+                    break
+                yield self._on_wake(woke)
+        finally:
+            self.close()
+
+    def __aiter__(self):
+        return self._aiter()
+
+    async def _aiter(self):
+        loop = asyncio.get_running_loop()
+        self.subscriber.bind_loop()
+        try:
+            yield await loop.run_in_executor(None, self._open)
+            while (timeout := self._timeout()) > 0:
+                woke = await self.subscriber.wait_async(timeout)
+                if self.subscriber.closed:
+                    break
+                if woke or self.poll_on_heartbeat:
+                    yield await loop.run_in_executor(None, self._on_wake, woke)
+                else:
+                    yield HEARTBEAT
+        finally:
+            self.close()
+
+    def close(self):
+        self.bus.unsubscribe(self.subscriber)
@@ -0,0 +1,173 @@
+from database import read_bind
+from models import db, Note, NoteSummary
+
+# ============================================
+# TOTALES POR USUARIO (GET /api/notes/summary)
+# ============================================
+#
+# note_summaries guarda por usuario cuántas notas tiene, los bytes de su
+# contenido, cuántas tienen imagen y el updatedAt más reciente. Cada escritura
+# de notas lo ajusta en su misma transacción con un UPDATE por llave primaria
+# (SummaryDelta), así que leer el resumen no depende del tamaño de la colección.
+#
+# Si la fila falta (primer alta del usuario) se calcula desde las notas. La
+# tarea recompute_note_summaries vuelve a calcular todo en bloque y corrige
+# lo que se haya desviado (p. ej. escrituras hechas a mano en la base).
+
+SUMMARY_COLUMNS = ['userId', 'noteCount', 'contentBytes', 'withImages', 'lastUpdatedAt']
+
+# Campos de las notas recientes que acompañan al resumen
+RECENT_FIELDS = ('id', 'title', 'imageUrl', 'updatedAt')
+
+
+def content_bytes(content):
+    """Bytes del contenido en UTF-8 (lo mismo que cuenta el cálculo en SQL)"""
+    return len(content.encode('utf-8')) if content else 0
+
+
+class SummaryDelta:
+    """Cambio acumulado en los totales de un usuario dentro de una transacción
+
+    Una edición es remove() del estado anterior más add() del nuevo.
+    """
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.count = 0
+        self.bytes = 0
+        self.images = 0
+        self.removed = 0
+        self.last_updated = None
+
+    def add(self, content, image_url, updated_at):
+        self.count += 1
+        self.bytes += content_bytes(content)
+        self.images += 1 if image_url else 0
+        if self.last_updated is None or updated_at > self.last_updated:
+            self.last_updated = updated_at
+        return self
+
+    def remove(self, content, image_url):
+        self.count -= 1
+        self.bytes -= content_bytes(content)
+        self.images -= 1 if image_url else 0
+        self.removed += 1
+        return self
+
+    def apply(self):
+        """Ajusta la fila del usuario en la sesión actual (sin hacer commit)"""
+        if not (self.count or self.bytes or self.images or self.removed or self.last_updated):
+            return
+        if self.last_updated is not None:
+            # Lo recién escrito es lo más nuevo de la colección
+            last = db.case(
+                (db.or_(NoteSummary.lastUpdatedAt.is_(None), NoteSummary.lastUpdatedAt < self.last_updated),
+                 self.last_updated),
+                else_=NoteSummary.lastUpdatedAt)
+        else:
+            # Solo borrados: el más reciente que queda (índice userId, updatedAt)
+            last = _last_updated(self.user_id)
+        # Las sentencias de Core no hacen autoflush; las notas deben estar en la base antes
+        db.session.flush()
+        updated = db.session.execute(
+            db.update(NoteSummary)
+            .where(NoteSummary.userId == self.user_id)
+            .values(noteCount=NoteSummary.noteCount + self.count,
+                    contentBytes=NoteSummary.contentBytes + self.bytes,
+                    withImages=NoteSummary.withImages + self.images,
+                    lastUpdatedAt=last)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if not updated:
+            # Sin fila todavía: se calcula con las notas ya escritas
+            db.session.execute(
+                db.insert(NoteSummary).from_select(SUMMARY_COLUMNS, _aggregate(self.user_id))
+            )
+
+
+def record_summary(user_id, before=None, after=None):
+    """Ajusta los totales por una nota: `before`/`after` son la nota antes y después
+
+    `before` es (content, imageUrl) y `after` (content, imageUrl, updatedAt);
+    None si la nota no existía o ya no existe.
+    """
+    delta = SummaryDelta(user_id)
+    if before is not None:
+        delta.remove(*before)
+    if after is not None:
+        delta.add(*after)
+    delta.apply()
+
+
+def load_summary(user_id):
+    """(noteCount, contentBytes, withImages, lastUpdatedAt) del usuario; ceros si no tiene fila"""
+    row = db.session.execute(
+        db.select(NoteSummary.noteCount, NoteSummary.contentBytes, NoteSummary.withImages,
+                  NoteSummary.lastUpdatedAt)
+        .where(NoteSummary.userId == user_id),
+        bind_arguments=read_bind()
+    ).first()
+    return tuple(row) if row is not None else (0, 0, 0, None)
+
+
+def recent_notes(user_id, limit):
+    """Las `limit` notas editadas más recientemente (índice userId, updatedAt)"""
+    return db.session.execute(
+        db.select(*Note.columns_for(RECENT_FIELDS))
+        .where(Note.userId == user_id)
+        .order_by(Note.updatedAt.desc())
+        .limit(limit),
+        bind_arguments=read_bind()
+    ).all()
+
+
+def _bytes_column():
+    # length() de un BLOB cuenta bytes en SQLite y PostgreSQL; de un TEXT, caracteres
+    return db.func.coalesce(db.func.sum(db.func.length(db.cast(Note.content, db.LargeBinary))), 0)
+
+
+def _aggregate(user_id=None):
+    """SELECT de los totales calculados desde las notas (de un usuario o de todos)"""
+    query = db.select(
+        Note.userId,
+        db.func.count(),
+        _bytes_column(),
+        db.func.count(db.case((Note.imageUrl != '', 1))),
+        db.func.max(Note.updatedAt),
+    )
+    if user_id is not None:
+        return query.where(Note.userId == user_id).group_by(Note.userId)
+    return query.group_by(Note.userId)
+
+
+def _last_updated(user_id):
+    return (db.select(db.func.max(Note.updatedAt))
+            .where(Note.userId == user_id)
+            .scalar_subquery())
+
+
+def recompute_summaries(engine):
+    """Recalcula en bloque los totales de una base; regresa cuántos usuarios estaban mal
+
+    Primero compara (solo lectura); si hay diferencias reemplaza la tabla
+    completa en una transacción, con los totales recalculados en SQL.
+    """
+    with engine.connect() as connection:
+        expected = {row[0]: tuple(row[1:]) for row in connection.execute(_aggregate())}
+        stored = {row[0]: tuple(row[1:]) for row in connection.execute(
+            db.select(*(NoteSummary.__table__.c[name] for name in SUMMARY_COLUMNS)))}
+    drifted = {user_id for user_id in expected.keys() | stored.keys()
+               if _normalize(expected.get(user_id)) != _normalize(stored.get(user_id))}
+    if not drifted:
+        return 0
+    with engine.begin() as connection:
+        connection.execute(db.delete(NoteSummary.__table__))
+        connection.execute(db.insert(NoteSummary.__table__).from_select(SUMMARY_COLUMNS, _aggregate()))
+    return len(drifted)
+
+
+def _normalize(values):
+    # Un usuario sin notas puede tener fila en ceros o no tenerla
+    if values is None or not values[0]:
+        return None
+    return tuple(values)
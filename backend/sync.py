@@ -0,0 +1,111 @@
+import base64
+import binascii
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+
+from events import bus
+from models import db, Note, NoteChange
+
+OP_UPSERT = 'upsert'
+OP_DELETE = 'delete'
+
+# El id de un cambio se asigna en el INSERT, no en el COMMIT. Si dos
+# transacciones del mismo usuario se cruzan (id 5 sin confirmar, id 6 ya
+# confirmado), un cliente que sincroniza en medio recibe el 6, avanza su token
+# y nunca ve el 5. Por eso los cambios de un usuario se escriben de uno en uno:
+#   SQLite      un solo escritor por base; se confirma en orden de id
+#   PostgreSQL  pg_advisory_xact_lock por usuario hasta el commit
+# Con otros motores no hay esa garantía (ver _lock_user_changes).
+CHANGE_LOCK_CLASS = 0x4e43  # primer argumento del advisory lock ('NC')
+
+
+class SyncTokenError(ValueError):
+    """Token de sincronización inválido"""
+
+
+def encode_sync_token(change_id):
+    """Convierte la posición en la bitácora en un token opaco"""
+    return base64.urlsafe_b64encode(f'v1:{change_id}'.encode()).decode().rstrip('=')
+
+
+def decode_sync_token(token):
+    """Regresa la posición en la bitácora codificada en el token (0 si no hay token)"""
+    if not token:
+        return 0
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        version, change_id = base64.urlsafe_b64decode(padded.encode()).decode().split(':', 1)
+        if version != 'v1':
+            raise ValueError(version)
+        return int(change_id)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise SyncTokenError('Token de sincronización inválido')
+
+
+def record_change(user_id, note_id, op):
+    """Registra el cambio de una nota en la sesión actual (sin hacer commit)
+
+    Se reemplaza el registro previo de la nota para que la bitácora crezca
+    con el número de notas y no con el número de ediciones.
+    """
+    record_changes(user_id, [(note_id, op)])
+
+
+def _lock_user_changes(user_id):
+    """Serializa hasta el commit las escrituras en la bitácora de un usuario"""
+    connection = db.session.connection(bind_arguments={'mapper': inspect(NoteChange)})
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        connection.execute(text('SELECT pg_advisory_xact_lock(:lock_class, :user_id)'),
+                           {'lock_class': CHANGE_LOCK_CLASS, 'user_id': user_id})
+    elif dialect != 'sqlite':
+        raise RuntimeError(f'La bitácora de sincronización no soporta {dialect}; usar SQLite o PostgreSQL')
+
+
+def record_changes(user_id, changes):
+    """Versión por lotes de record_change: `changes` es una lista de (note_id, op)"""
+    if not changes:
+        return
+    _lock_user_changes(user_id)
+    now = datetime.utcnow()
+    db.session.execute(
+        db.delete(NoteChange).where(NoteChange.userId == user_id,
+                                    NoteChange.noteId.in_([note_id for note_id, _ in changes]))
+    )
+    db.session.execute(db.insert(NoteChange), [
+        {'userId': user_id, 'noteId': note_id, 'op': op, 'changedAt': now}
+        for note_id, op in changes
+    ])
+    # Avisar a los streams del usuario (GET /api/notes/stream) cuando se confirme
+    bus.publish_on_commit(user_id, changes)
+
+
+def fetch_changes(user_id, since, limit):
+    """Obtiene los cambios posteriores a `since` en orden de bitácora
+
+    Regresa (filas, hay_más); cada fila trae el id del cambio, la operación y
+    las columnas de la nota (None si fue eliminada).
+    """
+    rows = (
+        db.session.query(NoteChange.id.label('changeId'), NoteChange.noteId, NoteChange.op,
+                         *Note.columns_for())
+        .outerjoin(Note, db.and_(Note.id == NoteChange.noteId, Note.userId == NoteChange.userId))
+        .filter(NoteChange.userId == user_id, NoteChange.id > since)
+        .order_by(NoteChange.id)
+        .limit(limit + 1)
+        .all()
+    )
+    return rows[:limit], len(rows) > limit
+
+
+def backfill_changes():
+    """Registra como 'upsert' las notas creadas antes de existir la bitácora"""
+    missing = db.select(Note.userId, Note.id, db.literal(OP_UPSERT), db.literal(datetime.utcnow())).where(
+        ~db.exists().where(NoteChange.userId == Note.userId, NoteChange.noteId == Note.id)
+    )
+    result = db.session.execute(
+        db.insert(NoteChange).from_select(['userId', 'noteId', 'op', 'changedAt'], missing)
+    )
+    db.session.commit()
+    return result.rowcount
@@ -0,0 +1,152 @@
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import text
+
+from idempotency import idempotency
+from images import images
+from jobs import jobs, DONE, FAILED
+from logging_config import get_logger
+from mailer import mailer
+from models import db, User, Job, Note, TokenRevocation, IMAGE_URL_PREFIX, image_url
+from search import rebuild_search_index
+from sharding import shards
+from summaries import recompute_summaries
+
+logger = get_logger('tasks')
+
+# ============================================
+# TAREAS EN SEGUNDO PLANO
+# ============================================
+#
+# Se registran al importar este módulo; las periódicas se programan en
+# JOBS_SCHEDULE. Cada tarea recibe el payload del trabajo como argumentos y
+# debe poder repetirse sin efectos dobles: se reintenta si lanza una excepción.
+
+
+@jobs.task('send_reset_email', max_attempts=8)
+def send_reset_email(user_id):
+    """Correo con el código de recuperación de contraseña
+
+    El payload solo lleva el id del usuario: el código se lee de la base al
+    enviar, así no queda en texto plano en la tabla jobs. Si ya se usó o venció
+    no se manda nada.
+    """
+    user = db.session.get(User, user_id)
+    if user is None or not user.verify_reset_token(user.reset_token):
+        logger.info('Correo de recuperación omitido: el código ya no es válido (usuario %s)', user_id)
+        return
+    mailer.send(
+        user.email,
+        'Código de recuperación de contraseña',
+        f'Hola {user.name},\n\n'
+        f'Tu código para restablecer la contraseña es: {user.reset_token}\n\n'
+        'El código vence en 1 hora. Si no lo solicitaste, ignora este mensaje.\n'
+    )
+
+
+@jobs.task('expire_reset_tokens')
+def expire_reset_tokens():
+    """Borra de una vez los códigos de recuperación vencidos"""
+    result = db.session.execute(
+        db.update(User)
+        .where(User.reset_token_expiry < datetime.utcnow())
+        .values(reset_token=None, reset_token_expiry=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.info('Códigos de recuperación vencidos eliminados: %s', result.rowcount)
+
+
+@jobs.task('purge_jobs')
+def purge_jobs():
+    """Elimina los trabajos terminados más antiguos que JOBS_RETENTION_DAYS"""
+    limit = datetime.utcnow() - timedelta(days=current_app.config.get('JOBS_RETENTION_DAYS', 7))
+    result = db.session.execute(
+        db.delete(Job)
+        .where(Job.status.in_((DONE, FAILED)), Job.finishedAt < limit)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.info('Trabajos antiguos eliminados: %s', result.rowcount)
+
+
+@jobs.task('purge_revocations')
+def purge_revocations():
+    """Elimina las revocaciones de tokens que ya vencieron de todos modos"""
+    result = db.session.execute(
+        db.delete(TokenRevocation)
+        .where(TokenRevocation.expiresAt < datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    if result.rowcount:
+        logger.info('Revocaciones vencidas eliminadas: %s', result.rowcount)
+
+
+@jobs.task('purge_idempotency_keys')
+def purge_idempotency_keys():
+    """Elimina las respuestas guardadas de Idempotency-Key que ya vencieron"""
+    removed = idempotency.purge()
+    if removed:
+        logger.info('Llaves de idempotencia vencidas eliminadas: %s', removed)
+
+
+@jobs.task('purge_images', max_attempts=2)
+def purge_images():
+    """Borra las imágenes subidas (y sus miniaturas) que ya no usa ninguna nota
+
+    Solo las que no cambian desde hace IMAGE_PURGE_GRACE_SECONDS: el archivo se
+    guarda antes de que la nota lo referencie.
+    """
+    referenced = set()
+    for key in shards.note_binds():
+        with db.engines[key].connect() as connection:
+            referenced.update(connection.execute(
+                db.select(Note.imageUrl).where(Note.imageUrl.startswith(IMAGE_URL_PREFIX)).distinct()
+            ).scalars())
+    limit = time.time() - current_app.config.get('IMAGE_PURGE_GRACE_SECONDS', 3600)
+    removed = 0
+    for name, modified in list(images.stored_images()):
+        if modified < limit and image_url(name) not in referenced:
+            images.remove(name)
+            removed += 1
+    if removed:
+        logger.info('Imágenes sin uso eliminadas: %s', removed)
+
+
+@jobs.task('recompute_note_summaries', max_attempts=2)
+def recompute_note_summaries():
+    """Recalcula en bloque los totales de GET /api/notes/summary y corrige desviaciones"""
+    fixed = sum(recompute_summaries(db.engines[key]) for key in shards.note_binds())
+    if fixed:
+        logger.warning('Totales de notas corregidos: %s usuarios', fixed)
+
+
+@jobs.task('analyze', max_attempts=2)
+def analyze():
+    """Actualiza las estadísticas que usa el planificador de consultas"""
+    for key in shards.note_binds():
+        with db.engines[key].begin() as connection:
+            connection.execute(text('ANALYZE'))
+    logger.info('ANALYZE completado')
+
+
+@jobs.task('vacuum', max_attempts=2)
+def vacuum():
+    """Compacta cada base de datos y reconstruye su índice de búsqueda
+
+    VACUUM no puede correr dentro de una transacción, y en SQLite puede
+    renumerar los rowid de notes de los que depende notes_fts.
+    """
+    started = datetime.utcnow()
+    for key in shards.note_binds():
+        engine = db.engines[key]
+        with engine.connect() as connection:
+            connection = connection.execution_options(isolation_level='AUTOCOMMIT')
+            connection.execute(text('VACUUM'))
+        rebuild_search_index(engine)
+    logger.info('VACUUM completado en %.1f s', (datetime.utcnow() - started).total_seconds())
@@ -0,0 +1,54 @@
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.environ.setdefault('LOG_LEVEL', 'WARNING')
+os.environ.setdefault('LOG_FORMAT', 'text')
+os.environ.setdefault('LOG_ASYNC', 'False')
+# Aplicación por defecto (la que crean asgi.py y get_app()) sin tocar archivos
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+os.environ.setdefault('JOBS_RUN_IN_PROCESS', 'False')
+
+
+@pytest.fixture
+def make_app(tmp_path):
+    """Crea una aplicación con bases SQLite nuevas en `tmp_path` y el esquema al día"""
+    from app import create_app, init_db
+
+    def factory(**overrides):
+        config = dict(
+            TESTING=True,
+            SQLALCHEMY_DATABASE_URI='sqlite:///' + str(tmp_path / 'central.db'),
+            RATELIMIT_ENABLED=False,
+            PASSWORD_HASH_EXECUTOR='inline',
+            MAIL_BACKEND='memory',
+            JOBS_RUN_IN_PROCESS=False,
+            IMAGE_STORAGE_DIR=str(tmp_path / 'images'),
+        )
+        config.update(overrides)
+        app = create_app(**config)
+        init_db(app)
+        return app
+
+    return factory
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register(client, email, password='secreta123'):
+    """Registra un usuario y regresa los encabezados con su token"""
+    response = client.post('/api/auth/register',
+                           json={'name': 'Usuario', 'email': email, 'password': password})
+    assert response.status_code == 201, response.get_json()
+    return {'Authorization': 'Bearer ' + response.get_json()['token']}
@@ -0,0 +1,73 @@
+import asyncio
+
+
+def echo_length(environ, start_response):
+    body = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return [str(len(body)).encode()]
+
+
+def call(adapter, chunks, headers=()):
+    """Corre una petición POST por el adaptador; regresa (status, cuerpo, fragmentos leídos)"""
+    scope = {'type': 'http', 'method': 'POST', 'path': '/', 'query_string': b'',
+             'http_version': '1.1', 'headers': list(headers)}
+    pending = [{'type': 'http.request', 'body': chunk, 'more_body': i < len(chunks) - 1}
+               for i, chunk in enumerate(chunks)]
+    read = []
+    sent = []
+
+    async def receive():
+        if pending:
+            read.append(pending[0])
+            return pending.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(adapter(scope, receive, send))
+    body = b''.join(message.get('body', b'') for message in sent[1:])
+    return sent[0]['status'], body, len(read)
+
+
+def test_body_within_limit_reaches_app():
+    from asgi import WSGIAdapter
+
+    adapter = WSGIAdapter(echo_length, threads=1, max_body_size=10)
+    assert call(adapter, [b'12345', b'67890']) == (200, b'10', 2)
+
+
+def test_chunked_body_reaches_flask():
+    from flask import Flask, request
+
+    from asgi import WSGIAdapter
+
+    app = Flask(__name__)
+
+    @app.post('/')
+    def echo():
+        return str(len(request.get_data()))
+
+    adapter = WSGIAdapter(app, threads=1, max_body_size=10)
+    # Mismo cuerpo con Content-Length y chunked (sin Content-Length)
+    assert call(adapter, [b'123456'], headers=[(b'content-length', b'6')])[:2] == (200, b'6')
+    assert call(adapter, [b'123', b'456'])[:2] == (200, b'6')
+
+
+def test_declared_length_over_limit_is_rejected_before_reading():
+    from asgi import WSGIAdapter
+
+    adapter = WSGIAdapter(echo_length, threads=1, max_body_size=10)
+    status, body, read = call(adapter, [b'x' * 11], headers=[(b'content-length', b'11')])
+    assert status == 413
+    assert b'error' in body
+    assert read == 0
+
+
+def test_chunked_body_stops_at_limit():
+    from asgi import WSGIAdapter
+
+    adapter = WSGIAdapter(echo_length, threads=1, max_body_size=10)
+    status, _, read = call(adapter, [b'x' * 6, b'x' * 6, b'x' * 6])
+    assert status == 413
+    assert read == 2
@@ -0,0 +1,51 @@
+from conftest import register
+
+
+def titles(client, headers):
+    return sorted(note['title'] for note in client.get('/api/notes', headers=headers).get_json())
+
+
+def test_batch_applies_valid_operations_and_reports_each(client):
+    headers = register(client, 'ana@example.com')
+    kept = client.post('/api/notes', headers=headers, json={'title': 'Uno', 'content': 'x'}).get_json()['id']
+    removed = client.post('/api/notes', headers=headers, json={'title': 'Dos', 'content': 'x'}).get_json()['id']
+
+    response = client.post('/api/notes/batch', headers=headers, json={'operations': [
+        {'op': 'create', 'title': 'Tres', 'content': 'x'},
+        {'op': 'update', 'id': kept, 'title': 'Uno editada', 'content': 'y'},
+        {'op': 'delete', 'id': removed},
+        {'op': 'update', 'id': 'no-existe', 'title': 'X', 'content': 'x'},
+    ]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['applied'] is True
+    assert [r['status'] for r in body['results']] == [201, 200, 200, 404]
+    assert body['results'][1]['note']['content'] == 'y'
+    assert titles(client, headers) == ['Tres', 'Uno editada']
+
+
+def test_atomic_batch_applies_nothing_on_error(client):
+    headers = register(client, 'ana@example.com')
+    response = client.post('/api/notes/batch', headers=headers, json={'atomic': True, 'operations': [
+        {'op': 'create', 'title': 'Uno', 'content': 'x'},
+        {'op': 'create', 'title': '', 'content': 'x'},
+    ]})
+    assert response.status_code == 400
+    body = response.get_json()
+    assert body['applied'] is False
+    assert body['results'][1]['status'] == 400
+    assert titles(client, headers) == []
+
+
+def test_batch_cannot_touch_another_users_notes(client):
+    ana = register(client, 'ana@example.com')
+    beto = register(client, 'beto@example.com')
+    note_id = client.post('/api/notes', headers=ana, json={'title': 'Uno', 'content': 'x'}).get_json()['id']
+
+    response = client.post('/api/notes/batch', headers=beto, json={'operations': [
+        {'op': 'create', 'id': note_id, 'title': 'Mía', 'content': 'x'},
+        {'op': 'delete', 'id': note_id},
+    ]})
+    assert [r['status'] for r in response.get_json()['results']] == [409, 404]
+    assert titles(client, ana) == ['Uno']
+    assert titles(client, beto) == []
@@ -0,0 +1,31 @@
+import json
+
+from conftest import register
+
+
+def test_cached_user_has_no_secrets(app, client):
+    from cache import cache, user_id_key, get_user_by_id
+
+    register(client, 'ana@example.com')
+    client.post('/api/auth/forgot-password', json={'email': 'ana@example.com'})
+
+    with app.app_context():
+        user = get_user_by_id(1)
+        snapshot = cache.get(user_id_key(1))
+        assert set(snapshot) == {'id', 'name', 'email', 'device_id'}
+        # Lo que guarda la caché compartida debe poder ir como JSON
+        assert json.loads(json.dumps(snapshot)) == snapshot
+        assert user.password is None and user.reset_token is None
+
+
+def test_login_reads_hash_from_database(app, client):
+    from cache import get_user_by_id
+
+    register(client, 'beto@example.com')
+    with app.app_context():
+        get_user_by_id(1)  # deja la copia en caché
+
+    ok = client.post('/api/auth/login', json={'email': 'beto@example.com', 'password': 'secreta123'})
+    assert ok.status_code == 200
+    wrong = client.post('/api/auth/login', json={'email': 'beto@example.com', 'password': 'otra-clave'})
+    assert wrong.status_code == 401
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+from conftest import register
+
+
+def post_note(client, headers, key, title='Nota'):
+    return client.post('/api/notes', headers={**headers, 'Idempotency-Key': key},
+                       json={'title': title, 'content': 'x'})
+
+
+def test_retry_replays_the_first_response(app, client):
+    from idempotency import idempotency
+
+    headers = register(client, 'ana@example.com')
+    first = post_note(client, headers, 'crear-1')
+    assert first.status_code == 201
+    assert 'Idempotent-Replayed' not in first.headers
+
+    replayed = post_note(client, headers, 'crear-1')
+    assert replayed.status_code == 201
+    assert replayed.headers['Idempotent-Replayed'] == 'true'
+    assert replayed.get_json() == first.get_json()
+
+    # Sin la copia en memoria (otro worker) la respuesta sale de la base
+    idempotency.memory.clear()
+    from_database = post_note(client, headers, 'crear-1')
+    assert from_database.headers['Idempotent-Replayed'] == 'true'
+    assert from_database.get_json()['id'] == first.get_json()['id']
+
+    assert len(client.get('/api/notes', headers=headers).get_json()) == 1
+
+
+def test_key_reused_with_another_request_is_rejected(client):
+    headers = register(client, 'ana@example.com')
+    assert post_note(client, headers, 'crear-1').status_code == 201
+    response = post_note(client, headers, 'crear-1', title='Otra')
+    assert response.status_code == 422
+    assert len(client.get('/api/notes', headers=headers).get_json()) == 1
+
+
+def test_keys_are_per_user(client):
+    ana = register(client, 'ana@example.com')
+    beto = register(client, 'beto@example.com')
+    assert post_note(client, ana, 'crear-1').status_code == 201
+    response = post_note(client, beto, 'crear-1')
+    assert response.status_code == 201
+    assert 'Idempotent-Replayed' not in response.headers
+
+
+def test_request_in_progress_answers_409_until_the_claim_expires(make_app):
+    from idempotency import _fingerprint
+    from models import db, IdempotencyKey
+
+    app = make_app(IDEMPOTENCY_LOCK_SECONDS=60)
+    client = app.test_client()
+    headers = register(client, 'ana@example.com')
+
+    # Reclamo de la misma petición, hecho por otro worker que sigue en curso
+    with app.test_request_context('/api/notes', method='POST', json={'title': 'Nota', 'content': 'x'}):
+        now = datetime.utcnow()
+        claim = IdempotencyKey(userId=1, key='crear-1', fingerprint=_fingerprint(), createdAt=now,
+                               expiresAt=now + timedelta(days=1))
+        db.session.add(claim)
+        db.session.commit()
+    assert post_note(client, headers, 'crear-1').status_code == 409
+
+    # El proceso que lo reclamó murió: pasado IDEMPOTENCY_LOCK_SECONDS se ejecuta
+    with app.app_context():
+        db.session.execute(db.update(IdempotencyKey).values(createdAt=now - timedelta(minutes=5)))
+        db.session.commit()
+    assert post_note(client, headers, 'crear-1').status_code == 201
+    assert post_note(client, headers, 'crear-1').headers['Idempotent-Replayed'] == 'true'
@@ -0,0 +1,53 @@
+import os
+
+from conftest import register
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+def upload(client, headers, data=PNG):
+    note_id = client.post('/api/notes', headers=headers, json={'title': 'Foto', 'content': 'x'}).get_json()['id']
+    response = client.put(f'/api/notes/{note_id}/image', headers=headers, data=data)
+    assert response.status_code == 200, response.get_json()
+    return note_id, response.get_json()['imageUrl'].rsplit('/', 1)[1]
+
+
+def purge(app):
+    from jobs import jobs
+
+    with app.app_context():
+        jobs.enqueue('purge_images')
+        assert jobs.run_pending() == 1
+
+
+def test_purge_images_removes_only_unused_files(make_app):
+    from images import images
+
+    app = make_app(IMAGE_PURGE_GRACE_SECONDS=0)
+    client = app.test_client()
+    ana = register(client, 'ana@example.com')
+    beto = register(client, 'beto@example.com')
+
+    removed_id, removed = upload(client, ana, PNG + b'1')
+    shared_id, shared = upload(client, ana, PNG + b'2')
+    upload(client, beto, PNG + b'2')
+    assert client.delete(f'/api/notes/{removed_id}/image', headers=ana).status_code == 200
+    assert client.delete(f'/api/notes/{shared_id}/image', headers=ana).status_code == 200
+
+    purge(app)
+    assert not os.path.exists(images.path(removed))
+    # Otra nota (de otro usuario) todavía usa esta imagen
+    assert os.path.exists(images.path(shared))
+
+
+def test_purge_images_keeps_recent_files(make_app):
+    from images import images
+
+    app = make_app(IMAGE_PURGE_GRACE_SECONDS=3600)
+    client = app.test_client()
+    ana = register(client, 'ana@example.com')
+    note_id, name = upload(client, ana)
+    client.delete(f'/api/notes/{note_id}/image', headers=ana)
+
+    purge(app)
+    assert os.path.exists(images.path(name))
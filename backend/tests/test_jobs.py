@@ -0,0 +1,18 @@
+import os
+import signal
+import threading
+
+
+def test_run_forever_stops_on_sigterm(app):
+    from jobs import jobs
+
+    previous = signal.getsignal(signal.SIGTERM)
+    timer = threading.Timer(0.3, os.kill, (os.getpid(), signal.SIGTERM))
+    timer.start()
+    try:
+        jobs.run_forever()  # regresa en lugar de matar el proceso
+    finally:
+        timer.cancel()
+    with app.app_context():
+        assert jobs.stats()['workers'] == 0
+    assert signal.getsignal(signal.SIGTERM) == previous
@@ -0,0 +1,45 @@
+def test_metrics_local_only_without_token(app):
+    client = app.test_client()
+    assert client.get('/api/metrics').status_code == 200
+    remote = client.get('/api/metrics', environ_base={'REMOTE_ADDR': '203.0.113.5'})
+    assert remote.status_code == 403
+
+
+def test_metrics_token(make_app):
+    client = make_app(METRICS_TOKEN='s3creto').test_client()
+    assert client.get('/api/metrics').status_code == 401
+    ok = client.get('/api/metrics', headers={'Authorization': 'Bearer s3creto'},
+                    environ_base={'REMOTE_ADDR': '203.0.113.5'})
+    assert ok.status_code == 200
+    assert b'# TYPE' in ok.data
+
+
+def test_failed_statements_do_not_skew_query_timings(app):
+    import time
+
+    from sqlalchemy import exc, text
+
+    from metrics import metrics
+    from models import db
+
+    def recorded():
+        counts, total = metrics.sql_latency._series.get(('sin_peticion',), [[0], 0.0])
+        return sum(counts), total
+
+    with app.app_context():
+        with db.engine.connect() as connection:
+            for _ in range(3):
+                try:
+                    connection.execute(text('SELECT * FROM tabla_que_no_existe'))
+                except exc.OperationalError:
+                    pass
+            time.sleep(0.05)
+            count, total = recorded()
+            started = time.perf_counter()
+            assert connection.execute(text('SELECT 1')).scalar() == 1
+            elapsed = time.perf_counter() - started
+
+    # Solo se registra la consulta que terminó, con su propia duración
+    new_count, new_total = recorded()
+    assert new_count == count + 1
+    assert 0 <= new_total - total <= elapsed
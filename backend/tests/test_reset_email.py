@@ -0,0 +1,48 @@
+import json
+
+from conftest import register
+
+
+def test_forgot_password_sends_email_from_job(app, client):
+    from jobs import jobs
+    from mailer import mailer
+    from models import db, Job, User
+
+    register(client, 'ana@example.com')
+    response = client.post('/api/auth/forgot-password', json={'email': 'ana@example.com'})
+    assert response.status_code == 200
+
+    with app.app_context():
+        job = db.session.execute(db.select(Job).where(Job.name == 'send_reset_email')).scalar_one()
+        # El código no se guarda en la cola, solo el usuario
+        token = db.session.execute(db.select(User.reset_token)).scalar_one()
+        assert token not in job.payload
+        assert json.loads(job.payload) == {'user_id': 1}
+
+        assert mailer.outbox == []
+        assert jobs.run_pending() >= 1
+
+    assert len(mailer.outbox) == 1
+    message = mailer.outbox[0]
+    assert message['To'] == 'ana@example.com'
+    assert token in message.get_content()
+
+    verified = client.post('/api/auth/verify-reset-token', json={'email': 'ana@example.com', 'token': token})
+    assert verified.status_code == 200
+
+
+def test_reset_email_skipped_when_token_already_used(app, client):
+    from jobs import jobs
+    from mailer import mailer
+    from models import db, User
+
+    register(client, 'beto@example.com')
+    client.post('/api/auth/forgot-password', json={'email': 'beto@example.com'})
+
+    with app.app_context():
+        user = db.session.execute(db.select(User)).scalar_one()
+        user.clear_reset_token()
+        db.session.commit()
+        jobs.run_pending()
+
+    assert mailer.outbox == []
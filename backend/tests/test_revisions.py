@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+from conftest import register
+
+
+def create(client, headers, content='uno'):
+    return client.post('/api/notes', headers=headers, json={'title': 'Nota', 'content': content}).get_json()
+
+
+def updated_at(client, headers, note_id):
+    value = client.get(f'/api/notes/{note_id}', headers=headers).get_json()['updatedAt']
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def test_patch_accepts_base_updated_at_with_offset(client):
+    headers = register(client, 'ana@example.com')
+    note_id = create(client, headers)['id']
+    stale = updated_at(client, headers, note_id).isoformat()
+
+    # La misma hora escrita en UTC (+00:00) y en otra zona horaria
+    for zone in (timezone.utc, timezone(timedelta(hours=-5))):
+        base = updated_at(client, headers, note_id).astimezone(zone).isoformat()
+        response = client.patch(f'/api/notes/{note_id}', headers=headers,
+                                json={'baseUpdatedAt': base, 'content': f'cambio {zone}'})
+        assert response.status_code == 200, response.get_json()
+
+    conflict = client.patch(f'/api/notes/{note_id}', headers=headers,
+                            json={'baseUpdatedAt': stale, 'content': 'vieja'})
+    assert conflict.status_code == 409
+
+
+def test_patch_delta_and_restore_after_trimming(make_app):
+    app = make_app(NOTE_HISTORY_MAX_REVISIONS=3)
+    client = app.test_client()
+    headers = register(client, 'ana@example.com')
+    note_id = create(client, headers, 'v1')['id']
+
+    for revision in range(1, 6):
+        # Reemplaza el número de versión ("v1" -> "v2", ...) con un delta
+        response = client.patch(f'/api/notes/{note_id}', headers=headers, json={
+            'baseRevision': revision, 'delta': [{'offset': 1, 'delete': 1, 'insert': str(revision + 1)}]})
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['content'] == f'v{revision + 1}'
+
+    listed = client.get(f'/api/notes/{note_id}/revisions', headers=headers).get_json()
+    assert listed['revision'] == 6
+    assert [row['revision'] for row in listed['revisions']] == [5, 4, 3]
+
+    for revision in (3, 4, 5, 6):
+        restored = client.get(f'/api/notes/{note_id}/revisions/{revision}', headers=headers)
+        assert restored.status_code == 200
+        assert restored.get_json()['content'] == f'v{revision}'
+    # Las revisiones recortadas ya no se pueden reconstruir
+    assert client.get(f'/api/notes/{note_id}/revisions/2', headers=headers).status_code == 404
+
+
+def test_revisions_are_scoped_to_the_owner(app, client):
+    from models import db, NoteRevision
+
+    headers = register(client, 'ana@example.com')
+    note_id = create(client, headers, 'v1')['id']
+    client.patch(f'/api/notes/{note_id}', headers=headers,
+                 json={'baseRevision': 1, 'content': 'v2'})
+
+    # Historial de otro usuario con el mismo id de nota (p. ej. tras una lápida)
+    with app.app_context():
+        db.session.add(NoteRevision(noteId=note_id, userId=999, revision=1, delta=b'x',
+                                    createdAt=datetime.utcnow()))
+        db.session.commit()
+
+    listed = client.get(f'/api/notes/{note_id}/revisions', headers=headers).get_json()
+    assert [row['revision'] for row in listed['revisions']] == [1]
+    restored = client.get(f'/api/notes/{note_id}/revisions/1', headers=headers)
+    assert restored.get_json()['content'] == 'v1'
@@ -0,0 +1,55 @@
+import time
+from datetime import datetime, timedelta
+
+from conftest import register
+
+REVOKED_AT = 1_700_000_000
+
+
+def test_revoke_user_cutoff_is_exact(app, monkeypatch):
+    from models import db
+    from revocation import revocations
+
+    with app.app_context():
+        monkeypatch.setattr(time, 'time', lambda: REVOKED_AT + 0.9)
+        revocations.revoke_user(7, datetime.utcnow() + timedelta(days=1))
+        monkeypatch.undo()
+        db.session.commit()
+
+        for _ in range(2):
+            # iat va en segundos enteros: el token de ese mismo segundo sigue valiendo
+            assert revocations.is_revoked({'sub': '7', 'iat': REVOKED_AT - 1, 'jti': 'viejo'})
+            assert not revocations.is_revoked({'sub': '7', 'iat': REVOKED_AT, 'jti': 'nuevo'})
+            assert not revocations.is_revoked({'sub': '8', 'iat': REVOKED_AT - 1, 'jti': 'otro'})
+            # Otro proceso lo lee de la base
+            revocations.refresh(force=True)
+
+
+def test_refresh_token_rotation(client):
+    response = client.post('/api/auth/register',
+                           json={'name': 'Usuario', 'email': 'ana@example.com', 'password': 'secreta123'})
+    refresh_token = response.get_json()['refreshToken']
+
+    rotated = client.post('/api/auth/refresh', headers={'Authorization': 'Bearer ' + refresh_token})
+    assert rotated.status_code == 200
+    tokens = rotated.get_json()
+    assert tokens['refreshToken'] != refresh_token
+    assert client.get('/api/notes', headers={'Authorization': 'Bearer ' + tokens['token']}).status_code == 200
+
+    # El refresh token ya usado no sirve una segunda vez; el nuevo sí
+    reused = client.post('/api/auth/refresh', headers={'Authorization': 'Bearer ' + refresh_token})
+    assert reused.status_code == 401
+    again = client.post('/api/auth/refresh', headers={'Authorization': 'Bearer ' + tokens['refreshToken']})
+    assert again.status_code == 200
+
+
+def test_unlink_device_revokes_earlier_tokens(client, monkeypatch):
+    headers = register(client, 'ana@example.com')
+    # La revocación ocurre un segundo después de emitir el token
+    later = time.time() + 1
+    monkeypatch.setattr(time, 'time', lambda: later)
+    unlinked = client.post('/api/auth/unlink-device',
+                           json={'email': 'ana@example.com', 'password': 'secreta123'})
+    monkeypatch.undo()
+    assert unlinked.status_code == 200
+    assert client.get('/api/notes', headers=headers).status_code == 401
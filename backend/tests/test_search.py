@@ -0,0 +1,14 @@
+from conftest import register
+
+
+def test_like_fallback_treats_underscore_literally(client, monkeypatch):
+    import search
+
+    headers = register(client, 'ana@example.com')
+    for title in ('foo_bar', 'fooXbar'):
+        client.post('/api/notes', headers=headers, json={'title': title, 'content': 'texto'})
+
+    # Motor sin FTS5: búsqueda por LIKE
+    monkeypatch.setattr(search, '_fts_enabled', False)
+    response = client.get('/api/notes/search', query_string={'q': 'o_b'}, headers=headers)
+    assert [note['title'] for note in response.get_json()['results']] == ['foo_bar']
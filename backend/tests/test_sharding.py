@@ -0,0 +1,109 @@
+import pytest
+
+
+@pytest.fixture
+def sharded(make_app, tmp_path):
+    """Aplicación con 3 bases para notas, de las que se usan las 2 primeras"""
+    urls = ['sqlite:///' + str(tmp_path / f'notes_{index}.db') for index in range(3)]
+    return make_app(SHARD_URLS=urls, SHARD_COUNT=2, SHARD_DIRECTORY_REFRESH_SECONDS=0)
+
+
+def register_users(client, count):
+    """(user_id, encabezados) de `count` usuarios nuevos"""
+    users = []
+    for index in range(count):
+        data = client.post('/api/auth/register', json={
+            'name': 'Usuario', 'email': f'u{index}@example.com', 'password': 'secreta123'}).get_json()
+        users.append((int(data['user']['id']), {'Authorization': 'Bearer ' + data['token']}))
+    return users
+
+
+def create(client, headers, note_id=None):
+    body = {'title': 'Nota', 'content': 'Contenido'}
+    if note_id:
+        body['id'] = note_id
+    return client.post('/api/notes', headers=headers, json=body)
+
+
+def test_proposed_id_from_another_shard_is_rejected(sharded):
+    from sharding import shards
+
+    client = sharded.test_client()
+    users = register_users(client, 6)
+    with sharded.app_context():
+        homes = {user_id: shards.shard_for(user_id) for user_id, _ in users}
+    (first, first_headers), (second, second_headers) = next(
+        (a, b) for a in users for b in users if homes[a[0]] != homes[b[0]])
+
+    note_id = create(client, first_headers).get_json()['id']
+    assert create(client, second_headers, note_id).status_code == 409
+    batch = client.post('/api/notes/batch', headers=second_headers,
+                        json={'operations': [{'op': 'create', 'id': note_id, 'title': 'a', 'content': 'b'}]})
+    assert batch.get_json()['results'][0]['status'] == 409
+
+
+def test_rebalance_moves_notes_and_keeps_colliding_user(sharded):
+    from models import db, Note
+    from sharding import shards, rebalance, rendezvous
+
+    client = sharded.test_client()
+    users = register_users(client, 12)
+    notes = {user_id: create(client, headers).get_json()['id'] for user_id, headers in users}
+    with sharded.app_context():
+        movers = [user_id for user_id, _ in users
+                  if shards.shard_for(user_id) != rendezvous(user_id, 3)]
+        assert len(movers) >= 2
+        stuck, target = movers[0], rendezvous(movers[0], 3)
+        # Otro usuario ya tiene en el destino una nota con el mismo id
+        with db.engines[target].begin() as connection:
+            connection.execute(db.insert(Note.__table__).values(
+                id=notes[stuck], title='x', content='y', userId=999, revision=1))
+
+        assert rebalance(3, batch_size=5, wait=0) == len(movers) - 1
+        assert shards.shard_for(stuck) != target
+        assert shards.shard_for(movers[1]) == rendezvous(movers[1], 3)
+
+    for user_id, headers in users:
+        listed = client.get('/api/notes', headers=headers).get_json()
+        assert [note['id'] for note in listed] == [notes[user_id]]
+
+
+def test_tombstone_id_from_another_shard_is_rejected(sharded):
+    from sharding import shards
+
+    client = sharded.test_client()
+    users = register_users(client, 6)
+    with sharded.app_context():
+        homes = {user_id: shards.shard_for(user_id) for user_id, _ in users}
+    (_, first_headers), (_, second_headers) = next(
+        (a, b) for a in users for b in users if homes[a[0]] != homes[b[0]])
+
+    note_id = create(client, first_headers).get_json()['id']
+    assert client.delete(f'/api/notes/{note_id}', headers=first_headers).status_code == 200
+    assert create(client, second_headers, note_id).status_code == 409
+
+
+def test_rebalance_with_foreign_tombstone_in_target(sharded):
+    from datetime import datetime
+
+    from models import db, NoteChange
+    from sharding import shards, rebalance, rendezvous
+
+    client = sharded.test_client()
+    users = register_users(client, 12)
+    notes = {user_id: create(client, headers).get_json()['id'] for user_id, headers in users}
+    with sharded.app_context():
+        movers = [user_id for user_id, _ in users
+                  if shards.shard_for(user_id) != rendezvous(user_id, 3)]
+        target = rendezvous(movers[0], 3)
+        # Otro usuario borró en el destino una nota con el mismo id
+        with db.engines[target].begin() as connection:
+            connection.execute(db.insert(NoteChange.__table__).values(
+                userId=999, noteId=notes[movers[0]], op='delete', changedAt=datetime.utcnow()))
+
+        assert rebalance(3, batch_size=5, wait=0) == len(movers)
+        assert all(not shards.is_moving(user_id) for user_id, _ in users)
+
+    for user_id, headers in users:
+        changes = client.get('/api/notes/changes', headers=headers).get_json()
+        assert [note['id'] for note in changes['notes']] == [notes[user_id]]
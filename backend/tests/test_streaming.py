@@ -0,0 +1,57 @@
+import json
+
+from conftest import register
+
+
+def events(chunk):
+    """(evento, datos) de los eventos SSE de un fragmento"""
+    parsed = []
+    for block in chunk.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if 'event' in fields:
+            parsed.append((fields['event'], json.loads(fields['data'])))
+    return parsed
+
+
+def open_stream(client, headers):
+    response = client.get('/api/notes/stream', headers=headers, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    return response, iter(response.response)
+
+
+def test_stream_sends_changes_as_they_happen(make_app):
+    app = make_app(SSE_HEARTBEAT_SECONDS=1, SSE_MAX_SECONDS=5)
+    client = app.test_client()
+    headers = register(client, 'ana@example.com')
+    response, chunks = open_stream(client, headers)
+    try:
+        assert [name for name, _ in events(next(chunks))] == ['ready']
+
+        note_id = client.post('/api/notes', headers=headers, json={'title': 'Uno', 'content': 'x'}).get_json()['id']
+        ((name, note),) = events(next(chunks))
+        assert (name, note['id'], note['title']) == ('upsert', note_id, 'Uno')
+
+        client.delete(f'/api/notes/{note_id}', headers=headers)
+        assert events(next(chunks)) == [('delete', {'id': note_id})]
+    finally:
+        response.close()
+
+
+def test_stream_resumes_from_last_event_id(make_app):
+    app = make_app(SSE_HEARTBEAT_SECONDS=1, SSE_MAX_SECONDS=1)
+    client = app.test_client()
+    ana = register(client, 'ana@example.com')
+    beto = register(client, 'beto@example.com')
+    token = client.get('/api/notes/changes', headers=ana).get_json()['syncToken']
+
+    note_id = client.post('/api/notes', headers=ana, json={'title': 'Uno', 'content': 'x'}).get_json()['id']
+    client.post('/api/notes', headers=beto, json={'title': 'Ajena', 'content': 'x'})
+
+    response, chunks = open_stream(client, {**ana, 'Last-Event-ID': token})
+    try:
+        received = events(next(chunks))
+    finally:
+        response.close()
+    # Lo ocurrido mientras estaba desconectado, solo de sus notas, y luego ready
+    assert [(name, data.get('id')) for name, data in received] == [('upsert', note_id), ('ready', None)]
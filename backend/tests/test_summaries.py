@@ -0,0 +1,59 @@
+from conftest import register
+
+
+def summary(client, headers, etag=None):
+    if etag is not None:
+        headers = {**headers, 'If-None-Match': etag}
+    response = client.get('/api/notes/summary', headers=headers)
+    assert response.status_code in (200, 304)
+    return response
+
+
+def totals(client, headers):
+    body = summary(client, headers).get_json()
+    return body['count'], body['contentBytes'], body['withImages']
+
+
+def test_summary_follows_every_write(client):
+    headers = register(client, 'ana@example.com')
+    assert totals(client, headers) == (0, 0, 0)
+
+    first = client.post('/api/notes', headers=headers, json={'title': 'Uno', 'content': 'año'}).get_json()
+    second = client.post('/api/notes', headers=headers, json={
+        'title': 'Dos', 'content': 'abc', 'imageUrl': 'https://example.com/foto.png'}).get_json()
+    assert totals(client, headers) == (2, 7, 1)
+
+    client.patch(f"/api/notes/{second['id']}", headers=headers, json={'content': 'abcdef', 'imageUrl': None})
+    assert totals(client, headers) == (2, 10, 0)
+
+    client.delete(f"/api/notes/{first['id']}", headers=headers)
+    body = summary(client, headers).get_json()
+    assert (body['count'], body['contentBytes']) == (1, 6)
+    assert [note['id'] for note in body['recent']] == [second['id']]
+
+
+def test_summary_etag_changes_with_the_totals(client):
+    headers = register(client, 'ana@example.com')
+    client.post('/api/notes', headers=headers, json={'title': 'Uno', 'content': 'x'})
+    etag = summary(client, headers).headers['ETag']
+
+    assert summary(client, headers, etag).status_code == 304
+    client.post('/api/notes', headers=headers, json={'title': 'Dos', 'content': 'y'})
+    assert summary(client, headers, etag).status_code == 200
+
+
+def test_recompute_fixes_drifted_totals(app, client):
+    from jobs import jobs
+    from models import db, NoteSummary
+
+    headers = register(client, 'ana@example.com')
+    client.post('/api/notes', headers=headers, json={'title': 'Uno', 'content': 'abc'})
+    with app.app_context():
+        db.session.execute(db.update(NoteSummary).values(noteCount=5, contentBytes=0))
+        db.session.commit()
+    assert totals(client, headers) == (5, 0, 0)
+
+    with app.app_context():
+        jobs.enqueue('recompute_note_summaries')
+        assert jobs.run_pending() == 1
+    assert totals(client, headers) == (1, 3, 0)
@@ -0,0 +1,25 @@
+from conftest import register
+
+
+def test_tombstone_survives_same_id_from_another_user(client):
+    ana = register(client, 'ana@example.com')
+    beto = register(client, 'beto@example.com')
+
+    note_id = client.post('/api/notes', headers=ana, json={'title': 'Nota', 'content': 'x'}).get_json()['id']
+    token = client.get('/api/notes/changes', headers=ana).get_json()['syncToken']
+    assert client.delete(f'/api/notes/{note_id}', headers=ana).status_code == 200
+
+    # Otro usuario propone el mismo id (la nota ya no existe) por POST y por lote
+    created = client.post('/api/notes', headers=beto, json={'id': note_id, 'title': 'Otra', 'content': 'y'})
+    assert created.status_code == 201
+    batch = client.post('/api/notes/batch', headers=beto, json={'operations': [
+        {'op': 'update', 'id': note_id, 'title': 'Otra', 'content': 'z'}]})
+    assert batch.get_json()['results'][0]['status'] == 200
+
+    changes = client.get('/api/notes/changes', headers=ana, query_string={'since': token}).get_json()
+    assert changes['deleted'] == [note_id]
+    assert changes['notes'] == []
+
+    mine = client.get('/api/notes/changes', headers=beto).get_json()
+    assert [note['id'] for note in mine['notes']] == [note_id]
+    assert mine['notes'][0]['content'] == 'z'
@@ -0,0 +1,52 @@
+import gzip
+import json
+import zlib
+
+from conftest import register
+
+
+def ndjson(*titles):
+    return b''.join(json.dumps({'title': title, 'content': 'x'}).encode() + b'\n' for title in titles)
+
+
+def titles(client, headers):
+    return sorted(note['title'] for note in client.get('/api/notes', headers=headers).get_json())
+
+
+def test_import_accepts_the_same_encodings_as_the_api(client):
+    headers = register(client, 'ana@example.com')
+    bodies = {
+        'gzip': gzip.compress(ndjson('Uno')),
+        'deflate': zlib.compress(ndjson('Dos', 'Tres')),
+    }
+    for encoding, body in bodies.items():
+        response = client.post('/api/notes/import', headers={**headers, 'Content-Encoding': encoding},
+                               data=body, content_type='application/x-ndjson')
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()['failed'] == 0
+
+    assert titles(client, headers) == ['Dos', 'Tres', 'Uno']
+
+
+def test_import_rejects_unknown_encoding(client):
+    headers = register(client, 'ana@example.com')
+    response = client.post('/api/notes/import', headers={**headers, 'Content-Encoding': 'br'},
+                           data=b'\x0b\x02\x80', content_type='application/x-ndjson')
+    assert response.status_code == 415
+    assert titles(client, headers) == []
+
+
+def test_export_round_trips_through_import(client):
+    ana = register(client, 'ana@example.com')
+    for title in ('Uno', 'Dos'):
+        client.post('/api/notes', headers=ana, json={'title': title, 'content': 'x'})
+    exported = client.get('/api/notes/export', headers=ana, query_string={'compress': 'gzip'})
+    assert exported.status_code == 200
+
+    beto = register(client, 'beto@example.com')
+    response = client.post('/api/notes/import', headers=beto, data=exported.data,
+                           content_type='application/gzip')
+    assert response.status_code == 200
+    # Los ids exportados pertenecen a otra cuenta: se importan con ids nuevos
+    assert titles(client, beto) == ['Dos', 'Uno']
+    assert titles(client, ana) == ['Dos', 'Uno']
@@ -0,0 +1,215 @@
+import gzip
+import io
+import json
+import uuid
+import zlib
+from datetime import datetime
+
+from compression import DEFLATE_WBITS
+from models import db, Note
+from serializers import dumps, note_serializer
+from sharding import notes_owned_elsewhere
+from summaries import SummaryDelta
+from sync import OP_UPSERT, record_changes
+
+# ============================================
+# EXPORTACIÓN NDJSON
+# ============================================
+
+
+def export_ndjson(user_id, chunk_size=1000, compress=False):
+    """Generador con las notas del usuario en NDJSON (una nota por línea)
+
+    El SELECT se recorre por bloques (yield_per), así que la memoria usada no
+    depende del número de notas. Con compress=True se emite un archivo gzip.
+    """
+    query = (db.select(*Note.columns_for())
+             .where(Note.userId == user_id)
+             .order_by(Note.createdAt, Note.id)
+             .execution_options(yield_per=chunk_size))
+    serialize = note_serializer()
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+
+    for rows in db.session.execute(query).partitions():
+        chunk = b''.join(dumps(serialize(row)) + b'\n' for row in rows)
+        if compressor:
+            chunk = compressor.compress(chunk)
+            if not chunk:
+                continue
+        yield chunk
+
+    if compressor:
+        yield compressor.flush()
+
+
+# ============================================
+# IMPORTACIÓN NDJSON
+# ============================================
+
+
+class ImportLineError(ValueError):
+    """Línea del archivo de importación que no se puede procesar"""
+
+
+class _InflateStream(io.RawIOBase):
+    """Lectura en streaming de un cuerpo deflate (zlib), por bloques"""
+
+    def __init__(self, stream, chunk_size=64 * 1024):
+        self._stream = stream
+        self._decompressor = zlib.decompressobj(DEFLATE_WBITS)
+        self._chunk_size = chunk_size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self._decompressor.eof:
+            data = self._decompressor.unconsumed_tail or self._stream.read(self._chunk_size)
+            if not data:
+                raise EOFError('Cuerpo comprimido incompleto')
+            output = self._decompressor.decompress(data, len(buffer))
+            if output:
+                buffer[:len(output)] = output
+                return len(output)
+        return 0
+
+
+IMPORT_ENCODINGS = ('gzip', 'deflate')
+
+
+def open_ndjson(stream, encoding, max_line_bytes):
+    """Itera las líneas (número, bytes) de un cuerpo NDJSON, opcionalmente gzip o deflate"""
+    if encoding == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif encoding == 'deflate':
+        stream = _InflateStream(stream)
+    reader = io.BufferedReader(stream) if not hasattr(stream, 'peek') else stream
+    number = 0
+    while True:
+        line = reader.readline(max_line_bytes + 1)
+        if not line:
+            return
+        number += 1
+        if len(line) > max_line_bytes and not line.endswith(b'\n'):
+            raise ImportLineError(f'Línea {number}: excede {max_line_bytes} bytes')
+        if line.strip():
+            yield number, line
+
+
+def _parse_datetime(value, default):
+    if not value:
+        return default
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed.replace(tzinfo=None) if parsed.tzinfo else parsed
+
+
+def parse_note_line(line, now):
+    """Convierte una línea NDJSON en las columnas de una nota (sin userId)"""
+    try:
+        data = json.loads(line)
+    except ValueError:
+        raise ImportLineError('JSON inválido')
+    if not isinstance(data, dict):
+        raise ImportLineError('Se esperaba un objeto JSON')
+
+    title = (data.get('title') or '').strip()
+    content = (data.get('content') or '').strip()
+    if not title:
+        raise ImportLineError('El título es requerido')
+    if not content:
+        raise ImportLineError('El contenido es requerido')
+
+    note_id = data.get('id')
+    try:
+        note_id = str(uuid.UUID(note_id)) if note_id else None
+    except (TypeError, ValueError, AttributeError):
+        note_id = None
+
+    try:
+        created_at = _parse_datetime(data.get('createdAt'), now)
+        updated_at = _parse_datetime(data.get('updatedAt'), created_at)
+    except (TypeError, ValueError):
+        raise ImportLineError('Fecha inválida')
+
+    return {'id': note_id, 'title': title, 'content': content,
+            'imageUrl': data.get('imageUrl'), 'createdAt': created_at, 'updatedAt': updated_at}
+
+
+def _flush(user_id, pending):
+    """Inserta un bloque con un solo executemany y hace commit; regresa (insertadas, omitidas)"""
+    ids = [note['id'] for note in pending if note['id']]
+    owners = {}
+    foreign = set()
+    if ids:
+        owners = dict(db.session.execute(
+            db.select(Note.id, Note.userId).where(Note.id.in_(ids))
+        ).all())
+        # Ids que ya usa otro usuario en otro shard: también se reemplazan
+        foreign = notes_owned_elsewhere(set(ids) - owners.keys(), user_id)
+
+    rows = []
+    skipped = 0
+    for note in pending:
+        owner = owners.get(note['id'])
+        if owner == user_id:
+            # Ya importada (p. ej. al reintentar la importación): se omite
+            skipped += 1
+            continue
+        if not note['id'] or owner is not None or note['id'] in foreign:
+            note['id'] = str(uuid.uuid4())
+        note['userId'] = user_id
+        rows.append(note)
+
+    # Ids repetidos dentro del mismo archivo
+    seen = set()
+    unique = []
+    for note in rows:
+        if note['id'] in seen:
+            skipped += 1
+            continue
+        seen.add(note['id'])
+        unique.append(note)
+
+    if unique:
+        db.session.execute(db.insert(Note), unique)
+        record_changes(user_id, [(note['id'], OP_UPSERT) for note in unique])
+        summary = SummaryDelta(user_id)
+        for note in unique:
+            summary.add(note['content'], note['imageUrl'], note['updatedAt'])
+        summary.apply()
+    db.session.commit()
+    return len(unique), skipped
+
+
+def import_ndjson(user_id, lines, chunk_size=1000, max_errors=100):
+    """Importa notas desde líneas NDJSON con inserciones masivas y commits periódicos
+
+    Se conservan id, createdAt y updatedAt cuando vienen en el archivo; si el
+    id ya pertenece a otro usuario se genera uno nuevo, y si ya es del mismo
+    usuario la nota se omite, de modo que repetir una importación no duplica.
+    """
+    now = datetime.utcnow()
+    imported = skipped = failed = 0
+    errors = []
+    pending = []
+
+    for number, line in lines:
+        try:
+            pending.append(parse_note_line(line, now))
+        except ImportLineError as e:
+            failed += 1
+            if len(errors) < max_errors:
+                errors.append({'line': number, 'error': str(e)})
+            continue
+        if len(pending) >= chunk_size:
+            inserted, omitted = _flush(user_id, pending)
+            imported += inserted
+            skipped += omitted
+            pending = []
+
+    if pending:
+        inserted, omitted = _flush(user_id, pending)
+        imported += inserted
+        skipped += omitted
+
+    return {'imported': imported, 'skipped': skipped, 'failed': failed, 'errors': errors}